@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Assistant Database Connection Layer
+Shares one WAL-mode SQLite store per process, with a connection per thread
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# How long a writer waits on another process's lock before giving up
+BUSY_TIMEOUT_MS = 5000
+
+# Prepared statements kept per connection (sqlite3's statement cache)
+STATEMENT_CACHE_SIZE = 256
+
+# Write-behind defaults: flush after this many rows or seconds, whichever
+# comes first, and block producers once this many rows are waiting
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_INTERVAL = 0.25
+WRITE_QUEUE_SIZE = 10000
+
+_FLUSH = object()
+_STOP = object()
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+class AssistantDatabase:
+    """Thread-local SQLite connections to a single database file.
+
+    Connections are opened lazily, once per thread, and reused for the life
+    of the process. WAL journaling lets readers run alongside a writer, and
+    busy_timeout makes competing writers wait instead of failing with
+    "database is locked".
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,  # autocommit; transactions are explicit
+            check_same_thread=False,  # so close_all() can run at exit
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL stays durable across crashes with NORMAL; only fsyncs at checkpoint
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def execute(self, sql, params=()):
+        """Run a single statement on this thread's connection"""
+        return self.connection().execute(sql, params)
+
+    def fetch_one(self, sql, params=()):
+        return self.execute(sql, params).fetchone()
+
+    def fetch_all(self, sql, params=()):
+        return self.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Group statements into one write transaction.
+
+        BEGIN IMMEDIATE takes the write lock up front, so a busy database is
+        waited on here rather than failing mid-transaction. Nested use joins
+        the outer transaction.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def writer(self):
+        """Return the shared write-behind queue, starting it on first use"""
+        with self._lock:
+            if self._writer is None:
+                self._writer = BatchWriter(self)
+            return self._writer
+
+    def close_all(self):
+        """Flush pending writes and close every thread's connection.
+
+        Call only at shutdown.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+class BatchWriter:
+    """Write-behind queue that commits buffered INSERTs in batches.
+
+    Producers call submit() and return immediately; a background thread
+    groups queued rows into one transaction per batch, flushing when the
+    batch is full or the oldest row has waited flush_interval seconds. The
+    queue is bounded, so a producer outrunning the disk blocks in submit()
+    instead of growing memory without limit.
+    """
+
+    def __init__(self, database, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, max_queue_size=WRITE_QUEUE_SIZE):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.rows_failed = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="assistant-db-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, sql, params, timeout=None):
+        """Queue one write; blocks while the queue is full"""
+        if self._closed:
+            raise RuntimeError("BatchWriter is closed")
+        self._queue.put((sql, params), timeout=timeout)
+
+    def flush(self, timeout=None):
+        """Wait until every write submitted so far has been committed"""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self):
+        """Commit anything still queued and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_STOP, None))
+        self._thread.join()
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item, arg = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is None or item is _FLUSH or item is _STOP:
+                self._write(pending)
+                pending = []
+                if item is _FLUSH:
+                    arg.set()
+                elif item is _STOP:
+                    return
+                continue
+
+            pending.append((item, arg))
+            if len(pending) == 1:
+                deadline = time.monotonic() + self.flush_interval
+            if len(pending) >= self.batch_size:
+                self._write(pending)
+                pending = []
+
+    def _write(self, rows):
+        if not rows:
+            return
+        try:
+            with self.database.transaction() as conn:
+                # executemany over runs of the same statement, in order
+                start = 0
+                while start < len(rows):
+                    sql = rows[start][0]
+                    end = start
+                    while end < len(rows) and rows[end][0] == sql:
+                        end += 1
+                    conn.executemany(sql, [params for _, params in rows[start:end]])
+                    start = end
+            self.rows_written += len(rows)
+        except sqlite3.Error:
+            # Salvage what we can: retry row by row, dropping only bad rows
+            for sql, params in rows:
+                try:
+                    self.database.execute(sql, params)
+                    self.rows_written += 1
+                except sqlite3.Error as e:
+                    self.rows_failed += 1
+                    statement = " ".join(sql.split()[:3])
+                    print(f"assistant_db: dropped {statement} ({e})", file=sys.stderr)
+
+
+def get_database(db_path):
+    """Return the process-wide AssistantDatabase for db_path"""
+    path = os.path.abspath(os.path.expanduser(db_path))
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None:
+            database = AssistantDatabase(path)
+            _databases[path] = database
+    return database
+
+
+@atexit.register
+def _close_databases():
+    with _databases_lock:
+        databases = list(_databases.values())
+    for database in databases:
+        database.close_all()
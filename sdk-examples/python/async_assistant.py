@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Async MCP + Claude Assistant
+AsyncAnthropic twin of IntelligentMCPAssistant for many concurrent requests
+from a single event loop
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from client_factory import aclose_async_clients, get_async_client
+from code_chunking import LARGE_SOURCE_TOKENS, async_map_reduce_analysis, detect_language
+from mcp_claude_integration import (
+    MODEL,
+    QUERY_MAX_TOKENS,
+    REVIEW_SECTIONS,
+    REVIEW_SYSTEM_PROMPT,
+    IntelligentMCPAssistant,
+)
+from review_guidelines import review_system
+from token_counting import TokenUsage, estimate_tokens, usage_of
+
+# Requests allowed in flight at once across all calls on one assistant. The
+# shared scheduler's window is seeded to this, then narrows on 429/529s, so
+# actual concurrency is the smaller of the two
+DEFAULT_MAX_CONCURRENCY = 64
+
+# Threads for SQLite work; each keeps its own reused connection
+DB_THREADS = 4
+
+
+class AsyncIntelligentMCPAssistant:
+    """Async front end over the same assistant.db as IntelligentMCPAssistant.
+
+    API calls go through AsyncAnthropic; history lookups, cache reads and
+    inserts reuse the synchronous assistant's database code on a small
+    thread pool so the event loop never blocks on SQLite.
+    """
+
+    def __init__(self, db_path="~/.config/claude/databases/assistant.db",
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, **assistant_options):
+        self.client = get_async_client()
+        scheduler = getattr(self.client, "scheduler", None)
+        if scheduler is not None:
+            scheduler.seed(max_concurrency)
+        self.store = IntelligentMCPAssistant(db_path, **assistant_options)
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="assistant-db")
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Flush queued writes and release the DB threads
+
+        The HTTP client is shared by the event loop; close it with
+        client_factory.aclose_async_clients() when the loop is done.
+        """
+        await self._run_db(self.store.writer.flush)
+        self._executor.shutdown(wait=True)
+
+    async def intelligent_query(self, query, use_history=True, use_cache=True):
+        """Async version of IntelligentMCPAssistant.intelligent_query"""
+        store = self.store
+        cache_key = store.query_cache_key(query, use_history) if use_cache else None
+        if use_cache:
+            cached = await self._run_db(store.cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+        prompt, context = await self._run_db(store.build_query_prompt, query, use_history)
+
+        async with self._limit():
+            message = await self.client.messages.create(
+                model=MODEL,
+                max_tokens=QUERY_MAX_TOKENS,
+                messages=[{"role": "user", "content": prompt}]
+            )
+
+        response = message.content[0].text
+        await self._run_db(
+            store.record_interaction, cache_key, query, context, response, usage_of(message)
+        )
+        return response
+
+    async def analyze_file_with_context(self, file_path, force=False):
+        """Async version of IntelligentMCPAssistant.analyze_file_with_context"""
+        store = self.store
+        try:
+            content, content_hash, stored = await self._run_db(store.load_for_review, file_path, force)
+            if stored is not None:
+                return stored
+
+            usage = TokenUsage()
+            async with self._limit():
+                if estimate_tokens(content) > LARGE_SOURCE_TOKENS:
+                    response = await async_map_reduce_analysis(
+                        self.client, content, detect_language(file_path), REVIEW_SECTIONS,
+                        model=MODEL, system=review_system(REVIEW_SYSTEM_PROMPT), name=file_path, usage=usage
+                    )
+                else:
+                    message = await self.client.messages.create(
+                        **store.review_request(file_path, content)
+                    )
+                    usage.add(message)
+                    response = message.content[0].text
+
+            await self._run_db(store.store_code_review, file_path, response, content_hash, usage)
+            return response
+
+        except Exception as e:
+            return f"Error analyzing file: {str(e)}"
+
+    async def gather_queries(self, queries, return_exceptions=True, **options):
+        """Run many intelligent_query calls concurrently, results in input order"""
+        return await asyncio.gather(
+            *(self.intelligent_query(query, **options) for query in queries),
+            return_exceptions=return_exceptions
+        )
+
+    async def gather_files(self, file_paths, force=False):
+        """Review many files concurrently, results in input order"""
+        return await asyncio.gather(
+            *(self.analyze_file_with_context(path, force=force) for path in file_paths)
+        )
+
+    def _limit(self):
+        # Created lazily so it belongs to the loop that first uses it
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _run_db(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, function, *args)
+
+
+async def main():
+    async with AsyncIntelligentMCPAssistant() as assistant:
+        questions = [
+            "What are best practices for Python error handling?",
+            "When should I use asyncio instead of threads?",
+            "How do I profile a slow SQLite query?",
+        ]
+        print(f"Asking {len(questions)} questions concurrently...")
+        print("=" * 60)
+        answers = await assistant.gather_queries(questions)
+        for question, answer in zip(questions, answers):
+            print(f"\nQ: {question}")
+            print("-" * 40)
+            print(answer)
+    await aclose_async_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
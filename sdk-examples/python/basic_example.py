@@ -1,32 +1,34 @@
-#\!/usr/bin/env python3
+#!/usr/bin/env python3
 """
 Basic Claude SDK Example
 This script demonstrates simple message creation with the Claude API
 """
-import os
-from anthropic import Anthropic
+from client_factory import get_client
+from token_counting import usage_of
 
-def main():
-    # Initialize the client
-    client = Anthropic(
-        api_key=os.environ.get("ANTHROPIC_API_KEY")
-    )
-    
-    # Create a message
-    message = client.messages.create(
+def ask(client, prompt="Tell me a short joke about programming"):
+    """Send one prompt and return the Message"""
+    return client.messages.create(
         model="claude-3-5-sonnet-20241022",
         max_tokens=1024,
         messages=[
             {
                 "role": "user",
-                "content": "Tell me a short joke about programming"
+                "content": prompt
             }
         ]
     )
+
+def main():
+    # Shared client over a pooled keep-alive connection (reads ANTHROPIC_API_KEY)
+    client = get_client()
+    
+    # Create a message
+    message = ask(client)
     
     print("Claude's response:")
     print(message.content[0].text)
+    print(f"\nTokens: {usage_of(message)}")
 
 if __name__ == "__main__":
-    main()
-EOF < /dev/null
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Offline Client Benchmark
+Drives the examples and the assistant against the local mock Messages API at
+fixed concurrency levels and reports throughput and latency percentiles
+
+Usage:
+    python benchmark.py                                  # every workload at 1, 4, 16
+    python benchmark.py -w streaming -c 1 8 32 -n 200 --token-rate 50
+    python benchmark.py --json results.jsonl --label before-change
+    python benchmark.py --base-url http://127.0.0.1:8766 # an already running mock
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from mock_anthropic_server import start_mock_server
+from stream_metrics import percentile
+
+PERCENTILES = (50, 90, 99)
+
+SAMPLE_CODE = '''
+def fibonacci(n):
+    if n <= 1:
+        return n
+    else:
+        return fibonacci(n-1) + fibonacci(n-2)
+
+# Calculate first 10 fibonacci numbers
+for i in range(10):
+    print(f"F({i}) = {fibonacci(i)}")
+'''
+
+
+class Workloads:
+    """One callable per workload: call(index) -> time to first token or None.
+
+    Modules are imported lazily so the client factory only ever sees the
+    mock's ANTHROPIC_BASE_URL.
+    """
+
+    names = ("basic", "streaming", "analyze_code", "analyze_code_packed", "analyze_code_large",
+             "assistant", "assistant_cached")
+
+    def __init__(self, db_dir):
+        self.db_dir = db_dir
+        self._assistant = None
+        self._packer = None
+        self._packer_lock = threading.Lock()
+
+    def get(self, name):
+        return getattr(self, name)
+
+    def client(self):
+        from client_factory import get_client
+        return get_client()
+
+    def basic(self, index):
+        from basic_example import ask
+        ask(self.client())
+
+    def streaming(self, index):
+        from streaming_example import stream_story
+        _, metrics = stream_story(self.client())
+        return metrics.ttft
+
+    def analyze_code(self, index):
+        from code_analysis import analyze_code
+        analyze_code(self.client(), SAMPLE_CODE)
+
+    def analyze_code_packed(self, index):
+        # Concurrent callers share one packer, so small snippets share requests
+        with self._packer_lock:
+            if self._packer is None:
+                from code_analysis import snippet_packer
+                self._packer = snippet_packer(self.client())
+        self._packer.submit(SAMPLE_CODE).result()
+
+    def analyze_code_large(self, index):
+        # Big enough to take the chunked map-reduce path
+        from code_analysis import analyze_code
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_claude_integration.py")) as f:
+            analyze_code(self.client(), f.read())
+
+    def assistant(self, index):
+        self.assistant_instance().intelligent_query(
+            f"How should I structure error handling in service {index}?", use_cache=False
+        )
+
+    def assistant_cached(self, index):
+        self.assistant_instance().intelligent_query(
+            f"How should I structure error handling in service {index % 10}?"
+        )
+
+    def assistant_instance(self):
+        if self._assistant is None:
+            from mcp_claude_integration import IntelligentMCPAssistant
+            self._assistant = IntelligentMCPAssistant(os.path.join(self.db_dir, "benchmark.db"))
+        return self._assistant
+
+    def close(self):
+        if self._packer is not None:
+            self._packer.close()
+        if self._assistant is not None:
+            self._assistant.writer.flush()
+
+
+def run_level(call, concurrency, requests):
+    """Run `requests` calls on `concurrency` threads; returns a result dict"""
+    latencies, ttfts, errors = [], [], []
+
+    def timed(index):
+        started = time.perf_counter()
+        try:
+            ttft = call(index)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            return
+        latencies.append(time.perf_counter() - started)
+        if ttft is not None:
+            ttfts.append(ttft)
+
+    # One untimed round opens the connections the timed run will reuse
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(-concurrency, 0)))
+    latencies.clear(), ttfts.clear(), errors.clear()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+    for p in PERCENTILES:
+        result[f"latency_p{p}_ms"] = _ms(percentile(latencies, p))
+    if ttfts:
+        result["ttft_p50_ms"] = _ms(percentile(ttfts, 50))
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def print_result(workload, result):
+    ttft = f" ttft p50 {result['ttft_p50_ms']}" if "ttft_p50_ms" in result else ""
+    print(f"{workload:<20} c={result['concurrency']:<4} {result['throughput_rps']:>8} req/s"
+          f"  p50 {result['latency_p50_ms']:>8}  p90 {result['latency_p90_ms']:>8}"
+          f"  p99 {result['latency_p99_ms']:>8} ms{ttft}"
+          + (f"  errors {result['errors']}" if result["errors"] else ""))
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-w", "--workload", nargs="+", choices=Workloads.names, default=list(Workloads.names))
+    parser.add_argument("-c", "--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("-n", "--requests", type=int, default=50, help="timed requests per level")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock first-token latency (s)")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="mock output tokens/s")
+    parser.add_argument("--output-tokens", type=int, default=100, help="mock reply length")
+    parser.add_argument("--prefill-rate", type=float, help="mock uncached input tokens/s (models TTFT)")
+    parser.add_argument("--replay", help="JSONL of recorded responses for the mock to serve")
+    parser.add_argument("--base-url", help="use a mock already running here instead")
+    parser.add_argument("--json", help="append results to this JSONL file")
+    parser.add_argument("--label", help="tag stored with --json results, e.g. a commit")
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        server, base_url = start_mock_server(latency=args.latency, token_rate=args.token_rate,
+                                             output_tokens=args.output_tokens, replay=args.replay,
+                                             prefill_rate=args.prefill_rate)
+    # Never let a benchmark reach the real API
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["ANTHROPIC_API_KEY"] = "mock"
+    os.environ.pop("CLAUDE_STREAM_METRICS", None)
+    print(f"Mock API at {base_url}: latency {args.latency}s, {args.token_rate} tokens/s, "
+          f"{args.output_tokens}-token replies\n", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        workloads = Workloads(db_dir)
+        output = open(args.json, "a") if args.json else None
+        try:
+            for name in args.workload:
+                for concurrency in args.concurrency:
+                    result = run_level(workloads.get(name), concurrency, args.requests)
+                    print_result(name, result)
+                    if output:
+                        record = dict(result, workload=name, label=args.label,
+                                      timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                                      mock={"latency": args.latency, "token_rate": args.token_rate,
+                                            "output_tokens": args.output_tokens,
+                                            "prefill_rate": args.prefill_rate})
+                        output.write(json.dumps(record) + "\n")
+        finally:
+            workloads.close()
+            if output:
+                output.close()
+
+    if server is not None:
+        state = server.state
+        print(f"\nMock served {state.requests} requests on {state.connections} connections, "
+              f"peak concurrency {state.peak_active}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Shared Anthropic Clients
+One process-wide client per configuration over a tuned keep-alive
+connection pool, with HTTP/2 when available, an optional warm-up and the
+shared adaptive request scheduler
+"""
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+import time
+import weakref
+import anthropic
+from anthropic import Anthropic, AsyncAnthropic, DefaultAsyncHttpxClient, DefaultHttpxClient
+from request_scheduler import AsyncScheduledClient, ScheduledClient, get_scheduler
+
+try:
+    import httpx
+except ImportError:  # the SDK's own transport defaults apply
+    httpx = None
+
+# Connection pool shared by every request a client makes
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 120  # seconds an idle connection stays open for reuse
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 600
+
+# Set to 1 to warm up every client when it is first created
+WARM_UP_ENV = "CLAUDE_CLIENT_WARM_UP"
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {key: client}
+_lock = threading.Lock()
+
+
+def http2_available():
+    """True when httpx can negotiate HTTP/2 (the h2 package is installed)"""
+    return httpx is not None and importlib.util.find_spec("h2") is not None
+
+
+def transport_options():
+    """Keyword arguments for DefaultHttpxClient / DefaultAsyncHttpxClient"""
+    if httpx is None:
+        return None
+    return {
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        "http2": http2_available(),
+    }
+
+
+def get_client(api_key=None, warm=None, scheduled=True, **options):
+    """Process-wide Anthropic client; the same object for the same options
+
+    options are passed to Anthropic() (max_retries, base_url, ...). For a
+    per-call tweak of a shared client prefer client.with_options(), which
+    keeps using the same connection pool. warm=True (or the
+    CLAUDE_CLIENT_WARM_UP environment variable) warms the pool in the
+    background on first creation.
+
+    messages.create() and messages.stream() go through the shared
+    RequestScheduler, which does the retrying, so the SDK's own retries
+    are off unless max_retries is given; scheduled=False returns a plain
+    client.
+    """
+    key = _client_key(api_key, options, scheduled)
+    with _lock:
+        client = _clients.get(key)
+        created = client is None
+        if created:
+            http_options = transport_options()
+            if http_options is not None:
+                options = dict(options, http_client=DefaultHttpxClient(**http_options))
+            if scheduled:
+                options.setdefault("max_retries", 0)
+                client = ScheduledClient(Anthropic(api_key=key[0], **options), get_scheduler())
+            else:
+                client = Anthropic(api_key=key[0], **options)
+            _clients[key] = client
+    if created and _should_warm(warm):
+        warm_up(client, background=True)
+    return client
+
+
+def get_async_client(api_key=None, scheduled=True, **options):
+    """Shared AsyncAnthropic client for the running event loop
+
+    Async connections belong to the loop that opened them, so each loop
+    gets its own client. Called outside a loop, returns a new client.
+    Scheduling is as for get_client(), with the same process-wide window.
+    """
+    key = _client_key(api_key, options, scheduled)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _new_async_client(key[0], options, scheduled)
+
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = _new_async_client(key[0], options, scheduled)
+            clients[key] = client
+    return client
+
+
+def _new_async_client(api_key, options, scheduled):
+    http_options = transport_options()
+    if http_options is not None:
+        options = dict(options, http_client=DefaultAsyncHttpxClient(**http_options))
+    if not scheduled:
+        return AsyncAnthropic(api_key=api_key, **options)
+    options.setdefault("max_retries", 0)
+    return AsyncScheduledClient(AsyncAnthropic(api_key=api_key, **options), get_scheduler())
+
+
+def warm_up(client, background=False):
+    """Open a pooled connection (DNS, TCP, TLS) before the first real request
+
+    Sends a one-item models listing, which costs no tokens. Errors are
+    ignored. Returns the seconds taken (None on failure), or the started
+    thread when background=True.
+    """
+    if background:
+        thread = threading.Thread(target=warm_up, args=(client,), name="client-warm-up", daemon=True)
+        thread.start()
+        return thread
+    started = time.perf_counter()
+    try:
+        client.with_options(max_retries=0).models.list(limit=1)
+    except anthropic.APIError:
+        return None
+    return time.perf_counter() - started
+
+
+async def async_warm_up(client):
+    """warm_up() for an AsyncAnthropic client"""
+    started = time.perf_counter()
+    try:
+        await client.with_options(max_retries=0).models.list(limit=1)
+    except anthropic.APIError:
+        return None
+    return time.perf_counter() - started
+
+
+async def aclose_async_clients():
+    """Close the shared async clients of the running loop"""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def _client_key(api_key, options, scheduled):
+    api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+    return (api_key, scheduled) + tuple(sorted((name, repr(value)) for name, value in options.items()))
+
+
+def _should_warm(warm):
+    if warm is None:
+        return os.environ.get(WARM_UP_ENV, "").lower() in ("1", "true", "yes")
+    return warm
+
+
+@atexit.register
+def _close_clients():
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
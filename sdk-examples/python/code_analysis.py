@@ -1,39 +1,114 @@
-#\!/usr/bin/env python3
+#!/usr/bin/env python3
 """
 Code Analysis with Claude
 Demonstrates using Claude for code review and improvement suggestions
 """
-import os
-from anthropic import Anthropic
+from client_factory import get_client
+from code_chunking import LARGE_SOURCE_TOKENS, map_reduce_analysis
+from message_batches import POLL_INTERVAL, batch_request, result_error, run_batches
+from prompt_cache import place_cache_breakpoints
+from review_guidelines import review_system
+from snippet_packing import SnippetPacker
+from token_counting import TokenUsage, estimate_tokens
 
-def analyze_code(client, code_snippet, language="python"):
-    """Analyze code and provide improvement suggestions"""
-    
-    prompt = f"""Please analyze this {language} code and provide:
-1. A brief summary of what it does
+MODEL = "claude-3-5-sonnet-20241022"
+SYSTEM_PROMPT = "You are an expert code reviewer. Provide constructive feedback."
+REVIEW_SECTIONS = """1. A brief summary of what it does
 2. Any potential issues or bugs
 3. Suggestions for improvement
-4. Performance considerations
+4. Performance considerations"""
 
+def analyze_code(client, code_snippet, language="python", usage=None):
+    """Analyze code and provide improvement suggestions
+    
+    Large inputs are split on function/class boundaries, reviewed in
+    parallel and merged, instead of being sent as one oversized prompt.
+    Pass a TokenUsage as `usage` to accumulate the tokens spent.
+    """
+    if estimate_tokens(code_snippet) > LARGE_SOURCE_TOKENS:
+        return map_reduce_analysis(
+            client, code_snippet, language, REVIEW_SECTIONS,
+            model=MODEL, system=review_system(SYSTEM_PROMPT), name=f"this {language} code", usage=usage
+        )
+    
+    message = client.messages.create(**analysis_request(code_snippet, language))
+    
+    if usage is not None:
+        usage.add(message)
+    return message.content[0].text
+
+def analyze_code_batch(client, code_snippets, language="python", usage=None,
+                       poll_interval=POLL_INTERVAL):
+    """Analyze many snippets through the Message Batches API, at half price
+    
+    Returns the analyses in the order given; a request that didn't succeed
+    gets an "Error: ..." string instead. Blocks until the batch ends, which
+    can take minutes to hours. Snippets large enough to need chunking are
+    analyzed directly with analyze_code().
+    """
+    analyses = [None] * len(code_snippets)
+    requests = []
+    for index, code_snippet in enumerate(code_snippets):
+        if estimate_tokens(code_snippet) > LARGE_SOURCE_TOKENS:
+            analyses[index] = analyze_code(client, code_snippet, language, usage)
+        else:
+            requests.append(batch_request(f"snippet-{index}", analysis_request(code_snippet, language)))
+    
+    for custom_id, result in run_batches(client, requests, poll_interval):
+        index = int(custom_id.rsplit("-", 1)[1])
+        if result.type != "succeeded":
+            analyses[index] = f"Error: {result_error(result)}"
+            continue
+        if usage is not None:
+            usage.add(result.message)
+        analyses[index] = result.message.content[0].text
+    return analyses
+
+def snippet_packer(client, language="python", usage=None, **options):
+    """SnippetPacker that reviews many small snippets per request
+    
+    Submit snippets from any number of threads; each gets a short review.
+    Snippets the packed answer misses are reviewed with analyze_code().
+    """
+    return SnippetPacker(
+        client, f"Review each {language} snippet below, covering:\n{REVIEW_SECTIONS}", MODEL,
+        fallback=lambda code_snippet: analyze_code(client, code_snippet, language, usage),
+        system=review_system(SYSTEM_PROMPT), usage=usage, **options
+    )
+
+def analyze_snippets(client, code_snippets, language="python", usage=None):
+    """Analyze many small snippets, packed into as few requests as fit
+    
+    Returns the analyses in order. Answers are shorter than analyze_code()'s,
+    in exchange for roughly one request per MAX_PACKED_ITEMS snippets.
+    """
+    with snippet_packer(client, language, usage) as packer:
+        return packer.map(code_snippets)
+
+def analysis_request(code_snippet, language="python"):
+    """messages.create() arguments for reviewing one snippet
+    
+    The shared review guidelines lead the system prompt as a cached prefix;
+    the code comes last.
+    """
+    prompt = f"""Please analyze this {language} code and provide:
+{REVIEW_SECTIONS}
 Code:
 ```{language}
 {code_snippet}
 ```
 """
-    
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=2048,
-        system="You are an expert code reviewer. Provide constructive feedback.",
-        messages=[
+    return place_cache_breakpoints({
+        "model": MODEL,
+        "max_tokens": 2048,
+        "system": review_system(SYSTEM_PROMPT),
+        "messages": [
             {"role": "user", "content": prompt}
-        ]
-    )
-    
-    return message.content[0].text
+        ],
+    })
 
 def main():
-    client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    client = get_client()
     
     # Example code to analyze
     sample_code = '''
@@ -51,8 +126,10 @@ for i in range(10):
     print("Analyzing code sample...")
     print("=" * 60)
     
-    analysis = analyze_code(client, sample_code)
+    usage = TokenUsage()
+    analysis = analyze_code(client, sample_code, usage=usage)
     print(analysis)
+    print(f"\nTokens: {usage} (${usage.cost(MODEL):.4f})")
     
     # You can also analyze code from files
     # with open('your_file.py', 'r') as f:
@@ -60,5 +137,4 @@ for i in range(10):
     #     analysis = analyze_code(client, code)
 
 if __name__ == "__main__":
-    main()
-EOF < /dev/null
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+AST-aware Code Chunking
+Splits large source files on function/class boundaries and reviews the
+pieces in parallel, merging the findings into one review
+"""
+import ast
+import asyncio
+import os
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from prompt_cache import place_cache_breakpoints
+from token_counting import estimate_tokens
+
+# Per-chunk budget, and the size above which a file is chunked at all
+DEFAULT_CHUNK_TOKENS = 3000
+LARGE_SOURCE_TOKENS = 8000
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+}
+
+# A top-level JS/TS statement that starts a new logical unit
+JS_DECLARATION = re.compile(
+    r"^\s*(export\s+(default\s+)?)?(declare\s+)?(async\s+)?"
+    r"(function\b|class\b|abstract\s+class\b|interface\b|type\b|enum\b|namespace\b|"
+    r"const\b|let\b|var\b)"
+)
+# Keywords after which a / starts a regex literal
+JS_REGEX_KEYWORD = re.compile(r"\b(return|typeof|instanceof|in|of|new|delete|void|throw|case|do|else|yield|await)$")
+
+Chunk = namedtuple("Chunk", ["start_line", "end_line", "text"])
+
+# ast.parse isn't thread-safe on CPython 3.11 (concurrent parses can fail
+# with "AST constructor recursion depth mismatch"), so parses are serialized
+_parse_lock = threading.Lock()
+
+
+def detect_language(path):
+    """Language name for a file path, or None if chunking isn't AST-aware for it"""
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+
+
+def chunk_source(source, language, max_tokens=DEFAULT_CHUNK_TOKENS):
+    """Split source into Chunks of at most max_tokens on declaration boundaries"""
+    lines = source.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    if language == "python":
+        starts = _python_boundaries(source)
+    elif language in ("javascript", "typescript"):
+        starts = _brace_boundaries(lines, depth=0)
+    else:
+        starts = None
+    if not starts:
+        starts = [1]
+
+    segments = []
+    for start, end in _ranges(starts, len(lines)):
+        segments.extend(_fit_segment(lines, start, end, language, max_tokens))
+    return _pack(lines, segments, max_tokens)
+
+
+def map_reduce_analysis(client, source, language, instructions, model, system=None,
+                        name="source", max_chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                        max_tokens=2048, max_workers=4, usage=None):
+    """Review each chunk in parallel, then merge the findings into one review
+
+    `instructions` is the numbered list of sections the final review should
+    have; every chunk is reviewed against it and the reduce step produces a
+    single answer in that shape. Pass a TokenUsage as `usage` to have every
+    request's token usage added to it.
+    """
+    chunks = chunk_source(source, language, max_chunk_tokens)
+    requests = chunk_requests(chunks, language, instructions, model, system, name, max_tokens)
+
+    def review_chunk(request):
+        return client.messages.create(**request)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        messages = list(executor.map(review_chunk, requests))
+    return _reduce(chunks, messages, instructions, model, system, name, max_tokens, usage,
+                   lambda request: client.messages.create(**request))
+
+
+async def async_map_reduce_analysis(client, source, language, instructions, model, system=None,
+                                    name="source", max_chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                                    max_tokens=2048, usage=None):
+    """map_reduce_analysis() for an AsyncAnthropic client"""
+    chunks = chunk_source(source, language, max_chunk_tokens)
+    requests = chunk_requests(chunks, language, instructions, model, system, name, max_tokens)
+    messages = await asyncio.gather(*(client.messages.create(**r) for r in requests))
+    if len(chunks) > 1:
+        request = merge_request(chunks, [m.content[0].text for m in messages],
+                                instructions, model, system, name, max_tokens)
+        messages.append(await client.messages.create(**request))
+    if usage is not None:
+        for message in messages:
+            usage.add(message)
+    return messages[-1].content[0].text
+
+
+def _reduce(chunks, messages, instructions, model, system, name, max_tokens, usage, create):
+    """Merge per-chunk reviews (skipped for a single chunk) and tally usage"""
+    messages = list(messages)
+    if len(chunks) > 1:
+        request = merge_request(chunks, [m.content[0].text for m in messages],
+                                instructions, model, system, name, max_tokens)
+        messages.append(create(request))
+    if usage is not None:
+        for message in messages:
+            usage.add(message)
+    return messages[-1].content[0].text
+
+
+def chunk_requests(chunks, language, instructions, model, system, name, max_tokens):
+    """messages.create() arguments for reviewing each chunk on its own"""
+    requests = []
+    for number, chunk in enumerate(chunks, 1):
+        prompt = f"""This is part {number} of {len(chunks)} of {name} (lines {chunk.start_line}-{chunk.end_line}).
+Review only this part. Note findings for these sections, citing line numbers:
+{instructions}
+
+Code:
+```{language or ""}
+{chunk.text}
+```
+"""
+        requests.append(_request(prompt, model, system, max(512, max_tokens // 2)))
+    return requests
+
+
+def merge_request(chunks, reviews, instructions, model, system, name, max_tokens):
+    """messages.create() arguments for reducing per-chunk reviews into one"""
+    findings = "\n\n".join(
+        f"## Lines {chunk.start_line}-{chunk.end_line}\n{review}"
+        for chunk, review in zip(chunks, reviews)
+    )
+    prompt = f"""Below are reviews of consecutive parts of {name}. Merge them into one review of the whole file with these sections:
+{instructions}
+
+Deduplicate repeated points, keep line numbers, and give one overall assessment.
+
+{findings}
+"""
+    return _request(prompt, model, system, max_tokens)
+
+
+def _request(prompt, model, system, max_tokens):
+    request = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": prompt}],
+    }
+    if system:
+        request["system"] = system
+    # The system prompt is the prefix every chunk and file review shares
+    return place_cache_breakpoints(request)
+
+
+def _ranges(starts, line_count):
+    """(start, end) 1-based inclusive line ranges between boundaries"""
+    starts = sorted(set(starts))
+    if starts[0] != 1:
+        starts.insert(0, 1)
+    ends = [s - 1 for s in starts[1:]] + [line_count]
+    return list(zip(starts, ends))
+
+
+def _python_boundaries(source, body=None):
+    """First line (including decorators) of each statement in a body"""
+    if body is None:
+        try:
+            body = _parse(source).body
+        except SyntaxError:
+            return None
+    starts = []
+    for node in body:
+        decorators = getattr(node, "decorator_list", [])
+        starts.append(min([node.lineno] + [d.lineno for d in decorators]))
+    return starts
+
+
+def _parse(source):
+    with _parse_lock:
+        return ast.parse(source)
+
+
+def _python_members(source, start, end):
+    """Boundaries of the body of the outermost class/function in start..end"""
+    try:
+        module = _parse(source)
+    except SyntaxError:
+        return None
+    scopes = (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+    for node in ast.walk(module):
+        if isinstance(node, scopes) and node.lineno >= start and node.end_lineno <= end:
+            members = _python_boundaries(source, node.body)
+            if members:
+                return [start] + [line for line in members if line > start]
+    return None
+
+
+def _brace_boundaries(lines, depth, first=0, last=None):
+    """Lines that open a declaration at the given brace depth"""
+    last = len(lines) if last is None else last
+    starts = []
+    current = 0
+    state = ()
+    for index in range(first, last):
+        line = lines[index]
+        if current == depth and not state:
+            if depth == 0 and JS_DECLARATION.match(line):
+                starts.append(index + 1)
+            elif depth > 0 and line.strip() and not line.strip().startswith(("}", "//", "*")):
+                starts.append(index + 1)
+        current, state = _scan_braces(line, current, state)
+    return starts
+
+
+def _scan_braces(line, depth, state=()):
+    """Track brace depth across a line, skipping strings, comments and regexes
+
+    state is what is still open where the line ends, to pass in with the
+    next line: a stack of "*" (block comment), a quote (template literal,
+    or a string continued with a backslash) and, inside a template's ${...},
+    the count of braces opened within that expression.
+    """
+    stack = list(state)
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        nxt = line[i + 1] if i + 1 < len(line) else ""
+        top = stack[-1] if stack else None
+        if top == "*":
+            if ch == "*" and nxt == "/":
+                stack.pop()
+                i += 1
+        elif top in ("'", '"', "`"):
+            if ch == "\\":
+                i += 1
+            elif ch == top:
+                stack.pop()
+            elif top == "`" and ch == "$" and nxt == "{":
+                stack.append(0)
+                i += 1
+        elif ch == "/" and nxt == "/":
+            break
+        elif ch == "/" and nxt == "*":
+            stack.append("*")
+            i += 1
+        elif ch == "/" and _regex_allowed(line, i):
+            i = _skip_regex(line, i)
+        elif ch in "'\"`":
+            stack.append(ch)
+        elif ch == "{":
+            if top is None:
+                depth += 1
+            else:
+                stack[-1] += 1
+        elif ch == "}":
+            if top is None:
+                depth = max(0, depth - 1)
+            elif top == 0:
+                stack.pop()  # end of a ${...}: back inside the template
+            else:
+                stack[-1] -= 1
+        i += 1
+    # Plain strings end with the line unless continued with a backslash
+    if stack and stack[-1] in ("'", '"') and not line.rstrip("\r\n").endswith("\\"):
+        stack.pop()
+    return depth, tuple(stack)
+
+
+def _regex_allowed(line, index):
+    """Whether a / at index starts a regex literal rather than dividing"""
+    before = line[:index].rstrip()
+    if not before or before[-1] in "(,=:[!&|?{};+-*%<>~^":
+        return True
+    return JS_REGEX_KEYWORD.search(before) is not None
+
+
+def _skip_regex(line, index):
+    """Index of the / closing the regex literal at index, or index if unclosed"""
+    in_class = False
+    i = index + 1
+    while i < len(line) and line[i] != "\n":
+        ch = line[i]
+        if ch == "\\":
+            i += 1
+        elif in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+        elif ch == "/":
+            return i
+        i += 1
+    return index
+
+
+def _fit_segment(lines, start, end, language, max_tokens):
+    """Split a segment that is over budget at its inner boundaries"""
+    text = "".join(lines[start - 1:end])
+    if estimate_tokens(text) <= max_tokens or start == end:
+        return [(start, end)]
+
+    inner = None
+    if language == "python":
+        inner = _python_members("".join(lines), start, end)
+    elif language in ("javascript", "typescript"):
+        inner = _brace_boundaries(lines, depth=1, first=start - 1, last=end)
+        inner = [start] + [line for line in inner if line > start]
+    if inner and len(inner) > 1:
+        segments = []
+        for sub_start, sub_end in zip(inner, [s - 1 for s in inner[1:]] + [end]):
+            if (sub_start, sub_end) == (start, end):
+                segments.extend(_split_lines(lines, sub_start, sub_end, max_tokens))
+            else:
+                segments.extend(_fit_segment(lines, sub_start, sub_end, language, max_tokens))
+        return segments
+    return _split_lines(lines, start, end, max_tokens)
+
+
+def _split_lines(lines, start, end, max_tokens):
+    """Last resort: split on line boundaries, preferring blank lines"""
+    segments = []
+    segment_start = start
+    size = 0
+    last_blank = None
+    for line_number in range(start, end + 1):
+        size += estimate_tokens(lines[line_number - 1])
+        if not lines[line_number - 1].strip():
+            last_blank = line_number
+        if size > max_tokens and line_number > segment_start:
+            cut = last_blank if last_blank and last_blank > segment_start else line_number - 1
+            segments.append((segment_start, cut))
+            segment_start = cut + 1
+            size = sum(estimate_tokens(lines[n - 1]) for n in range(segment_start, line_number + 1))
+            last_blank = None
+    segments.append((segment_start, end))
+    return segments
+
+
+def _pack(lines, segments, max_tokens):
+    """Greedily merge adjacent segments into chunks up to the budget"""
+    chunks = []
+    start = end = None
+    size = 0
+    for seg_start, seg_end in segments:
+        seg_size = estimate_tokens("".join(lines[seg_start - 1:seg_end]))
+        if start is not None and size + seg_size > max_tokens:
+            chunks.append(Chunk(start, end, "".join(lines[start - 1:end])))
+            start = None
+        if start is None:
+            start, size = seg_start, 0
+        end = seg_end
+        size += seg_size
+    if start is not None:
+        chunks.append(Chunk(start, end, "".join(lines[start - 1:end])))
+    return chunks
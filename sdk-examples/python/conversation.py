@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Conversation Manager
+Multi-turn chat that sends a rolling window of recent turns plus a running
+summary of older ones, instead of the whole history on every turn
+
+Older turns are folded into the summary in the background, a few at a time,
+so no turn waits on it. The system prompt and summary lead as a stable
+cached prefix, and each turn also reads the previous turn's prefix from the
+prompt cache, so per-turn input stays roughly flat however long the session.
+
+Usage:
+    python conversation.py                      # chat; empty line to quit
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from client_factory import get_client
+from prompt_cache import cached_text, place_cache_breakpoints
+from token_counting import TokenUsage, estimate_tokens
+
+MODEL = "claude-sonnet-4-20250514"
+SUMMARY_MODEL = "claude-3-5-haiku-20241022"
+MAX_TOKENS = 1024
+SUMMARY_MAX_TOKENS = 800
+
+# Recent turns always sent verbatim, and how many older turns are folded
+# into the summary at once (fewer, larger folds keep the prefix stable)
+KEEP_TURNS = 6
+SUMMARIZE_EVERY = 4
+# Verbatim history beyond this is summarized even within KEEP_TURNS; past
+# twice this, the next turn waits for a summary in flight
+MAX_WINDOW_TOKENS = 8000
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an assistant.
+Keep every fact, decision, name, number, code identifier and open question
+that later turns may refer to; drop pleasantries and repetition. Write plain
+prose under {words} words, and reply with only the updated summary.
+
+Summary so far:
+{summary}
+
+Turns to add:
+{transcript}
+"""
+
+
+class Conversation:
+    """A chat session whose prompt size stays bounded
+
+    send(text) returns the reply. To stream instead, pass request(text) to
+    client.messages.stream() and hand the final message to record().
+    usage totals the conversation's own requests, summary_usage the
+    summarization requests.
+    """
+
+    def __init__(self, client=None, system=None, model=MODEL, max_tokens=MAX_TOKENS,
+                 keep_turns=KEEP_TURNS, summarize_every=SUMMARIZE_EVERY,
+                 max_window_tokens=MAX_WINDOW_TOKENS, summary_model=SUMMARY_MODEL):
+        self.client = client or get_client()
+        self.system = system
+        self.model = model
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summarize_every = summarize_every
+        self.max_window_tokens = max_window_tokens
+        self.summary_model = summary_model
+        self.summary = ""
+        self.turns = []  # (user text, assistant text) not yet in the summary
+        self.summarized_turns = 0
+        self.usage = TokenUsage()
+        self.summary_usage = TokenUsage()
+        self._lock = threading.Lock()
+        self._summarizing = None  # (future, number of turns being folded)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarize")
+
+    def send(self, text, **options):
+        """Send one user message and return the reply text"""
+        message = self.client.messages.create(**self.request(text, **options))
+        return self.record(text, message)
+
+    def request(self, text, **options):
+        """messages.create() arguments for the next turn
+
+        Layout: system prompt, then the summary (both stable until the next
+        fold), then the verbatim turns and the new message. Breakpoints sit
+        after the summary, on the previous user message (read from the
+        cache) and on the new one (written for the next turn).
+        """
+        self._apply_summary(wait=self._window_tokens() > 2 * self.max_window_tokens)
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+
+        system = []
+        if self.system:
+            system.append({"type": "text", "text": self.system})
+        if summary:
+            system.append({"type": "text", "text": f"Summary of the conversation so far:\n{summary}"})
+
+        messages = []
+        for number, (user_text, reply) in enumerate(turns):
+            messages.append(_user_message(user_text, cached=number == len(turns) - 1))
+            messages.append({"role": "assistant", "content": reply})
+        messages.append(_user_message(text, cached=True))
+
+        request = dict({"model": self.model, "max_tokens": self.max_tokens, "messages": messages},
+                       **options)
+        if system:
+            request["system"] = system
+        return place_cache_breakpoints(request)
+
+    def record(self, text, message):
+        """Add a finished turn; message is the response (or its reply text)"""
+        reply = message if isinstance(message, str) else message.content[0].text
+        if not isinstance(message, str):
+            self.usage.add(message)
+        with self._lock:
+            self.turns.append((text, reply))
+        self._start_summary()
+        return reply
+
+    def close(self):
+        """Wait for any summary in flight and stop the background thread"""
+        self._executor.shutdown(wait=True)
+        self._apply_summary()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _window_tokens(self):
+        with self._lock:
+            return sum(estimate_tokens(user) + estimate_tokens(reply) for user, reply in self.turns)
+
+    def _start_summary(self):
+        """Fold the oldest turns into the summary in the background, if due"""
+        with self._lock:
+            if self._summarizing is not None:
+                return
+            fold = len(self.turns) - self.keep_turns
+            if fold < self.summarize_every:
+                over_budget = sum(estimate_tokens(u) + estimate_tokens(r) for u, r in self.turns) \
+                    > self.max_window_tokens
+                if not over_budget or len(self.turns) < 2:
+                    return
+                fold = max(fold, len(self.turns) // 2)
+            summary, turns = self.summary, self.turns[:fold]
+            future = self._executor.submit(self._summarize, summary, turns)
+            self._summarizing = (future, fold)
+
+    def _summarize(self, summary, turns):
+        transcript = "\n\n".join(f"User: {user}\n\nAssistant: {reply}" for user, reply in turns)
+        message = self.client.messages.create(
+            model=self.summary_model,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+                words=SUMMARY_MAX_TOKENS // 2, summary=summary or "(none yet)", transcript=transcript
+            )}],
+        )
+        self.summary_usage.add(message)
+        return message.content[0].text
+
+    def _apply_summary(self, wait=False):
+        """Swap in a finished summary and drop the turns it covers
+
+        A failed summary leaves the turns verbatim; the fold is retried
+        after the next turn.
+        """
+        with self._lock:
+            if self._summarizing is None:
+                return
+            future, fold = self._summarizing
+        if not wait and not future.done():
+            return
+        try:
+            summary = future.result()
+        except Exception:
+            summary = None
+        with self._lock:
+            self._summarizing = None
+            if summary:
+                self.summary = summary
+                del self.turns[:fold]
+                self.summarized_turns += fold
+
+
+def _user_message(text, cached=False):
+    block = cached_text(text) if cached else {"type": "text", "text": text}
+    return {"role": "user", "content": [block]}
+
+
+def main():
+    with Conversation(system="You are a helpful, concise assistant.") as conversation:
+        while True:
+            try:
+                text = input("\nYou: ").strip()
+            except EOFError:
+                break
+            if not text:
+                break
+            print(f"\nClaude: {conversation.send(text)}")
+            print(f"[{len(conversation.turns)} turns verbatim, "
+                  f"{conversation.summarized_turns} summarized; {conversation.usage}]")
+
+
+if __name__ == "__main__":
+    main()
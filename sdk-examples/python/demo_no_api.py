@@ -5,7 +5,10 @@ Shows SDK structure and usage patterns
 """
 from anthropic import Anthropic
 import asyncio
+import inspect
 import time
+from stream_renderer import TerminalRenderer
+from token_counting import PRICING, estimate_cost, estimate_tokens
 
 def demo_basic_usage():
     """Demonstrate basic SDK usage patterns"""
@@ -33,23 +36,25 @@ def demo_streaming():
     print("\n2. Streaming Responses")
     print("-" * 40)
     print("""
-# Stream responses for real-time output
+# Stream responses for real-time output; the renderer coalesces deltas
+# into at most 30 frames a second and styles Markdown on a terminal
 with client.messages.stream(
     model="claude-sonnet-4-20250514",
     max_tokens=1024,
     messages=[{"role": "user", "content": "Write a story"}]
-) as stream:
-    for event in stream:
-        if event.type == "text_event":
-            print(event.text, end="", flush=True)
+) as stream, TerminalRenderer() as renderer:
+    for text in stream.text_stream:
+        renderer.write(text)
 """)
     
-    # Simulate streaming
+    # Simulate streaming: deltas arrive at ~40 tokens/s, frames are drawn at 30/s
     print("\nSimulated streaming output:")
-    text = "Once upon a time, in a land of code and algorithms..."
-    for char in text:
-        print(char, end="", flush=True)
-        time.sleep(0.05)
+    text = "Once upon a time, in a land of **code** and `algorithms`..."
+    with TerminalRenderer() as renderer:
+        started = time.monotonic()
+        for index, word in enumerate(text.split(" ")):
+            time.sleep(max(0, started + index / 40 - time.monotonic()))
+            renderer.write(word if index == 0 else " " + word)
     print()
 
 def demo_system_prompts():
@@ -83,6 +88,14 @@ response = client.messages.create(
     model="claude-sonnet-4-20250514",
     messages=messages
 )
+
+# Resending everything makes each turn cost more than the last; for long
+# sessions, keep recent turns verbatim and fold older ones into a summary
+# (in the background), with the stable prefix read from the prompt cache
+from conversation import Conversation
+with Conversation(system="You are a patient tutor.") as conversation:
+    conversation.send("What is recursion?")
+    reply = conversation.send("Can you show an example?")
 """)
 
 def demo_advanced_features():
@@ -104,12 +117,13 @@ limited_response = client.messages.create(
     messages=[{"role": "user", "content": "Summarize Python"}]
 )
 
-# Error handling
+# Error handling: rate limits are handled by the shared scheduler, which
+# honors retry-after, backs off with jitter and narrows concurrency (AIMD)
+from client_factory import get_client
+client = get_client()
 try:
     response = client.messages.create(...)
-except anthropic.RateLimitError:
-    time.sleep(60)  # Wait and retry
-except anthropic.APIError as e:
+except anthropic.APIError as e:  # retries exhausted or not retryable
     print(f"API error: {e}")
 """)
 
@@ -147,17 +161,37 @@ def show_pricing():
     """Show API pricing information"""
     print("\n7. API Pricing (as of 2024)")
     print("-" * 40)
+    best_for = {
+        "haiku": "Fast, simple tasks",
+        "sonnet": "Balanced performance",
+        "opus": "Complex reasoning",
+    }
+    print()
+    print("Model               | Input  | Output | Best For")
+    print("--------------------|--------|--------|----------")
+    for family, (input_price, output_price) in PRICING.items():
+        input_cost = f"${input_price:.2f}"
+        output_cost = f"${output_price:.2f}"
+        print(f"{'Claude ' + family.title():<20}| {input_cost:<7}| {output_cost:<7}| {best_for[family]}")
     print("""
-Model               | Input  | Output | Best For
---------------------|--------|--------|----------
-Claude Haiku        | $0.80  | $4     | Fast, simple tasks
-Claude Sonnet       | $3     | $15    | Balanced performance
-Claude Opus         | $15    | $75    | Complex reasoning
-
 * Prices per million tokens
-* 1000 tokens ≈ 750 words
+* Prompt-cache writes cost 1.25x input, cache reads 0.1x input
+* Record real counts from message.usage (input_tokens, output_tokens,
+  cache_read_input_tokens, cache_creation_input_tokens)
 """)
 
+    # Budget a request before sending it, using the local estimator
+    prompt = "Review this function and suggest improvements:\n" + inspect.cleandoc("""
+        def fibonacci(n):
+            if n <= 1:
+                return n
+            return fibonacci(n - 1) + fibonacci(n - 2)
+    """)
+    input_tokens = estimate_tokens(prompt)
+    print(f"Example: a ~{input_tokens}-token prompt with a 500-token answer costs")
+    for family in PRICING:
+        print(f"  {family.title():<7} ${estimate_cost(family, input_tokens, 500):.5f}")
+
 def main():
     print("🤖 Claude SDK Demo - No API Required")
     print("=" * 50)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Streaming Diff Chunking
+Parses unified diffs file by file and hunk by hunk as they are read, and
+packs the hunks into token-budgeted chunks for map-reduce summaries
+"""
+import re
+import subprocess
+from collections import namedtuple
+from token_counting import estimate_tokens
+
+DEFAULT_DIFF_CHUNK_TOKENS = 3000
+
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+FileDiff = namedtuple("FileDiff", ["path", "header", "hunks", "added", "removed"])
+DiffChunk = namedtuple("DiffChunk", ["paths", "text"])
+
+
+def git_diff_lines(*args, cwd=None):
+    """Yield the lines of `git diff <args>` as git produces them
+
+    The diff is never held in memory as a whole. Raises CalledProcessError
+    if git fails (after the lines it did print).
+    """
+    command = ["git", "diff", "--no-color", "--no-ext-diff", *args]
+    process = subprocess.Popen(
+        command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, errors="replace",
+    )
+    try:
+        yield from process.stdout
+    finally:
+        process.stdout.close()
+        if process.poll() is None and not _drained(process):
+            process.kill()  # the caller stopped early
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command, stderr=stderr)
+
+
+def _drained(process):
+    try:
+        process.wait(timeout=1)
+        return True
+    except subprocess.TimeoutExpired:
+        return False
+
+
+def parse_diff(lines):
+    """Yield a FileDiff for each file in a unified diff, as soon as it ends
+
+    `lines` is any iterable of lines (a string's splitlines(True), a file,
+    or git_diff_lines()). Hunk lengths come from the @@ headers, so removed
+    lines that happen to start with "---" are never mistaken for a new
+    file. Text before the first file (e.g. a commit message) is skipped.
+    """
+    header, hunks, hunk = [], [], []
+    old_left = new_left = 0
+    added = removed = 0
+
+    def finish():
+        # A file without hunks only counts with a git header (binary files,
+        # renames, mode changes); otherwise it was stray "--- " text
+        if hunks or (header and header[0].startswith("diff ")):
+            return FileDiff(_diff_path(header), header, hunks, added, removed)
+        return None
+
+    for line in lines:
+        if not line.endswith("\n"):
+            line += "\n"
+        if old_left > 0 or new_left > 0:
+            hunk.append(line)
+            if line.startswith("+"):
+                new_left -= 1
+                added += 1
+            elif line.startswith("-"):
+                old_left -= 1
+                removed += 1
+            elif line.startswith(" ") or line == "\n":
+                old_left -= 1
+                new_left -= 1
+            continue
+        if line.startswith("\\") and hunk:
+            hunk.append(line)  # "\ No newline at end of file"
+            continue
+
+        match = HUNK_HEADER.match(line)
+        if match and header:
+            hunk = [line]
+            hunks.append(hunk)
+            old_left = int(match.group(1) or 1)
+            new_left = int(match.group(2) or 1)
+        elif line.startswith("diff ") or (line.startswith("--- ") and (hunks or not header)):
+            finished = finish()
+            if finished:
+                yield finished
+            header, hunks, hunk = [line], [], []
+            added = removed = 0
+        elif header and not hunks:
+            header.append(line)
+
+    finished = finish()
+    if finished:
+        yield finished
+
+
+def _diff_path(header):
+    """Path a file diff applies to, from its +++/--- or diff --git lines"""
+    old = None
+    for line in header:
+        if line.startswith("+++ ") and not line.startswith("+++ /dev/null"):
+            return _strip_prefix(line[4:])
+        if line.startswith("--- ") and not line.startswith("--- /dev/null"):
+            old = _strip_prefix(line[4:])
+    if old:
+        return old
+    match = re.match(r"diff --git a/(.*) b/(.*)", header[0]) if header else None
+    return match.group(2) if match else "(unknown)"
+
+
+def _strip_prefix(path):
+    path = path.rstrip("\n").split("\t")[0]
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def chunk_diff(files, max_tokens=DEFAULT_DIFF_CHUNK_TOKENS):
+    """Yield DiffChunks of whole hunks, each under roughly max_tokens
+
+    Consumes `files` lazily, so the first chunk is ready before the rest of
+    the diff has been read. Every chunk repeats the header of each file it
+    touches; a hunk too big for a chunk on its own is split on line
+    boundaries and keeps its @@ line.
+    """
+    parts, paths, size = [], [], 0
+    for file_diff in files:
+        header = "".join(file_diff.header)
+        header_tokens = estimate_tokens(header)
+        budget = max(max_tokens - header_tokens, max_tokens // 4)
+        for piece in _hunk_pieces(file_diff.hunks, budget) or [""]:
+            cost = estimate_tokens(piece) + (0 if paths and paths[-1] == file_diff.path else header_tokens)
+            if parts and size + cost > max_tokens:
+                yield DiffChunk(tuple(paths), "".join(parts))
+                parts, paths, size = [], [], 0
+                cost = estimate_tokens(piece) + header_tokens
+            if not paths or paths[-1] != file_diff.path:
+                parts.append(header)
+                paths.append(file_diff.path)
+            parts.append(piece)
+            size += cost
+    if parts:
+        yield DiffChunk(tuple(paths), "".join(parts))
+
+
+def _hunk_pieces(hunks, budget):
+    """Hunk texts, with any hunk over budget split into line runs"""
+    pieces = []
+    for hunk in hunks:
+        text = "".join(hunk)
+        if estimate_tokens(text) <= budget:
+            pieces.append(text)
+            continue
+        current, size = [hunk[0]], estimate_tokens(hunk[0])
+        for line in hunk[1:]:
+            line_tokens = estimate_tokens(line)
+            if size + line_tokens > budget and len(current) > 1:
+                pieces.append("".join(current))
+                current, size = [hunk[0]], estimate_tokens(hunk[0])
+            current.append(line)
+            size += line_tokens
+        pieces.append("".join(current))
+    return pieces
+
+
+def diffstat(files):
+    """Plain-text per-file +/- summary, like git diff --stat"""
+    lines = [f"{f.path} | +{f.added} -{f.removed}" for f in files]
+    added = sum(f.added for f in files)
+    removed = sum(f.removed for f in files)
+    lines.append(f"{len(files)} files changed, {added} insertions(+), {removed} deletions(-)")
+    return "\n".join(lines)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Batch Repository Analysis
+Runs analyze_repository across many repositories or a whole organization,
+streaming one JSON line per repository as soon as it is finished
+
+Usage:
+    python github_batch.py --org anthropics > analyses.jsonl
+    python github_batch.py owner/repo https://github.com/owner/other -o out.jsonl
+    python github_batch.py --file repos.txt --github-workers 16 --claude-workers 8
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from client_factory import get_client
+from github_cache import HTTPCache
+from github_client import GitHubClient, RateLimiter
+from github_integration import (
+    RECENT_COMMITS,
+    get_github_info,
+    repository_analysis_request,
+)
+from request_scheduler import get_scheduler
+from token_counting import TokenUsage, usage_of
+
+DEFAULT_GITHUB_WORKERS = 8
+DEFAULT_CLAUDE_WORKERS = 4
+
+_DONE = object()
+
+
+def parse_repository(name):
+    """owner/repo from a URL or an owner/repo string, or (None, None)"""
+    return get_github_info(name.strip())
+
+
+def analyze_repositories(repositories, client=None, github=None,
+                         github_workers=DEFAULT_GITHUB_WORKERS,
+                         claude_workers=DEFAULT_CLAUDE_WORKERS, usage=None):
+    """Analyze many repositories concurrently, yielding results as they finish
+
+    repositories is any iterable of "owner/repo" names or URLs and is
+    consumed lazily, so an organization listing can stream straight in.
+    GitHub fetches and Claude calls run on separate pools sized by
+    github_workers and claude_workers; at most a few repositories wait
+    between the two stages, so memory stays flat for any batch size.
+
+    Each result is a dict with repository, status ("ok" or "failed"),
+    analysis or error, token usage and elapsed seconds.
+    """
+    # The shared client's scheduler paces and retries Claude calls across workers
+    client = client or get_client()
+    github = github or GitHubClient(cache=HTTPCache(), rate_limiter=RateLimiter(),
+                                    max_connections=github_workers)
+
+    results = queue.Queue()
+    # Repositories fetched but not yet analyzed are bounded by this
+    in_flight = threading.BoundedSemaphore(github_workers + 2 * claude_workers)
+    fetch_pool = ThreadPoolExecutor(max_workers=github_workers, thread_name_prefix="github")
+    claude_pool = ThreadPoolExecutor(max_workers=claude_workers, thread_name_prefix="claude")
+
+    def finish(name, started, **result):
+        in_flight.release()
+        results.put(dict(repository=name, elapsed=round(time.time() - started, 3), **result))
+
+    def analyze(name, started, data):
+        try:
+            message = client.messages.create(**repository_analysis_request(*data))
+        except Exception as e:
+            return finish(name, started, status="failed", stage="claude", error=str(e))
+        message_usage = usage_of(message)
+        if usage is not None:
+            usage.add(message)
+        finish(name, started, status="ok", analysis=message.content[0].text,
+               stars=data[0].get("stargazers_count"), usage=message_usage.as_dict())
+
+    def fetch(name, started):
+        owner, repo = parse_repository(name)
+        if not owner or not repo:
+            return finish(name, started, status="failed", stage="input",
+                          error="not an owner/repo name or GitHub URL")
+        try:
+            data = github.fetch_repository(owner, repo, RECENT_COMMITS)
+        except Exception as e:
+            return finish(name, started, status="failed", stage="github", error=str(e))
+        claude_pool.submit(analyze, name, started, data)
+
+    def feed():
+        submitted, error = 0, None
+        try:
+            for name in repositories:
+                in_flight.acquire()
+                fetch_pool.submit(fetch, name, time.time())
+                submitted += 1
+        except Exception as e:
+            # e.g. the org listing failed; finish what was started, then raise
+            error = e
+        finally:
+            results.put((_DONE, submitted, error))
+
+    feeder = threading.Thread(target=feed, name="batch-feeder", daemon=True)
+    feeder.start()
+    finished, submitted, error = 0, None, None
+    try:
+        while submitted is None or finished < submitted:
+            item = results.get()
+            if isinstance(item, tuple) and item[0] is _DONE:
+                _, submitted, error = item
+                continue
+            finished += 1
+            yield item
+        if error is not None:
+            raise error
+    finally:
+        fetch_pool.shutdown(wait=True, cancel_futures=True)
+        claude_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def load_repositories(args, github):
+    """Repository names from the command line, a file, and/or an org listing"""
+    yield from args.repositories
+    if args.file:
+        handle = sys.stdin if args.file == "-" else open(args.file)
+        with handle:
+            for line in handle:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    yield line
+    if args.org:
+        for repo in github.iter_org_repos(args.org, limit=args.limit,
+                                          include_forks=args.include_forks):
+            yield repo["full_name"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("repositories", nargs="*", help="owner/repo names or GitHub URLs")
+    parser.add_argument("--org", help="analyze every repository in this organization")
+    parser.add_argument("--file", help="file with one repository per line ('-' for stdin)")
+    parser.add_argument("--limit", type=int, help="at most this many repositories from --org")
+    parser.add_argument("--include-forks", action="store_true", help="include forks with --org")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--github-workers", type=int, default=DEFAULT_GITHUB_WORKERS)
+    parser.add_argument("--claude-workers", type=int, default=DEFAULT_CLAUDE_WORKERS)
+    parser.add_argument("--no-cache", action="store_true", help="skip the GitHub HTTP cache")
+    args = parser.parse_args()
+    if not (args.repositories or args.org or args.file):
+        parser.error("give repositories, --file or --org")
+
+    rate_limiter = RateLimiter()
+    github = GitHubClient(cache=None if args.no_cache else HTTPCache(),
+                          rate_limiter=rate_limiter, max_connections=args.github_workers)
+    usage = TokenUsage()
+    output = open(args.output, "w") if args.output else sys.stdout
+
+    started = time.time()
+    counts = {"ok": 0, "failed": 0}
+    try:
+        for result in analyze_repositories(
+            load_repositories(args, github), github=github,
+            github_workers=args.github_workers, claude_workers=args.claude_workers,
+            usage=usage,
+        ):
+            counts[result["status"]] += 1
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            status = result["status"] if result["status"] == "ok" else f"failed: {result['error']}"
+            print(f"[{sum(counts.values())}] {result['repository']} {status}", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        github.close()
+
+    elapsed = time.time() - started
+    print(f"\n{counts['ok']} analyzed, {counts['failed']} failed in {elapsed:.1f}s", file=sys.stderr)
+    print(f"Token usage: {usage} (${usage.cost('sonnet'):.4f})", file=sys.stderr)
+    print(f"GitHub quota remaining: {rate_limiter.remaining}; "
+          f"Claude scheduler: {get_scheduler().stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
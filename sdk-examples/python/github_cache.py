@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+HTTP Cache for GitHub API Responses
+Stores bodies with their ETag / Last-Modified validators so repeat requests
+are sent conditionally; a 304 is served from disk and costs no rate limit
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from assistant_db import get_database
+
+DEFAULT_CACHE_PATH = "~/.config/claude/databases/github_cache.db"
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+# Run the size-based eviction once every this many inserts
+EVICT_EVERY = 50
+
+# Per-response headers that must not be replayed from a stored copy
+HOP_HEADERS = {"content-encoding", "content-length", "connection", "keep-alive",
+               "transfer-encoding", "date"}
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+CachedResponse = namedtuple("CachedResponse", "headers body etag last_modified expires_at")
+
+
+def cache_key(url, headers):
+    """Key for a GET: the URL plus the headers that change the representation
+
+    The Authorization header is hashed in so a private response fetched with
+    one token is never served to another.
+    """
+    vary = [url] + [headers.get(name, "") for name in ("Accept", "Authorization")]
+    return hashlib.sha256("\n".join(vary).encode("utf-8")).hexdigest()
+
+
+def storable_headers(headers):
+    return {name: value for name, value in headers.items() if name not in HOP_HEADERS}
+
+
+class HTTPCache:
+    """On-disk conditional-request cache with LRU eviction by count and bytes.
+
+    Entries live in a SQLite table keyed by cache_key(). Lookups are direct
+    reads; inserts and access-time updates go through the database's
+    write-behind queue. A response whose Cache-Control max-age has not run
+    out is served without contacting GitHub at all.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        path = os.path.expanduser(db_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.database = get_database(path)
+        self.writer = self.database.writer()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self.init_table()
+
+    def init_table(self):
+        with self.database.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    key TEXT PRIMARY KEY,
+                    url TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    headers TEXT,
+                    body BLOB,
+                    size INTEGER,
+                    fetched_at REAL,
+                    expires_at REAL,
+                    last_accessed REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_http_cache_last_accessed
+                ON http_cache (last_accessed)
+            ''')
+
+    def get(self, key):
+        """Return the CachedResponse stored under key, or None"""
+        row = self.database.fetch_one(
+            "SELECT headers, body, etag, last_modified, expires_at FROM http_cache WHERE key = ?",
+            (key,),
+        )
+        if row is None:
+            return None
+        headers, body, etag, last_modified, expires_at = row
+        self.writer.submit(
+            "UPDATE http_cache SET last_accessed = ? WHERE key = ?", (time.time(), key)
+        )
+        return CachedResponse(json.loads(headers), body, etag, last_modified, expires_at)
+
+    def validators(self, entry):
+        """Conditional request headers for a stored response"""
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def is_fresh(self, entry):
+        fresh = entry.expires_at > time.time()
+        if fresh:
+            with self._lock:
+                self.fresh_hits += 1
+        return fresh
+
+    def put(self, key, url, headers, body):
+        """Store a 200 response if it carries a validator or a max-age"""
+        with self._lock:
+            self.misses += 1
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        max_age = self.max_age(headers)
+        if not (etag or last_modified or max_age):
+            return
+        now = time.time()
+        self.writer.submit('''
+            INSERT OR REPLACE INTO http_cache
+                (key, url, etag, last_modified, headers, body, size, fetched_at, expires_at, last_accessed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (key, url, etag, last_modified, json.dumps(storable_headers(headers)),
+              body, len(body), now, now + max_age, now))
+
+        with self._lock:
+            self._puts_since_evict += 1
+            evict = self._puts_since_evict >= EVICT_EVERY
+            if evict:
+                self._puts_since_evict = 0
+        if evict:
+            self.evict()
+
+    def refresh(self, key, entry, headers):
+        """Merge the headers of a 304 into the stored entry; returns them"""
+        merged = dict(entry.headers, **storable_headers(headers))
+        now = time.time()
+        self.writer.submit('''
+            UPDATE http_cache SET headers = ?, etag = ?, last_modified = ?, expires_at = ?
+            WHERE key = ?
+        ''', (json.dumps(merged), merged.get("etag", entry.etag),
+              merged.get("last-modified", entry.last_modified),
+              now + self.max_age(headers), key))
+        with self._lock:
+            self.revalidated += 1
+        return merged
+
+    @staticmethod
+    def max_age(headers):
+        match = MAX_AGE.search(headers.get("cache-control", ""))
+        return int(match.group(1)) if match else 0
+
+    def evict(self):
+        """Drop least recently used entries over the entry and byte caps"""
+        self.writer.submit('''
+            DELETE FROM http_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT
+                        key,
+                        ROW_NUMBER() OVER recent AS position,
+                        SUM(size) OVER recent AS running_bytes
+                    FROM http_cache
+                    WINDOW recent AS (ORDER BY last_accessed DESC)
+                )
+                WHERE position > ? OR running_bytes > ?
+            )
+        ''', (self.max_entries, self.max_bytes))
+
+    def clear(self):
+        self.writer.submit("DELETE FROM http_cache", ())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.fresh_hits + self.revalidated + self.misses
+            return {
+                "fresh_hits": self.fresh_hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "hit_rate": (self.fresh_hits + self.revalidated) / lookups if lookups else 0.0,
+            }
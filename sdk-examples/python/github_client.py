@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Pooled GitHub REST Client
+Keep-alive HTTP connections shared across threads, so several API calls can
+run concurrently without a process launch or TLS handshake per call
+"""
+import gzip
+import http.client
+import json
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from github_cache import cache_key
+
+# Point at a stub server (see github_stub_server.py) or GitHub Enterprise
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_TIMEOUT = 30
+MAX_PER_PAGE = 100
+
+# Requests kept back from the hourly quota for interactive use; a
+# RateLimiter stops sending once only this many remain until the reset
+DEFAULT_RATE_RESERVE = 20
+MAX_RATE_LIMIT_RETRIES = 3
+
+LINK_PATTERN = re.compile(r'<([^>]+)>\s*;\s*rel="([^"]+)"')
+
+# Errors that mean an idle keep-alive connection was closed by the server
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class GitHubError(Exception):
+    """A GitHub API request failed"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(f"GitHub API error {status}: {message}")
+        self.status = status
+        self.headers = headers or {}
+
+
+class GitHubResponse:
+    def __init__(self, status, headers, body, from_cache=False):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.from_cache = from_cache
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class ConnectionPool:
+    """Reusable HTTP/1.1 keep-alive connections to one host"""
+
+    def __init__(self, base_url, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path_prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is returned on success, discarded on error"""
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            self._idle.put(conn)
+
+    def _connect(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RateLimiter:
+    """Paces requests against GitHub's X-RateLimit-* response headers.
+
+    Shared by every thread using a client. Requests still in flight are
+    counted against the last reported quota, so concurrent callers can't
+    overshoot it; once only `reserve` requests would be left, or a request
+    is rejected for rate limiting, everyone waits for the window to reset
+    instead of burning requests on errors.
+    """
+
+    def __init__(self, reserve=DEFAULT_RATE_RESERVE):
+        self.reserve = reserve
+        self.remaining = None  # unknown until the first response
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent; pair with release()"""
+        while True:
+            now = time.time()
+            with self._lock:
+                if self.remaining is not None and self.reset_at <= now:
+                    self.remaining = None  # the window has reset
+                until = self.blocked_until
+                if until <= now:
+                    budget = self.reserve if self.remaining is None else self.remaining - self.reserve
+                    if self.in_flight < budget:
+                        self.in_flight += 1
+                        return
+                    if self.remaining is not None and self.remaining <= self.reserve:
+                        until = self.reset_at
+                    else:
+                        until = now + 0.05  # wait for in-flight replies
+            time.sleep(min(until - now, 60))
+
+    def release(self, headers=None):
+        """Finish a request, recording the quota its response reported"""
+        with self._lock:
+            self.in_flight -= 1
+            if headers is None or "x-ratelimit-remaining" not in headers:
+                return
+            remaining = int(headers["x-ratelimit-remaining"])
+            reset_at = float(headers.get("x-ratelimit-reset", 0))
+            # Replies to concurrent requests arrive out of order; within one
+            # window the lowest count is the current one
+            if reset_at == self.reset_at and self.remaining is not None:
+                remaining = min(remaining, self.remaining)
+            if reset_at >= self.reset_at:
+                self.remaining, self.reset_at = remaining, reset_at
+
+    def backoff(self, status, headers, attempt):
+        """Pause everyone after a rate-limited response; False if it isn't one"""
+        if "retry-after" in headers:
+            delay = float(headers["retry-after"])
+        elif headers.get("x-ratelimit-remaining") == "0":
+            delay = max(float(headers.get("x-ratelimit-reset", 0)) - time.time(), 1)
+        elif status == 429:
+            delay = 2 ** attempt
+        else:
+            return False  # a plain 403: permissions, not rate limiting
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + delay)
+        return True
+
+    @property
+    def seconds_until_reset(self):
+        return max(0.0, self.reset_at - time.time())
+
+
+class GitHubClient:
+    """Thread-safe GitHub REST client over a keep-alive connection pool
+
+    Pass an HTTPCache (github_cache.py) to make GETs conditional: stored
+    responses are revalidated with If-None-Match / If-Modified-Since, and
+    GitHub's 304 replies don't count against the rate limit. Pass a
+    RateLimiter to pace against the quota and retry rate-limited requests.
+    """
+
+    def __init__(self, token=None, base_url=GITHUB_API_URL,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, timeout=DEFAULT_TIMEOUT,
+                 cache=None, rate_limiter=None):
+        self.token = token if token is not None else find_token()
+        self.pool = ConnectionPool(base_url, max_connections, timeout)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "Accept-Encoding": "gzip",
+            "User-Agent": "claude-sdk-examples",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if self.token:
+            self.headers["Authorization"] = f"Bearer {self.token}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+
+    def request(self, method, path, params=None, headers=None):
+        """Send a request and return a GitHubResponse (raises GitHubError)
+
+        path is relative to the API root, or an absolute URL on the same
+        host such as a pagination link.
+        """
+        if path.startswith(("http://", "https://")):
+            parts = urllib.parse.urlsplit(path)
+            url = parts.path + ("?" + parts.query if parts.query else "")
+        else:
+            url = self.pool.path_prefix + "/" + path.lstrip("/")
+        if params:
+            url += ("&" if "?" in url else "?") + urllib.parse.urlencode(params)
+        request_headers = dict(self.headers, **(headers or {}))
+
+        cached = key = None
+        if self.cache is not None and method == "GET":
+            key = cache_key(url, request_headers)
+            cached = self.cache.get(key)
+            if cached is not None:
+                if self.cache.is_fresh(cached):
+                    return GitHubResponse(200, cached.headers, cached.body, from_cache=True)
+                request_headers.update(self.cache.validators(cached))
+
+        limiter = self.rate_limiter
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            if limiter is None:
+                status, reason, response_headers, body = self._send(method, url, request_headers)
+                break
+            limiter.acquire()
+            response_headers = None
+            try:
+                status, reason, response_headers, body = self._send(method, url, request_headers)
+            finally:
+                limiter.release(response_headers)
+            if (status not in (403, 429) or attempt == MAX_RATE_LIMIT_RETRIES
+                    or not limiter.backoff(status, response_headers, attempt)):
+                break
+
+        if status == 304 and cached is not None:
+            headers = self.cache.refresh(key, cached, response_headers)
+            return GitHubResponse(200, headers, cached.body, from_cache=True)
+
+        if response_headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        response = GitHubResponse(status, response_headers, body)
+        if status >= 400:
+            try:
+                message = response.json().get("message", reason)
+            except (ValueError, AttributeError):
+                message = reason
+            raise GitHubError(status, message, response_headers)
+        if key is not None and status == 200:
+            self.cache.put(key, url, response_headers, body)
+        return response
+
+    def _send(self, method, url, headers):
+        for attempt in range(2):
+            try:
+                with self.pool.connection() as conn:
+                    conn.request(method, url, headers=headers)
+                    raw = conn.getresponse()
+                    body = raw.read()
+                    return raw.status, raw.reason, {k.lower(): v for k, v in raw.getheaders()}, body
+            except STALE_CONNECTION_ERRORS:
+                # A pooled connection the server already closed; retry once
+                # on a fresh one
+                if attempt:
+                    raise
+
+    def get(self, path, params=None):
+        """GET a path and return the decoded JSON body"""
+        return self.request("GET", path, params).json()
+
+    def paginate(self, path, params=None, limit=None):
+        """Yield items from a list endpoint page by page, following Link headers
+
+        Pages are fetched only as the caller consumes items, and nothing is
+        requested past `limit` items, so a caller that stops early never
+        downloads the rest of the collection.
+        """
+        params = dict(params or {})
+        per_page = MAX_PER_PAGE if limit is None else max(1, min(limit, MAX_PER_PAGE))
+        params.setdefault("per_page", per_page)
+        remaining = limit
+        while path:
+            response = self.request("GET", path, params)
+            for item in response.json():
+                yield item
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining <= 0:
+                        return
+            # The next link already carries per_page and any filters
+            path, params = parse_link_header(response.headers.get("link")).get("next"), None
+
+    def iter_commits(self, owner, repo, limit=None, since=None, until=None, branch=None):
+        """Yield commits newest first, stopping at `limit` or before `since`
+
+        since/until are ISO 8601 timestamps (e.g. "2025-07-01T00:00:00Z")
+        and are also sent to the API, so only the needed pages are served.
+        """
+        params = {}
+        if since:
+            params["since"] = since
+        if until:
+            params["until"] = until
+        if branch:
+            params["sha"] = branch
+        for commit in self.paginate(f"repos/{owner}/{repo}/commits", params, limit):
+            if since and commit["commit"]["author"]["date"] < since:
+                return
+            yield commit
+
+    def iter_org_repos(self, org, limit=None, include_forks=False, include_archived=False):
+        """Yield an organization's repositories, most recently pushed first"""
+        params = {"type": "all" if include_forks else "sources", "sort": "pushed"}
+        if limit is not None:
+            params["per_page"] = max(1, min(limit, MAX_PER_PAGE))
+        count = 0
+        for repo in self.paginate(f"orgs/{org}/repos", params):
+            if repo.get("archived") and not include_archived:
+                continue
+            yield repo
+            count += 1
+            if count == limit:
+                return
+
+    def fetch_repository(self, owner, repo, commit_count=5):
+        """Repository details, recent commits and languages, fetched concurrently
+
+        Returns (repo_data, commits_data, languages_data).
+        """
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            repo_data = executor.submit(self.get, f"repos/{owner}/{repo}")
+            commits_data = executor.submit(
+                lambda: list(self.iter_commits(owner, repo, limit=commit_count))
+            )
+            languages_data = executor.submit(self.get, f"repos/{owner}/{repo}/languages")
+            return repo_data.result(), commits_data.result(), languages_data.result()
+
+
+def parse_link_header(value):
+    """Map rel -> URL from an RFC 8288 Link header"""
+    return {rel: url for url, rel in LINK_PATTERN.findall(value or "")}
+
+
+def find_token():
+    """GitHub token from the environment, else from the gh CLI, else None"""
+    for variable in ("GITHUB_TOKEN", "GH_TOKEN"):
+        if os.environ.get(variable):
+            return os.environ[variable]
+    try:
+        result = subprocess.run(
+            ["gh", "auth", "token"], capture_output=True, text=True, check=True
+        )
+        return result.stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -3,10 +3,18 @@
 GitHub Integration with Claude SDK
 This example shows how to use Claude to analyze GitHub repositories
 """
-import os
 import subprocess
+import http.client
+import itertools
 import json
-from anthropic import Anthropic
+from concurrent.futures import ThreadPoolExecutor
+from client_factory import get_client
+from diff_chunking import DEFAULT_DIFF_CHUNK_TOKENS, chunk_diff, diffstat, parse_diff
+from github_cache import HTTPCache
+from github_client import GitHubClient, GitHubError, find_token
+from prompt_cache import place_cache_breakpoints
+from review_guidelines import review_system
+from token_counting import TokenUsage, estimate_tokens
 
 def get_github_info(repo_url):
     """Extract owner and repo name from GitHub URL"""
@@ -22,46 +30,94 @@ def get_github_info(repo_url):
         return parts[0], parts[1]
     return None, None
 
-def analyze_repository(client, repo_url):
+# Commits shown to Claude in the repository analysis
+RECENT_COMMITS = 5
+
+def fetch_repository_data(owner, repo, github=None):
+    """Fetch (repo_data, commits_data, languages_data) for a repository
+    
+    Uses a pooled HTTP client that issues all three requests concurrently
+    over keep-alive connections, revalidating earlier responses from the
+    on-disk HTTP cache so unchanged data costs no rate limit. Falls back to
+    the gh CLI when the API can't be reached directly or its response is
+    cut short or malformed.
+    """
+    try:
+        if github is not None:
+            return github.fetch_repository(owner, repo, RECENT_COMMITS)
+        with GitHubClient(cache=HTTPCache()) as github:
+            return github.fetch_repository(owner, repo, RECENT_COMMITS)
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        print(f"GitHub API unreachable ({e}); falling back to gh CLI")
+        return fetch_repository_data_gh(owner, repo)
+
+def fetch_repository_data_gh(owner, repo):
+    """Fetch repository data through the gh CLI, one subprocess per call"""
+    # Get repository details
+    repo_info = subprocess.run(
+        ["gh", "api", f"repos/{owner}/{repo}"],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    repo_data = json.loads(repo_info.stdout)
+    
+    # Get recent commits (one page of exactly what we need, not the whole history)
+    commits = subprocess.run(
+        ["gh", "api", f"repos/{owner}/{repo}/commits", "-X", "GET", "-F", f"per_page={RECENT_COMMITS}"],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    commits_data = json.loads(commits.stdout)
+    
+    # Get languages
+    languages = subprocess.run(
+        ["gh", "api", f"repos/{owner}/{repo}/languages"],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    languages_data = json.loads(languages.stdout)
+    
+    return repo_data, commits_data, languages_data
+
+def analyze_repository(client, repo_url, usage=None):
     """Use Claude to analyze a GitHub repository"""
     owner, repo = get_github_info(repo_url)
     if not owner or not repo:
         print(f"Invalid repository URL: {repo_url}")
         return
     
-    # Use gh CLI to get repository information
     try:
-        # Get repository details
-        repo_info = subprocess.run(
-            ["gh", "api", f"repos/{owner}/{repo}"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        repo_data = json.loads(repo_info.stdout)
-        
-        # Get recent commits
-        commits = subprocess.run(
-            ["gh", "api", f"repos/{owner}/{repo}/commits", "--paginate", "-X", "GET", "-F", "per_page=10"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        commits_data = json.loads(commits.stdout)
-        
-        # Get languages
-        languages = subprocess.run(
-            ["gh", "api", f"repos/{owner}/{repo}/languages"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        languages_data = json.loads(languages.stdout)
-        
-    except subprocess.CalledProcessError as e:
+        repo_data, commits_data, languages_data = fetch_repository_data(owner, repo)
+    except (GitHubError, OSError, http.client.HTTPException, ValueError,
+            subprocess.CalledProcessError) as e:
         print(f"Error fetching repository data: {e}")
         return
     
+    print(f"Analyzing {repo_data['full_name']}...")
+    print("=" * 60)
+    
+    message = client.messages.create(
+        **repository_analysis_request(repo_data, commits_data, languages_data)
+    )
+    
+    if usage is not None:
+        usage.add(message)
+    return message.content[0].text
+
+REPOSITORY_QUESTIONS = """Based on this GitHub repository information, please provide:
+
+1. A brief analysis of what this project does
+2. The technology stack being used
+3. How active the development is
+4. Suggestions for potential improvements or contributions
+5. Any notable patterns or practices observed
+"""
+
+def repository_analysis_request(repo_data, commits_data, languages_data):
+    """messages.create() arguments for analyzing fetched repository data"""
     # Prepare context for Claude
     context = f"""
 Repository: {repo_data['full_name']}
@@ -76,69 +132,162 @@ Last Updated: {repo_data['updated_at']}
 Recent Commits:
 """
     
-    for i, commit in enumerate(commits_data[:5], 1):
-        context += f"{i}. {commit['commit']['message'].split('\\n')[0]} by {commit['commit']['author']['name']}\n"
+    for i, commit in enumerate(commits_data[:RECENT_COMMITS], 1):
+        subject = commit['commit']['message'].split('\n')[0]
+        context += f"{i}. {subject} by {commit['commit']['author']['name']}\n"
     
-    # Ask Claude to analyze the repository
-    prompt = f"""Based on this GitHub repository information, please provide:
+    # Ask Claude to analyze the repository; the guidelines are a cached
+    # prefix shared across a batch of repositories
+    return place_cache_breakpoints({
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 2048,
+        "system": review_system("You are a software engineering expert who analyzes GitHub repositories to provide insights and recommendations."),
+        "messages": [
+            {"role": "user", "content": f"{REPOSITORY_QUESTIONS}\nRepository Information:\n{context}"}
+        ],
+    })
 
-1. A brief analysis of what this project does
-2. The technology stack being used
-3. How active the development is
-4. Suggestions for potential improvements or contributions
-5. Any notable patterns or practices observed
+# Sections the final PR description should have
+PR_SECTIONS = """1. PR Title (concise, descriptive)
+2. Summary (2-3 sentences)
+3. What changed (bullet points)
+4. Why these changes were made
+5. Testing performed
+6. Any breaking changes or migration notes"""
 
-Repository Information:
-{context}
-"""
+# Summaries merged per reduce request; more than this are reduced in rounds
+PR_REDUCE_TOKENS = 12000
+
+def create_pr_description(client, diff_content, branch_name, usage=None,
+                          max_chunk_tokens=DEFAULT_DIFF_CHUNK_TOKENS, max_workers=8):
+    """Generate a PR description from a git diff of any size
     
-    print(f"Analyzing {repo_data['full_name']}...")
-    print("=" * 60)
+    diff_content is the diff text or any iterable of its lines, such as
+    git_diff_lines("main...HEAD"), which is read as a stream. A diff that
+    fits in one chunk is described in a single request. A larger one is
+    split per file and hunk into token-budgeted chunks that are summarized
+    in parallel while the rest of the diff is still being read, and the
+    summaries are reduced into the final description.
+    """
+    if isinstance(diff_content, str):
+        diff_content = diff_content.splitlines(keepends=True)
     
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=2048,
-        system="You are a software engineering expert who analyzes GitHub repositories to provide insights and recommendations.",
-        messages=[
-            {"role": "user", "content": prompt}
+    files = []
+    def record(file_diffs):
+        for file_diff in file_diffs:
+            files.append(file_diff._replace(header=None, hunks=None))
+            yield file_diff
+    chunks = chunk_diff(record(parse_diff(diff_content)), max_chunk_tokens)
+    
+    first = next(chunks, None)
+    if first is None:
+        return "The diff is empty; there is nothing to describe."
+    second = next(chunks, None)
+    if second is None:
+        request = _pr_request(branch_name, f"Diff:\n```diff\n{first.text}```")
+        return _text(client.messages.create(**request), usage)
+    
+    def create(request):
+        return client.messages.create(**request)
+    
+    # Map: summarize chunks as they come off the stream
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(create, _chunk_summary_request(branch_name, number, chunk))
+            for number, chunk in enumerate(itertools.chain([first, second], chunks), 1)
         ]
-    )
+        summaries = [_text(future.result(), usage) for future in futures]
+        
+        # Reduce: merge in rounds while the summaries won't fit one request
+        while estimate_tokens("\n\n".join(summaries)) > PR_REDUCE_TOKENS:
+            groups = _group_by_tokens(summaries, PR_REDUCE_TOKENS)
+            requests = [_merge_summaries_request(branch_name, group) for group in groups]
+            summaries = [_text(message, usage) for message in executor.map(create, requests)]
     
+    changes = "\n\n".join(f"### Part {n}\n{summary}" for n, summary in enumerate(summaries, 1))
+    context = f"""Files changed:
+{diffstat(files)}
+
+The diff was too large to show in full. Summaries of its parts, in order:
+{changes}"""
+    return _text(client.messages.create(**_pr_request(branch_name, context)), usage)
+
+def _text(message, usage):
+    if usage is not None:
+        usage.add(message)
     return message.content[0].text
 
-def create_pr_description(client, diff_content, branch_name):
-    """Generate a PR description from git diff"""
+def _pr_request(branch_name, diff_context):
     prompt = f"""Based on this git diff, create a comprehensive pull request description.
 
 Branch: {branch_name}
-Diff:
-```
-{diff_content[:3000]}  # Truncate if too long
-```
+{diff_context}
 
 Please provide:
-1. PR Title (concise, descriptive)
-2. Summary (2-3 sentences)
-3. What changed (bullet points)
-4. Why these changes were made
-5. Testing performed
-6. Any breaking changes or migration notes
+{PR_SECTIONS}
 """
-    
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=1024,
-        temperature=0.3,
-        messages=[
+    return {
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 1024,
+        "temperature": 0.3,
+        "messages": [
             {"role": "user", "content": prompt}
-        ]
-    )
-    
-    return message.content[0].text
+        ],
+    }
+
+def _chunk_summary_request(branch_name, number, chunk):
+    prompt = f"""This is part {number} of a large diff on branch {branch_name}, covering: {', '.join(chunk.paths)}
+
+Summarize what this part changes for a pull request description: behavior added, fixed or removed, notable refactors, tests touched, and anything that could break callers. Be concise and factual; don't guess beyond the diff.
+
+```diff
+{chunk.text}```
+"""
+    return place_cache_breakpoints({
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 512,
+        "temperature": 0.3,
+        "system": review_system("You summarize code changes for pull request descriptions."),
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+    })
+
+def _merge_summaries_request(branch_name, summaries):
+    joined = "\n\n".join(summaries)
+    prompt = f"""Merge these summaries of consecutive parts of a diff on branch {branch_name} into one concise summary. Keep every distinct change, drop repetition.
+
+{joined}
+"""
+    return {
+        "model": "claude-3-5-sonnet-20241022",
+        "max_tokens": 1024,
+        "temperature": 0.3,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+    }
+
+def _group_by_tokens(texts, max_tokens):
+    """Consecutive groups of at least two texts, each under max_tokens if possible"""
+    groups, current, size = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if len(current) >= 2 and size + tokens > max_tokens:
+            groups.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += tokens
+    if len(current) == 1 and groups:
+        groups[-1].append(current[0])
+    elif current:
+        groups.append(current)
+    return groups
 
 def main():
     # Initialize Claude client
-    client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    client = get_client()
+    usage = TokenUsage()
     
     # Example 1: Analyze a repository
     print("Example 1: Repository Analysis")
@@ -146,14 +295,15 @@ def main():
     
     # You can analyze any public repository
     repo_url = "https://github.com/anthropics/anthropic-sdk-python"
-    analysis = analyze_repository(client, repo_url)
+    analysis = analyze_repository(client, repo_url, usage=usage)
     if analysis:
         print(analysis)
     
     print("\n\nExample 2: Generate PR Description")
     print("-" * 60)
     
-    # Example diff (you can get real diff with: git diff main...feature-branch)
+    # Example diff; for a real branch stream it straight from git with
+    # create_pr_description(client, git_diff_lines("main...feature-branch"), "feature-branch")
     sample_diff = """
 diff --git a/src/utils/calculator.py b/src/utils/calculator.py
 index abc123..def456 100644
@@ -172,15 +322,15 @@ index abc123..def456 100644
 +        return base ** exponent
 """
     
-    pr_description = create_pr_description(client, sample_diff, "feature/add-math-operations")
+    pr_description = create_pr_description(client, sample_diff, "feature/add-math-operations", usage=usage)
     print(pr_description)
+    
+    print(f"\nTokens used: {usage}")
 
 if __name__ == "__main__":
-    # Ensure GitHub CLI is authenticated
-    try:
-        subprocess.run(["gh", "auth", "status"], check=True, capture_output=True)
-    except subprocess.CalledProcessError:
-        print("Error: GitHub CLI is not authenticated. Run 'gh auth login' first.")
-        exit(1)
+    # The API client uses GITHUB_TOKEN / GH_TOKEN, or the gh CLI's login
+    if find_token() is None:
+        print("Warning: no GitHub token found (set GITHUB_TOKEN or run 'gh auth login');")
+        print("continuing with unauthenticated requests (60 per hour).")
     
     main()
\ No newline at end of file
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Local GitHub API Stub Server
+Serves canned repository, commit and language data so the GitHub examples
+can be exercised and timed offline, against a simulated rate limit
+
+Usage:
+    python github_stub_server.py --port 8765 --latency 0.1
+    GITHUB_API_URL=http://127.0.0.1:8765 GITHUB_TOKEN=stub python github_integration.py
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+
+def make_commits(count):
+    """Synthetic commit history, newest first, one commit per hour"""
+    newest = datetime(2025, 7, 8, 12, 0, tzinfo=timezone.utc)
+    commits = []
+    for i in range(count):
+        date = (newest - timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        commits.append({
+            "sha": f"{count - i:040x}",
+            "commit": {
+                "message": f"Commit number {count - i}\n\nDetails for change {count - i}.",
+                "author": {"name": f"Developer {i % 7}", "date": date},
+            },
+        })
+    return commits
+
+
+class StubState:
+    """Data and counters shared by all request handlers"""
+
+    def __init__(self, commit_count=5000, latency=0.0, max_age=60, rate_limit=5000,
+                 rate_window=3600, repo_count=50):
+        self.latency = latency
+        self.max_age = max_age
+        self.commits = make_commits(commit_count)
+        self.repo_names = [f"project-{i:03d}" for i in range(repo_count)]
+        self.requests = 0
+        self.connections = 0
+        self.not_modified = 0
+        self.rate_limited = 0
+        # Like GitHub, 304 responses don't use up the rate limit
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.rate_remaining = rate_limit
+        self.rate_reset = int(time.time()) + rate_window
+        self.lock = threading.Lock()
+
+    def take_quota(self):
+        """Refill the quota when the window has passed; False if exhausted"""
+        now = time.time()
+        if now >= self.rate_reset:
+            self.rate_remaining = self.rate_limit
+            self.rate_reset = int(now) + self.rate_window
+        if self.rate_remaining == 0:
+            self.rate_limited += 1
+            return False
+        self.rate_remaining -= 1
+        return True
+
+    def repository(self, owner, repo):
+        return {
+            "full_name": f"{owner}/{repo}",
+            "description": "Stub repository served by github_stub_server.py",
+            "stargazers_count": 1234,
+            "forks_count": 56,
+            "language": "Python",
+            "created_at": "2020-01-01T00:00:00Z",
+            "updated_at": "2025-07-08T12:00:00Z",
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    state = None
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        state = self.state
+        with state.lock:
+            state.requests += 1
+        if state.latency:
+            time.sleep(state.latency)
+
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        org = re.fullmatch(r"/orgs/([^/]+)/repos", url.path)
+        if org:
+            repos = [dict(state.repository(org.group(1), name), name=name, archived=False)
+                     for name in state.repo_names]
+            return self.send_page(url.path, query, repos)
+        match = re.fullmatch(r"/repos/([^/]+)/([^/]+)(/commits|/languages)?", url.path)
+        if not match:
+            return self.send_json(404, {"message": "Not Found"})
+
+        owner, repo, resource = match.groups()
+        if resource is None:
+            return self.send_json(200, state.repository(owner, repo))
+        if resource == "/languages":
+            return self.send_json(200, {"Python": 120000, "Shell": 8000, "JavaScript": 3000})
+        commits = state.commits
+        if "since" in query:
+            commits = [c for c in commits if c["commit"]["author"]["date"] >= query["since"]]
+        return self.send_page(url.path, query, commits)
+
+    def send_page(self, path, query, items):
+        """One page of a list with GitHub-style Link headers"""
+        per_page = min(int(query.get("per_page", 30)), 100)
+        page = int(query.get("page", 1))
+        start = (page - 1) * per_page
+        last_page = max(1, -(-len(items) // per_page))
+
+        links = []
+        filters = {k: v for k, v in query.items() if k not in ("page", "per_page")}
+        base = f"http://{self.headers['Host']}{path}?" + urlencode(dict(filters, per_page=per_page))
+        if page < last_page:
+            links.append(f'<{base}&page={page + 1}>; rel="next"')
+            links.append(f'<{base}&page={last_page}>; rel="last"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        self.send_json(200, items[start:start + per_page], headers)
+
+    def send_json(self, status, payload, headers=None):
+        state = self.state
+        body = json.dumps(payload).encode("utf-8")
+        etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+        not_modified = status == 200 and self.headers.get("If-None-Match") == etag
+        with state.lock:
+            if not_modified:
+                state.not_modified += 1
+            elif not state.take_quota():
+                status, not_modified = 403, False
+                body = json.dumps({"message": "API rate limit exceeded"}).encode("utf-8")
+            remaining = state.rate_remaining
+
+        self.send_response(304 if not_modified else status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", "0" if not_modified else str(len(body)))
+        if status == 200:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"private, max-age={state.max_age}")
+        self.send_header("X-RateLimit-Limit", str(state.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(state.rate_reset))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not not_modified:
+            self.wfile.write(body)
+
+
+def start_stub_server(port=0, commit_count=5000, latency=0.0, max_age=60,
+                      rate_limit=5000, rate_window=3600, repo_count=50):
+    """Start the stub in a background thread; returns (server, base_url)"""
+    state = StubState(commit_count, latency, max_age, rate_limit, rate_window, repo_count)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--commits", type=int, default=5000, help="size of the fake history")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per request")
+    parser.add_argument("--max-age", type=int, default=60, help="Cache-Control max-age in seconds")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="requests per rate window")
+    parser.add_argument("--rate-window", type=int, default=3600, help="rate window in seconds")
+    parser.add_argument("--repos", type=int, default=50, help="repositories listed per org")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.port, args.commits, args.latency, args.max_age,
+                                         args.rate_limit, args.rate_window, args.repos)
+    print(f"GitHub stub listening on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        state = server.state
+        print(f"\nServed {state.requests} requests ({state.not_modified} not modified,"
+              f" {state.rate_limited} rate limited) on {state.connections} connections")
+
+
+if __name__ == "__main__":
+    main()
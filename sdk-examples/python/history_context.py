@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+History Context Assembly
+Builds the "previous related queries" context for a prompt: past interactions
+ranked by relevance and recency, near-duplicates dropped, and trimmed at word
+or sentence boundaries to fill a token budget
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from token_counting import estimate_tokens
+
+# Words too common to help rank past interactions
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or
+should the this to use using what when where which who why with you your
+""".split())
+
+# Age (in days) at which a past interaction's relevance is halved
+HISTORY_HALF_LIFE_DAYS = 30
+
+# Tokens of history added to a prompt, and the most one interaction may take
+HISTORY_TOKEN_BUDGET = 600
+MAX_ITEM_TOKENS = 250
+MAX_QUESTION_TOKENS = 60
+# Smaller leftovers aren't worth another entry
+MIN_ITEM_TOKENS = 40
+# Candidates fetched from the index before re-ranking
+MAX_CANDIDATES = 50
+# Term-set overlap (Jaccard) above which two interactions count as duplicates
+DUPLICATE_SIMILARITY = 0.8
+
+# Assembled contexts are reused for queries with the same significant terms;
+# new interactions show up once an entry expires
+CONTEXT_CACHE_TTL = 60
+CONTEXT_CACHE_ENTRIES = 256
+
+HEADER = "Previous related queries:\n"
+
+_WORDS = re.compile(r"\S+\s*")
+_SENTENCE_END = re.compile(r"[.!?]\s")
+
+
+def significant_terms(text, limit=None):
+    """Distinct lower-cased words of text that aren't stopwords, in order"""
+    terms, seen = [], set()
+    for term in re.findall(r"\w+", text.lower()):
+        if term not in STOPWORDS and term not in seen:
+            seen.add(term)
+            terms.append(term)
+            if limit and len(terms) == limit:
+                break
+    return terms
+
+
+def match_expression(query):
+    """FTS5 OR-query of the significant terms of query ("" if there are none)"""
+    # Quote each term so FTS5 operators in user text are taken literally
+    return " OR ".join(f'"{term}"' for term in significant_terms(query, limit=16))
+
+
+def query_fingerprint(query):
+    """Key shared by queries with the same significant terms in any order"""
+    return hashlib.sha256(" ".join(sorted(significant_terms(query))).encode("utf-8")).hexdigest()
+
+
+def truncate_to_tokens(text, max_tokens):
+    """text cut to about max_tokens, ending on a sentence or word boundary
+
+    Cuts at the last sentence end when one falls in the final third of the
+    allowance, otherwise after the last whole word, and marks the cut with
+    an ellipsis.
+    """
+    text = " ".join(text.split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    end, tokens = 0, 0
+    for word in _WORDS.finditer(text):
+        tokens += estimate_tokens(word.group())
+        if tokens > max_tokens - 1:
+            break
+        end = word.end()
+    kept = text[:end].rstrip()
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(kept + " ")]
+    if sentence_ends and sentence_ends[-1] >= len(kept) * 2 // 3:
+        return kept[:sentence_ends[-1]].rstrip()
+    return kept.rstrip(",;:-") + "..." if kept else ""
+
+
+def recency_weight(age_days, half_life_days=HISTORY_HALF_LIFE_DAYS):
+    return 0.5 ** (max(age_days or 0.0, 0.0) / half_life_days)
+
+
+class HistoryContextAssembler:
+    """Turns the interactions table into a token-budgeted prompt context
+
+    Candidates come from the FTS5 index (BM25) when available, else from
+    recent interactions scored by shared terms. Each is weighted by
+    recency, near-duplicates of a better-ranked one are skipped, and the
+    rest are added best first, truncated to fit, until the budget is spent.
+    """
+
+    def __init__(self, database, fts_enabled, budget=HISTORY_TOKEN_BUDGET,
+                 half_life_days=HISTORY_HALF_LIFE_DAYS, cache_ttl=CONTEXT_CACHE_TTL,
+                 cache_entries=CONTEXT_CACHE_ENTRIES):
+        self.database = database
+        self.fts_enabled = fts_enabled
+        self.budget = budget
+        self.half_life_days = half_life_days
+        self.cache_ttl = cache_ttl
+        self.cache_entries = cache_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # fingerprint -> (context, expires_at)
+        self._lock = threading.Lock()
+
+    def assemble(self, query):
+        """Context for query, or "" when no past interaction is relevant"""
+        fingerprint = query_fingerprint(query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(fingerprint)
+            if entry is not None and entry[1] > now:
+                self._cache.move_to_end(fingerprint)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        context = self.build(query)
+        with self._lock:
+            self._cache[fingerprint] = (context, now + self.cache_ttl)
+            self._cache.move_to_end(fingerprint)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return context
+
+    def build(self, query):
+        """Assemble the context without the cache"""
+        selected, selected_terms = [], []
+        for score, past_query, past_response in self.ranked_candidates(query):
+            terms = set(significant_terms(f"{past_query} {past_response}"))
+            if any(_similarity(terms, other) >= DUPLICATE_SIMILARITY for other in selected_terms):
+                continue
+            selected.append((past_query, past_response))
+            selected_terms.append(terms)
+
+        parts, remaining = [], self.budget - estimate_tokens(HEADER)
+        for past_query, past_response in selected:
+            allowance = min(remaining, MAX_ITEM_TOKENS)
+            if allowance < MIN_ITEM_TOKENS:
+                break
+            question = truncate_to_tokens(past_query, min(MAX_QUESTION_TOKENS, allowance // 3))
+            answer = truncate_to_tokens(past_response, allowance - estimate_tokens(question) - 4)
+            if not question or not answer:
+                continue
+            entry = f"Q: {question}\nA: {answer}\n\n"
+            parts.append(entry)
+            remaining -= estimate_tokens(entry)
+        return HEADER + "".join(parts) if parts else ""
+
+    def ranked_candidates(self, query):
+        """(score, query, response) best first"""
+        terms = significant_terms(query, limit=16)
+        if not terms:
+            return []
+        if self.fts_enabled:
+            rows = self.database.fetch_all('''
+                SELECT -matches.rank, i.query, i.response,
+                       julianday('now') - julianday(i.timestamp)
+                FROM (
+                    SELECT rowid, bm25(interactions_fts, 2.0, 1.0) AS rank
+                    FROM interactions_fts
+                    WHERE interactions_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                ) AS matches
+                JOIN interactions i ON i.id = matches.rowid
+            ''', (match_expression(query), MAX_CANDIDATES))
+        else:
+            query_terms = set(terms)
+            rows = [
+                (_overlap(query_terms, f"{past_query} {past_response}"), past_query, past_response, age)
+                for past_query, past_response, age in self.database.fetch_all('''
+                    SELECT query, response, julianday('now') - julianday(timestamp)
+                    FROM interactions
+                    ORDER BY id DESC
+                    LIMIT ?
+                ''', (MAX_CANDIDATES * 4,))
+            ]
+        ranked = [
+            (relevance * recency_weight(age, self.half_life_days), past_query or "", past_response or "")
+            for relevance, past_query, past_response, age in rows if relevance > 0
+        ]
+        ranked.sort(key=lambda candidate: candidate[0], reverse=True)
+        return ranked
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._cache),
+            }
+
+
+def _similarity(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _overlap(query_terms, text):
+    """Shared significant terms, damped for long texts"""
+    terms = set(significant_terms(text))
+    return len(query_terms & terms) / math.sqrt(1 + len(terms) / 50)
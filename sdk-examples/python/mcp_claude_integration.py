@@ -3,23 +3,81 @@
 MCP + Claude SDK Integration Example
 Shows how to combine MCP services with Claude's capabilities
 """
+import hashlib
 import os
 import sqlite3
+import subprocess
+import threading
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from anthropic import Anthropic
+from types import SimpleNamespace
+from assistant_db import get_database
+from client_factory import get_client
+from code_chunking import (
+    LARGE_SOURCE_TOKENS, Chunk, chunk_requests, chunk_source, detect_language,
+    map_reduce_analysis, merge_request
+)
+from history_context import HISTORY_TOKEN_BUDGET, HistoryContextAssembler
+from message_batches import (
+    POLL_INTERVAL, batch_request, iter_results, result_error, submit_batches, wait_for_batches
+)
+from prompt_cache import place_cache_breakpoints
+from response_cache import DEFAULT_TTL, DEFAULT_MAX_ENTRIES, ResponseCache, make_cache_key
+from review_guidelines import review_system
+from token_counting import TokenUsage, estimate_tokens, usage_of
+
+MODEL = "claude-sonnet-4-20250514"
+QUERY_MAX_TOKENS = 1024
+REVIEW_MAX_TOKENS = 2048
+
+# Bump whenever the review prompt changes so stored reviews are redone
+REVIEW_PROMPT_VERSION = 2
+REVIEW_SYSTEM_PROMPT = "You are an expert code reviewer. Provide constructive, actionable feedback."
+REVIEW_SECTIONS = """1. Summary of functionality
+2. Code quality assessment (1-10)
+3. Potential issues or bugs
+4. Improvement suggestions
+5. Security considerations"""
+
+# Files considered by review_tree()
+REVIEW_EXTENSIONS = (".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".rb", ".java", ".sh")
+# Token usage columns recorded for every API-backed row
+USAGE_COLUMNS = (
+    ("input_tokens", "INTEGER"),
+    ("output_tokens", "INTEGER"),
+    ("cache_read_tokens", "INTEGER"),
+    ("cache_creation_tokens", "INTEGER"),
+)
+
+SKIP_DIRECTORIES = {".git", "node_modules", "venv", ".venv", "__pycache__", "dist", "build"}
+# Larger files are left out of repository reviews
+MAX_REVIEW_FILE_BYTES = 512 * 1024
 
 class IntelligentMCPAssistant:
-    def __init__(self, db_path="~/.config/claude/databases/assistant.db"):
-        self.client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    def __init__(self, db_path="~/.config/claude/databases/assistant.db",
+                 cache_ttl=DEFAULT_TTL, cache_max_entries=DEFAULT_MAX_ENTRIES,
+                 history_budget=HISTORY_TOKEN_BUDGET):
+        self.client = get_client()
         self.db_path = os.path.expanduser(db_path)
+        self.db = get_database(self.db_path)
         self.init_database()
+        # Inserts are queued and committed in batches off the request path
+        self.writer = self.db.writer()
+        self.cache = ResponseCache(self.db, ttl=cache_ttl, max_entries=cache_max_entries)
+        self.history = HistoryContextAssembler(self.db, self.fts_enabled, budget=history_budget)
     
     def init_database(self):
         """Initialize SQLite database for storing interactions"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.db.transaction() as conn:
+            cursor = conn.cursor()
+            self.create_tables(cursor)
+            self.fts_enabled = self.init_search_index(cursor)
+            self.init_rollups(cursor)
+    
+    def create_tables(self, cursor):
+        """Create the base tables if they don't exist yet"""
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS interactions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,86 +100,686 @@ class IntelligentMCPAssistant:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Columns added after the original schema; older databases are migrated
+        self.add_missing_columns(cursor, "interactions", USAGE_COLUMNS)
+        self.add_missing_columns(cursor, "code_reviews", (
+            ("content_hash", "TEXT"),
+            ("model", "TEXT"),
+            ("prompt_version", "INTEGER"),
+            ("tokens_used", "INTEGER"),
+        ) + USAGE_COLUMNS)
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_code_reviews_content
+            ON code_reviews (content_hash, model, prompt_version)
+        ''')
+        
+        # Checkpoints for review_repository() so interrupted runs can resume
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS review_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                root TEXT,
+                status TEXT,
+                started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                finished_at DATETIME
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS review_run_files (
+                run_id INTEGER,
+                file_path TEXT,
+                status TEXT,
+                error TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (run_id, file_path)
+            )
+        ''')
+        
+        # Message Batches submitted by submit_review_batches(), and every
+        # request in them, until collect_review_batches() stores the results
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS review_batches (
+                batch_id TEXT PRIMARY KEY,
+                status TEXT,
+                request_count INTEGER,
+                submitted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                collected_at DATETIME
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS review_batch_items (
+                batch_id TEXT,
+                custom_id TEXT,
+                job TEXT,
+                kind TEXT,
+                file_path TEXT,
+                content_hash TEXT,
+                part INTEGER,
+                parts INTEGER,
+                start_line INTEGER,
+                end_line INTEGER,
+                status TEXT,
+                result TEXT,
+                usage TEXT,
+                PRIMARY KEY (batch_id, custom_id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_review_batch_items_job
+            ON review_batch_items (job, kind)
+        ''')
+        
+    
+    @staticmethod
+    def add_missing_columns(cursor, table, columns):
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, column_type in columns:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
     
-    def analyze_file_with_context(self, file_path):
-        """Read file using MCP filesystem and analyze with Claude"""
+    def init_search_index(self, cursor):
+        """Create the FTS5 index over interactions, backfilling existing rows"""
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'interactions_fts'"
+        )
+        is_new = cursor.fetchone() is None
+        
         try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            prompt = f"""Analyze this code file and provide:
-1. Summary of functionality
-2. Code quality assessment (1-10)
-3. Potential issues or bugs
-4. Improvement suggestions
-5. Security considerations
-
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+                    query,
+                    response,
+                    content='interactions',
+                    content_rowid='id'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; fall back to LIKE scans
+            return False
+        
+        # Keep the external-content index in sync with the base table
+        for trigger in (
+            '''
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_insert
+            AFTER INSERT ON interactions BEGIN
+                INSERT INTO interactions_fts (rowid, query, response)
+                VALUES (new.id, new.query, new.response);
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_delete
+            AFTER DELETE ON interactions BEGIN
+                INSERT INTO interactions_fts (interactions_fts, rowid, query, response)
+                VALUES ('delete', old.id, old.query, old.response);
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_update
+            AFTER UPDATE ON interactions BEGIN
+                INSERT INTO interactions_fts (interactions_fts, rowid, query, response)
+                VALUES ('delete', old.id, old.query, old.response);
+                INSERT INTO interactions_fts (rowid, query, response)
+                VALUES (new.id, new.query, new.response);
+            END
+            ''',
+        ):
+            cursor.execute(trigger)
+        
+        if is_new:
+            # Index interactions stored before the FTS table existed
+            cursor.execute("INSERT INTO interactions_fts (interactions_fts) VALUES ('rebuild')")
+        
+        return True
+    
+    def init_rollups(self, cursor):
+        """Create hourly/daily activity rollups maintained by insert triggers
+        
+        Summaries read these small tables instead of scanning interactions
+        and code_reviews, so their cost doesn't grow with history.
+        """
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_code_reviews_timestamp ON code_reviews (timestamp)"
+        )
+        
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_activity'"
+        )
+        is_new = cursor.fetchone() is None
+        
+        for table, bucket in (("hourly_activity", "hour"), ("daily_activity", "day")):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {bucket} TEXT PRIMARY KEY,
+                    interactions INTEGER NOT NULL DEFAULT 0,
+                    tokens_used INTEGER NOT NULL DEFAULT 0,
+                    code_reviews INTEGER NOT NULL DEFAULT 0,
+                    scored_reviews INTEGER NOT NULL DEFAULT 0,
+                    score_total INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_queries (
+                day TEXT,
+                query TEXT,
+                count INTEGER NOT NULL DEFAULT 0,
+                last_seen DATETIME,
+                PRIMARY KEY (day, query)
+            )
+        ''')
+        
+        # (table, bucket expression) pairs the triggers keep up to date
+        buckets = (
+            ("hourly_activity", "hour", "strftime('%Y-%m-%d %H:00:00', {row}.timestamp)"),
+            ("daily_activity", "day", "date({row}.timestamp)"),
+        )
+        def interaction_rollup(row, sign):
+            statements = []
+            for table, bucket, expression in buckets:
+                statements.append(f'''
+                    INSERT INTO {table} ({bucket}, interactions, tokens_used)
+                    VALUES ({expression.format(row=row)}, {sign}1, {sign}COALESCE({row}.tokens_used, 0))
+                    ON CONFLICT ({bucket}) DO UPDATE SET
+                        interactions = interactions + excluded.interactions,
+                        tokens_used = tokens_used + excluded.tokens_used;
+                ''')
+            statements.append(f'''
+                INSERT INTO daily_queries (day, query, count, last_seen)
+                VALUES (date({row}.timestamp), substr({row}.query, 1, 200), {sign}1, {row}.timestamp)
+                ON CONFLICT (day, query) DO UPDATE SET
+                    count = count + excluded.count,
+                    last_seen = max(last_seen, excluded.last_seen);
+            ''')
+            return "".join(statements)
+        
+        def review_rollup(row, sign):
+            statements = []
+            for table, bucket, expression in buckets:
+                statements.append(f'''
+                    INSERT INTO {table} ({bucket}, code_reviews, scored_reviews, score_total)
+                    VALUES (
+                        {expression.format(row=row)},
+                        {sign}1,
+                        {sign}({row}.score IS NOT NULL),
+                        {sign}COALESCE({row}.score, 0)
+                    )
+                    ON CONFLICT ({bucket}) DO UPDATE SET
+                        code_reviews = code_reviews + excluded.code_reviews,
+                        scored_reviews = scored_reviews + excluded.scored_reviews,
+                        score_total = score_total + excluded.score_total;
+                ''')
+            return "".join(statements)
+        
+        # An update is the old row leaving its buckets and the new one entering
+        for table, rollup, columns in (
+            ("interactions", interaction_rollup, "timestamp, query, tokens_used"),
+            ("code_reviews", review_rollup, "timestamp, score"),
+        ):
+            for event, body in (
+                ("INSERT", rollup("new", "+")),
+                ("DELETE", rollup("old", "-")),
+                (f"UPDATE OF {columns}", rollup("old", "-") + rollup("new", "+")),
+            ):
+                name = event.split()[0].lower()
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_rollup_{name}
+                    AFTER {event} ON {table} BEGIN
+                        {body}
+                    END
+                ''')
+        
+        if is_new:
+            self.backfill_rollups(cursor)
+    
+    def backfill_rollups(self, cursor):
+        """Populate freshly created rollups from rows already in the database"""
+        for table, bucket, expression in (
+            ("hourly_activity", "hour", "strftime('%Y-%m-%d %H:00:00', timestamp)"),
+            ("daily_activity", "day", "date(timestamp)"),
+        ):
+            cursor.execute(f'''
+                INSERT INTO {table} ({bucket}, interactions, tokens_used)
+                SELECT {expression}, COUNT(*), COALESCE(SUM(tokens_used), 0)
+                FROM interactions
+                GROUP BY 1
+            ''')
+            cursor.execute(f'''
+                INSERT INTO {table} ({bucket}, code_reviews, scored_reviews, score_total)
+                SELECT {expression}, COUNT(*), COUNT(score), COALESCE(SUM(score), 0)
+                FROM code_reviews
+                WHERE true  -- lets SQLite parse the upsert after a SELECT
+                GROUP BY 1
+                ON CONFLICT ({bucket}) DO UPDATE SET
+                    code_reviews = excluded.code_reviews,
+                    scored_reviews = excluded.scored_reviews,
+                    score_total = excluded.score_total
+            ''')
+        cursor.execute('''
+            INSERT INTO daily_queries (day, query, count, last_seen)
+            SELECT date(timestamp), substr(query, 1, 200), COUNT(*), MAX(timestamp)
+            FROM interactions
+            GROUP BY 1, 2
+        ''')
+    
+    def analyze_file_with_context(self, file_path, force=False):
+        """Read file using MCP filesystem and analyze with Claude
+        
+        Files whose content was already reviewed with the current model and
+        prompt version return the stored review without an API call, unless
+        force=True.
+        """
+        try:
+            review, _ = self.review_file(file_path, force=force)
+            return review
+        except Exception as e:
+            return f"Error analyzing file: {str(e)}"
+    
+    def review_file(self, file_path, force=False):
+        """Review one file, returning (review, reused_from_database)"""
+        content, content_hash, stored = self.load_for_review(file_path, force)
+        if stored is not None:
+            return stored, True
+        
+        usage = TokenUsage()
+        if estimate_tokens(content) > LARGE_SOURCE_TOKENS:
+            # Too big for one prompt: review chunks in parallel and merge
+            response = map_reduce_analysis(
+                self.client, content, detect_language(file_path), REVIEW_SECTIONS,
+                model=MODEL, system=review_system(REVIEW_SYSTEM_PROMPT), name=file_path, usage=usage
+            )
+        else:
+            response = self.review_content(file_path, content, usage)
+        
+        # Store in database
+        self.store_code_review(file_path, response, content_hash=content_hash, usage=usage)
+        
+        return response, False
+    
+    def load_for_review(self, file_path, force=False):
+        """Read a file for review: (content, content_hash, stored_review)
+        
+        stored_review is the review already on record for identical content,
+        or None when the file needs reviewing (always None with force=True).
+        """
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        content_hash = hashlib.sha256(raw).hexdigest()
+        stored = None if force else self.find_code_review(content_hash)
+        return raw.decode('utf-8', errors='replace'), content_hash, stored
+    
+    def review_content(self, file_path, content, usage=None):
+        """Single-request review of a whole file's content"""
+        message = self.client.messages.create(**self.review_request(file_path, content))
+        if usage is not None:
+            usage.add(message)
+        return message.content[0].text
+    
+    def review_request(self, file_path, content):
+        """messages.create() arguments for reviewing one file
+        
+        The shared review guidelines lead the system prompt, so bulk and
+        batch reviews read one cached prefix; the file itself comes last.
+        """
+        prompt = f"""Analyze this code file and provide:
+{REVIEW_SECTIONS}
 File: {file_path}
 Content:
 ```
 {content}
 ```
 """
-            
-            message = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=2048,
-                system="You are an expert code reviewer. Provide constructive, actionable feedback.",
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            response = message.content[0].text
-            
-            # Store in database
-            self.store_code_review(file_path, response)
-            
-            return response
-            
-        except Exception as e:
-            return f"Error analyzing file: {str(e)}"
+        return place_cache_breakpoints({
+            "model": MODEL,
+            "max_tokens": REVIEW_MAX_TOKENS,
+            "system": review_system(REVIEW_SYSTEM_PROMPT),
+            "messages": [{"role": "user", "content": prompt}],
+        })
     
-    def store_code_review(self, file_path, analysis):
+    def find_code_review(self, content_hash):
+        """Latest stored review of this exact content, model and prompt"""
+        row = self.db.fetch_one('''
+            SELECT issues FROM code_reviews
+            WHERE content_hash = ? AND model = ? AND prompt_version = ?
+            ORDER BY id DESC
+            LIMIT 1
+        ''', (content_hash, MODEL, REVIEW_PROMPT_VERSION))
+        return row[0] if row else None
+    
+    def store_code_review(self, file_path, analysis, content_hash=None, usage=None):
         """Store code review results in SQLite"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        usage = usage or TokenUsage()
         # Parse the analysis to extract structured data
         # In a real implementation, you'd parse this more carefully
-        cursor.execute('''
-            INSERT INTO code_reviews (file_path, issues, suggestions, score)
-            VALUES (?, ?, ?, ?)
-        ''', (file_path, analysis, "", 0))
+        self.writer.submit('''
+            INSERT INTO code_reviews
+                (file_path, issues, suggestions, score, content_hash, model, prompt_version,
+                 tokens_used, input_tokens, output_tokens, cache_read_tokens, cache_creation_tokens)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (file_path, analysis, "", 0, content_hash, MODEL, REVIEW_PROMPT_VERSION,
+              usage.total_tokens, usage.input_tokens, usage.output_tokens,
+              usage.cache_read_input_tokens, usage.cache_creation_input_tokens))
+    
+    def review_tree(self, root, extensions=REVIEW_EXTENSIONS, force=False):
+        """Review every source file under root that is new or has changed
+        
+        Unchanged files are matched by content hash and cost no API call, so
+        a nightly re-review is proportional to churn rather than repo size.
+        """
+        results = {"reviewed": [], "unchanged": [], "failed": []}
+        for path in walk_source_files(root, extensions):
+            try:
+                _, reused = self.review_file(path, force=force)
+            except Exception as e:
+                results["failed"].append((path, str(e)))
+                continue
+            results["unchanged" if reused else "reviewed"].append(path)
+        
+        self.writer.flush()
+        return results
+    
+    def review_repository(self, root, workers=4, max_in_flight=None, extensions=REVIEW_EXTENSIONS,
+                          max_file_bytes=MAX_REVIEW_FILE_BYTES, resume=True, force=False):
+        """Review a whole repository concurrently, checkpointing progress
+        
+        Files come from git ls-files (so .gitignore is honored), are filtered
+        by extension and size, and are reviewed by `workers` threads with at
+        most `max_in_flight` files queued or running at once. Each finished
+        file is checkpointed in review_run_files; with resume=True an
+        unfinished run for the same root picks up where it stopped.
+        """
+        root = os.path.abspath(root)
+        run_id = self.start_review_run(root, resume)
+        finished = {
+            row[0] for row in self.db.fetch_all(
+                "SELECT file_path FROM review_run_files WHERE run_id = ? AND status != 'failed'",
+                (run_id,)
+            )
+        }
+        
+        results = {"run_id": run_id, "reviewed": [], "unchanged": [], "failed": [],
+                   "resumed": len(finished)}
+        results_lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(max_in_flight or workers * 2)
+        
+        def review(relative_path):
+            try:
+                try:
+                    _, reused = self.review_file(os.path.join(root, relative_path), force=force)
+                    status, error = ("unchanged" if reused else "reviewed"), None
+                except Exception as e:
+                    status, error = "failed", str(e)
+                self.writer.submit('''
+                    INSERT OR REPLACE INTO review_run_files (run_id, file_path, status, error)
+                    VALUES (?, ?, ?, ?)
+                ''', (run_id, relative_path, status, error))
+                with results_lock:
+                    results[status].append(relative_path)
+            finally:
+                in_flight.release()
+        
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="review")
+        try:
+            for relative_path in list_repository_files(root, extensions, max_file_bytes):
+                if relative_path in finished:
+                    continue
+                in_flight.acquire()
+                executor.submit(review, relative_path)
+            executor.shutdown(wait=True)
+        finally:
+            # On interrupt, drop queued files; the checkpoint keeps finished ones
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.writer.flush()
+        
+        self.db.execute('''
+            UPDATE review_runs SET status = 'finished', finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (run_id,))
+        return results
+    
+    def start_review_run(self, root, resume=True):
+        """Return the unfinished run for root when resuming, else a new run"""
+        if resume:
+            row = self.db.fetch_one('''
+                SELECT id FROM review_runs
+                WHERE root = ? AND status = 'running'
+                ORDER BY id DESC
+                LIMIT 1
+            ''', (root,))
+            if row:
+                return row[0]
+        cursor = self.db.execute(
+            "INSERT INTO review_runs (root, status) VALUES (?, 'running')", (root,)
+        )
+        return cursor.lastrowid
+    
+    def submit_review_batches(self, root, extensions=REVIEW_EXTENSIONS, force=False,
+                              max_file_bytes=MAX_REVIEW_FILE_BYTES):
+        """Queue reviews of new or changed files under root as Message Batches
         
-        conn.commit()
-        conn.close()
+        Nothing waits for the answers: collect_review_batches(), in this
+        process or a later one, stores them in code_reviews as batches end.
+        Files over LARGE_SOURCE_TOKENS are sent as per-chunk reviews whose
+        merge goes out in a follow-up batch. Content that is already
+        reviewed or waiting in a batch is skipped.
+        """
+        root = os.path.abspath(root)
+        queued = {
+            row[0] for row in self.db.fetch_all(
+                "SELECT content_hash FROM review_batch_items WHERE status = 'pending'"
+            )
+        }
+        results = {"requests": 0, "unchanged": 0, "batches": []}
+        items = {}  # custom_id -> review_batch_items row, until its batch is recorded
+        
+        def requests():
+            for relative_path in list_repository_files(root, extensions, max_file_bytes):
+                path = os.path.join(root, relative_path)
+                try:
+                    content, content_hash, stored = self.load_for_review(path, force)
+                except OSError:
+                    continue
+                if stored is not None or content_hash in queued:
+                    results["unchanged"] += 1
+                    continue
+                queued.add(content_hash)
+                for custom_id, item, params in self.batch_review_items(path, content, content_hash):
+                    items[custom_id] = item
+                    yield batch_request(custom_id, params)
+        
+        def record(batch, batch_requests):
+            rows = [(batch.id, r["custom_id"]) + items.pop(r["custom_id"]) for r in batch_requests]
+            self.record_review_batch(batch, rows)
+            results["requests"] += len(rows)
+            results["batches"].append(batch.id)
+        
+        submit_batches(self.client, requests(), on_submit=record)
+        return results
+    
+    def batch_review_items(self, file_path, content, content_hash):
+        """Yield (custom_id, item, params) for the batch requests reviewing one file
+        
+        item is the rest of the file's review_batch_items row: (job, kind,
+        file_path, content_hash, part, parts, start_line, end_line).
+        """
+        job = uuid.uuid4().hex  # one per submission, so retries never mix with old parts
+        if estimate_tokens(content) > LARGE_SOURCE_TOKENS:
+            chunks = chunk_source(content, detect_language(file_path))
+            if len(chunks) > 1:
+                requests = chunk_requests(chunks, detect_language(file_path), REVIEW_SECTIONS,
+                                          MODEL, review_system(REVIEW_SYSTEM_PROMPT), file_path,
+                                          REVIEW_MAX_TOKENS)
+                for part, (chunk, params) in enumerate(zip(chunks, requests), 1):
+                    yield (f"{job}-{part}", (job, "chunk", file_path, content_hash, part,
+                                              len(chunks), chunk.start_line, chunk.end_line), params)
+                return
+        yield job, (job, "file", file_path, content_hash, 1, 1, None, None), \
+            self.review_request(file_path, content)
+    
+    def record_review_batch(self, batch, rows):
+        """Record a submitted batch and its items before anything else happens"""
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO review_batches (batch_id, status, request_count) VALUES (?, 'submitted', ?)",
+                (batch.id, len(rows))
+            )
+            conn.executemany('''
+                INSERT INTO review_batch_items
+                    (batch_id, custom_id, job, kind, file_path, content_hash,
+                     part, parts, start_line, end_line, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending')
+            ''', rows)
+    
+    def collect_review_batches(self, poll_interval=POLL_INTERVAL, on_poll=None):
+        """Wait for submitted review batches and store their results
+        
+        Results stream into code_reviews as each batch ends. Once every
+        part of a chunked file has succeeded, its merge is submitted and
+        waited for too. Failed requests are recorded, and the file is
+        submitted again by the next submit_review_batches(). Returns the
+        number of reviews stored and requests failed, and the token usage.
+        """
+        results = {"stored": 0, "failed": 0, "usage": TokenUsage()}
+        while True:
+            self.submit_merge_batches()
+            batch_ids = [
+                row[0] for row in self.db.fetch_all(
+                    "SELECT batch_id FROM review_batches WHERE status = 'submitted' ORDER BY submitted_at"
+                )
+            ]
+            if not batch_ids:
+                return results
+            for batch in wait_for_batches(self.client, batch_ids, poll_interval, on_poll=on_poll):
+                self.store_batch_results(batch.id, results)
+    
+    def store_batch_results(self, batch_id, results):
+        """Stream one ended batch's results into the database"""
+        items = {
+            row[0]: row[1:] for row in self.db.fetch_all(
+                "SELECT custom_id, job, kind, file_path, content_hash FROM review_batch_items WHERE batch_id = ?",
+                (batch_id,)
+            )
+        }
+        for custom_id, result in iter_results(self.client, batch_id):
+            if custom_id not in items:
+                continue
+            job, kind, file_path, content_hash = items[custom_id]
+            if result.type != "succeeded":
+                status, text, usage = "failed", result_error(result), None
+                results["failed"] += 1
+            else:
+                message = result.message
+                status, text, usage = "succeeded", message.content[0].text, usage_of(message)
+                results["usage"].add(message)
+                if kind != "chunk":
+                    total = usage if kind == "file" else self.job_usage(job).add(message)
+                    self.store_code_review(file_path, text, content_hash=content_hash, usage=total)
+                    results["stored"] += 1
+                    text = None  # the review itself lives in code_reviews
+            self.writer.submit('''
+                UPDATE review_batch_items SET status = ?, result = ?, usage = ?
+                WHERE batch_id = ? AND custom_id = ?
+            ''', (status, text, usage and json.dumps(usage.as_dict()), batch_id, custom_id))
+        self.writer.submit('''
+            UPDATE review_batches SET status = 'collected', collected_at = CURRENT_TIMESTAMP
+            WHERE batch_id = ?
+        ''', (batch_id,))
+        self.writer.flush()
+    
+    def submit_merge_batches(self):
+        """Submit the merge of every chunked file whose parts have all succeeded
+        
+        A job gets one merge attempt; if that fails, the file is reviewed
+        from scratch by the next submit_review_batches().
+        """
+        jobs = self.db.fetch_all('''
+            SELECT job FROM review_batch_items
+            WHERE kind = 'chunk'
+            GROUP BY job
+            HAVING SUM(status = 'succeeded') = MAX(parts)
+               AND job NOT IN (SELECT job FROM review_batch_items WHERE kind = 'merge')
+        ''')
+        items = {}
+        
+        def requests():
+            for (job,) in jobs:
+                rows = self.db.fetch_all('''
+                    SELECT file_path, content_hash, parts, start_line, end_line, result
+                    FROM review_batch_items
+                    WHERE job = ? AND kind = 'chunk'
+                    ORDER BY part
+                ''', (job,))
+                file_path, content_hash, parts = rows[0][:3]
+                chunks = [Chunk(row[3], row[4], "") for row in rows]
+                custom_id = f"{job}-merge"
+                items[custom_id] = (job, "merge", file_path, content_hash, None, parts, None, None)
+                yield batch_request(custom_id, merge_request(
+                    chunks, [row[5] for row in rows], REVIEW_SECTIONS, MODEL,
+                    review_system(REVIEW_SYSTEM_PROMPT), file_path, REVIEW_MAX_TOKENS
+                ))
+        
+        def record(batch, batch_requests):
+            self.record_review_batch(
+                batch, [(batch.id, r["custom_id"]) + items.pop(r["custom_id"]) for r in batch_requests]
+            )
+        
+        return submit_batches(self.client, requests(), on_submit=record)
+    
+    def job_usage(self, job):
+        """Token usage of a chunked file's part reviews so far"""
+        usage = TokenUsage()
+        for (stored,) in self.db.fetch_all(
+            "SELECT usage FROM review_batch_items WHERE job = ? AND kind = 'chunk' AND usage IS NOT NULL",
+            (job,)
+        ):
+            usage.add(SimpleNamespace(**json.loads(stored)))
+        return usage
     
     def get_historical_insights(self, query):
-        """Use past interactions to provide better responses"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Use past interactions to provide better responses
         
-        # Get recent related interactions
-        cursor.execute('''
-            SELECT query, response FROM interactions
-            WHERE query LIKE ?
-            ORDER BY timestamp DESC
-            LIMIT 5
-        ''', (f'%{query}%',))
+        The most relevant and recent interactions, deduplicated and trimmed
+        to the history token budget; see HistoryContextAssembler.
+        """
+        return self.history.assemble(query)
+    
+    def intelligent_query(self, query, use_history=True, use_cache=True):
+        """Process a query with optional historical context
+        
+        Repeated queries are answered from the response cache; pass
+        use_cache=False to force a fresh API call that leaves the cache
+        untouched.
+        """
+        cache_key = self.query_cache_key(query, use_history) if use_cache else None
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        history = cursor.fetchall()
-        conn.close()
+        prompt, context = self.build_query_prompt(query, use_history)
+        
+        message = self.client.messages.create(
+            model=MODEL,
+            max_tokens=QUERY_MAX_TOKENS,
+            messages=[{"role": "user", "content": prompt}]
+        )
         
-        context = "Previous related queries:\n"
-        for past_query, past_response in history:
-            context += f"Q: {past_query[:100]}...\n"
-            context += f"A: {past_response[:200]}...\n\n"
+        response = message.content[0].text
+        self.record_interaction(cache_key, query, context, response, usage_of(message))
         
-        return context if history else ""
+        return response
+    
+    def query_cache_key(self, query, use_history=True):
+        return make_cache_key(query, MODEL, max_tokens=QUERY_MAX_TOKENS, use_history=use_history)
     
-    def intelligent_query(self, query, use_history=True):
-        """Process a query with optional historical context"""
+    def build_query_prompt(self, query, use_history=True):
+        """Return (prompt, context) for a query, adding related history"""
         context = ""
         if use_history:
             context = self.get_historical_insights(query)
@@ -129,64 +787,92 @@ Content:
         prompt = query
         if context:
             prompt = f"Context from previous interactions:\n{context}\n\nCurrent query: {query}"
+        return prompt, context
+    
+    def record_interaction(self, cache_key, query, context, response, usage):
+        """Cache a fresh response and queue the interaction for storage
         
-        message = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        response = message.content[0].text
+        A cache_key of None skips the response cache. Token counts come from
+        the API's usage fields; tokens_used is their total, including
+        prompt-cache reads and writes.
+        """
+        if cache_key is not None:
+            self.cache.put(cache_key, response, model=MODEL)
         
         # Store interaction
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO interactions (query, response, context, tokens_used)
-            VALUES (?, ?, ?, ?)
-        ''', (query, response, context, len(prompt.split()) + len(response.split())))
-        conn.commit()
-        conn.close()
-        
-        return response
+        self.writer.submit('''
+            INSERT INTO interactions
+                (query, response, context, tokens_used,
+                 input_tokens, output_tokens, cache_read_tokens, cache_creation_tokens)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (query, response, context, usage.total_tokens,
+              usage.input_tokens, usage.output_tokens,
+              usage.cache_read_input_tokens, usage.cache_creation_input_tokens))
     
-    def generate_daily_summary(self):
-        """Generate a summary of today's activities"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_activity_summary(self, start_day=None, end_day=None, top=5):
+        """Activity totals for a date range (YYYY-MM-DD, UTC; default today)
         
-        # Get today's data
-        cursor.execute('''
-            SELECT COUNT(*), SUM(tokens_used) FROM interactions
-            WHERE DATE(timestamp) = DATE('now')
-        ''')
-        interactions_count, total_tokens = cursor.fetchone()
+        Reads only the rollup tables, never the raw history.
+        """
+        # Include rows still waiting in the write-behind queue
+        self.writer.flush()
+        start_day = start_day or self.db.fetch_one("SELECT date('now')")[0]
+        end_day = end_day or start_day
         
-        cursor.execute('''
-            SELECT COUNT(*), AVG(score) FROM code_reviews
-            WHERE DATE(timestamp) = DATE('now')
-        ''')
-        reviews_count, avg_score = cursor.fetchone()
+        interactions, tokens_used, code_reviews, scored_reviews, score_total = self.db.fetch_one('''
+            SELECT
+                COALESCE(SUM(interactions), 0),
+                COALESCE(SUM(tokens_used), 0),
+                COALESCE(SUM(code_reviews), 0),
+                COALESCE(SUM(scored_reviews), 0),
+                COALESCE(SUM(score_total), 0)
+            FROM daily_activity
+            WHERE day BETWEEN ? AND ?
+        ''', (start_day, end_day))
         
-        cursor.execute('''
-            SELECT query FROM interactions
-            WHERE DATE(timestamp) = DATE('now')
-            ORDER BY timestamp DESC
-            LIMIT 10
-        ''')
-        recent_queries = [row[0] for row in cursor.fetchall()]
+        top_queries = self.db.fetch_all('''
+            SELECT query, SUM(count) AS total FROM daily_queries
+            WHERE day BETWEEN ? AND ?
+            GROUP BY query
+            HAVING total > 0
+            ORDER BY total DESC, MAX(last_seen) DESC
+            LIMIT ?
+        ''', (start_day, end_day, top))
         
-        conn.close()
+        return {
+            "start_day": start_day,
+            "end_day": end_day,
+            "interactions": interactions,
+            "tokens_used": tokens_used,
+            "code_reviews": code_reviews,
+            "average_score": score_total / scored_reviews if scored_reviews else None,
+            "top_queries": top_queries,
+        }
+    
+    def get_hourly_activity(self, day=None):
+        """Per-hour interaction, token and review counts for one day (UTC)"""
+        self.writer.flush()
+        day = day or self.db.fetch_one("SELECT date('now')")[0]
+        return self.db.fetch_all('''
+            SELECT hour, interactions, tokens_used, code_reviews FROM hourly_activity
+            WHERE hour >= ? AND hour < date(?, '+1 day')
+            ORDER BY hour
+        ''', (day, day))
+    
+    def generate_daily_summary(self):
+        """Generate a summary of today's activities"""
+        # Get today's data
+        activity = self.get_activity_summary()
         
         summary_data = f"""
 Today's Activity Summary:
-- Total interactions: {interactions_count or 0}
-- Tokens used: {total_tokens or 0}
-- Code reviews: {reviews_count or 0}
-- Average code score: {avg_score or 'N/A'}
+- Total interactions: {activity['interactions']}
+- Tokens used: {activity['tokens_used']}
+- Code reviews: {activity['code_reviews']}
+- Average code score: {activity['average_score'] or 'N/A'}
 
-Recent queries:
-{chr(10).join(f"- {q[:80]}..." for q in recent_queries[:5])}
+Top queries:
+{chr(10).join(f"- {q[:80]}... ({count}x)" for q, count in activity['top_queries'])}
 """
         
         # Use Claude to create an insightful summary
@@ -201,7 +887,7 @@ Data:
 """
         
         message = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
+            model=MODEL,
             max_tokens=512,
             temperature=0.7,
             messages=[{"role": "user", "content": prompt}]
@@ -209,6 +895,44 @@ Data:
         
         return message.content[0].text
 
+def walk_source_files(root, extensions=REVIEW_EXTENSIONS):
+    """Yield source file paths under root, skipping vendored and hidden directories"""
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(
+            d for d in subdirectories
+            if d not in SKIP_DIRECTORIES and not d.startswith(".")
+        )
+        for name in sorted(files):
+            if name.endswith(extensions):
+                yield os.path.join(directory, name)
+
+def list_repository_files(root, extensions=REVIEW_EXTENSIONS, max_file_bytes=MAX_REVIEW_FILE_BYTES):
+    """Yield reviewable files under root, relative to it
+    
+    Uses git ls-files (tracked plus untracked-but-not-ignored) when root is
+    inside a git work tree, and falls back to walking the directory.
+    """
+    try:
+        listing = subprocess.run(
+            ["git", "-C", root, "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            capture_output=True,
+            check=True
+        )
+        paths = sorted(set(p for p in listing.stdout.decode("utf-8", errors="replace").split("\0") if p))
+    except (OSError, subprocess.CalledProcessError):
+        paths = [os.path.relpath(p, root) for p in walk_source_files(root, extensions)]
+    
+    for relative_path in paths:
+        if not relative_path.endswith(extensions):
+            continue
+        path = os.path.join(root, relative_path)
+        try:
+            if os.path.islink(path) or os.path.getsize(path) > max_file_bytes:
+                continue
+        except OSError:
+            continue  # listed by git but deleted from the work tree
+        yield relative_path
+
 def main():
     assistant = IntelligentMCPAssistant()
     
@@ -237,14 +961,12 @@ def main():
     print(summary)
     
     # Show database stats
-    conn = sqlite3.connect(assistant.db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM interactions")
-    count = cursor.fetchone()[0]
-    conn.close()
+    assistant.writer.flush()
+    count = assistant.db.fetch_one("SELECT COUNT(*) FROM interactions")[0]
     
     print(f"\n\nTotal interactions stored: {count}")
     print(f"Database location: {assistant.db_path}")
+    print(f"Response cache: {assistant.cache.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
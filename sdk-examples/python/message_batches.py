@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Message Batches Helpers
+Packs many messages.create() requests into Message Batches jobs, polls
+them with backoff and streams the results back as each batch ends
+
+Batched requests cost half as much and don't count against the interactive
+rate limits, in exchange for answers within hours instead of seconds; use
+them for work nobody is waiting on, such as nightly reviews.
+
+Usage:
+    python message_batches.py review ~/src/project        # submit and wait
+    python message_batches.py review ~/src/project --no-wait
+    python message_batches.py collect                     # later, or from cron
+    python message_batches.py status msgbatch_01...
+"""
+import argparse
+import json
+import random
+import time
+from client_factory import get_client
+
+# The API allows 100,000 requests or 256 MB per batch; smaller batches
+# finish sooner, so results start streaming back earlier
+MAX_BATCH_REQUESTS = 10000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+# Polling: start here, back off by POLL_BACKOFF per poll up to the maximum
+POLL_INTERVAL = 10.0
+MAX_POLL_INTERVAL = 300.0
+POLL_BACKOFF = 1.5
+
+
+def batch_request(custom_id, params):
+    """One entry of a batch: custom_id is 1-64 letters, digits, - or _"""
+    return {"custom_id": custom_id, "params": params}
+
+
+def pack_batches(requests, max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES):
+    """Group batch requests into lists that fit in one batch each
+
+    requests is any iterable and is consumed lazily, so each batch can be
+    submitted as soon as it is full.
+    """
+    batch, size = [], 0
+    for request in requests:
+        request_size = len(json.dumps(request)) + 1
+        if batch and (len(batch) >= max_requests or size + request_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(request)
+        size += request_size
+    if batch:
+        yield batch
+
+
+def submit_batches(client, requests, max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES,
+                   on_submit=None):
+    """Create as many batches as the requests need; returns the MessageBatch objects
+
+    on_submit(batch, requests) is called after each batch is created, e.g.
+    to record which requests went into it.
+    """
+    batches = []
+    for requests_in_batch in pack_batches(requests, max_requests, max_bytes):
+        batch = client.messages.batches.create(requests=requests_in_batch)
+        if on_submit is not None:
+            on_submit(batch, requests_in_batch)
+        batches.append(batch)
+    return batches
+
+
+def wait_for_batches(client, batch_ids, poll_interval=POLL_INTERVAL,
+                     max_interval=MAX_POLL_INTERVAL, on_poll=None):
+    """Yield each batch (a MessageBatch) as soon as it has ended
+
+    Only batches still in progress are polled. The interval grows by
+    POLL_BACKOFF after every poll, up to max_interval, with jitter so that
+    many waiting jobs don't poll in step. on_poll(batch) sees every
+    status retrieved.
+    """
+    pending = list(dict.fromkeys(batch_ids))
+    interval = poll_interval
+    while pending:
+        still_pending = []
+        for batch_id in pending:
+            batch = client.messages.batches.retrieve(batch_id)
+            if on_poll is not None:
+                on_poll(batch)
+            if batch.processing_status == "ended":
+                yield batch
+            else:
+                still_pending.append(batch_id)
+        pending = still_pending
+        if pending:
+            time.sleep(interval * random.uniform(0.9, 1.1))
+            interval = min(max_interval, interval * POLL_BACKOFF)
+
+
+def iter_results(client, batch_id):
+    """Stream an ended batch's results: (custom_id, result) in arbitrary order
+
+    result.type is "succeeded" (result.message is the Message), "errored",
+    "canceled" or "expired". Results are decoded line by line, so memory
+    stays flat however large the batch.
+    """
+    for response in client.messages.batches.results(batch_id):
+        yield response.custom_id, response.result
+
+
+def run_batches(client, requests, poll_interval=POLL_INTERVAL, **options):
+    """Submit requests as batches and yield (custom_id, result) as batches end"""
+    batches = submit_batches(client, requests, **options)
+    for batch in wait_for_batches(client, [b.id for b in batches], poll_interval):
+        yield from iter_results(client, batch.id)
+
+
+def result_error(result):
+    """Readable reason a batch result didn't succeed"""
+    if result.type == "errored":
+        error = getattr(result.error, "error", None)
+        return f"errored: {getattr(error, 'message', None) or result.error}"
+    return result.type
+
+
+def describe(batch):
+    counts = batch.request_counts
+    return (f"{batch.id} {batch.processing_status}: {counts.processing} processing, "
+            f"{counts.succeeded} succeeded, {counts.errored} errored, "
+            f"{counts.canceled} canceled, {counts.expired} expired")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--db", default="~/.config/claude/databases/assistant.db")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    commands = parser.add_subparsers(dest="command", required=True)
+    review = commands.add_parser("review", help="submit reviews of changed files under a directory")
+    review.add_argument("root")
+    review.add_argument("--force", action="store_true", help="review unchanged files too")
+    review.add_argument("--no-wait", action="store_true", help="submit only; collect later")
+    commands.add_parser("collect", help="wait for submitted reviews and store the results")
+    status = commands.add_parser("status", help="show batch status")
+    status.add_argument("batch_ids", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        client = get_client()
+        for batch_id in args.batch_ids:
+            print(describe(client.messages.batches.retrieve(batch_id)))
+        return
+
+    from mcp_claude_integration import IntelligentMCPAssistant
+    assistant = IntelligentMCPAssistant(args.db)
+    if args.command == "review":
+        submitted = assistant.submit_review_batches(args.root, force=args.force)
+        print(f"Submitted {submitted['requests']} review requests in "
+              f"{len(submitted['batches'])} batches ({submitted['unchanged']} files unchanged)")
+        if args.no_wait:
+            return
+    results = assistant.collect_review_batches(poll_interval=args.poll_interval,
+                                               on_poll=lambda batch: print(describe(batch)))
+    print(f"Stored {results['stored']} reviews; {results['failed']} failed "
+          f"(retried on the next run); token usage: {results['usage']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Local Mock Anthropic Messages API
+Answers /v1/messages with synthetic or replayed responses, streamed as SSE at
+a configurable first-token latency and token rate, so client code can be
+benchmarked offline without spending tokens
+
+Usage:
+    python mock_anthropic_server.py --port 8766 --latency 0.3 --token-rate 80
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8766 ANTHROPIC_API_KEY=mock python basic_example.py
+
+Replay files are JSONL, one Message per line as returned by the API
+(e.g. message.model_dump_json()) or just {"text": "..."}; lines are served
+round-robin.
+
+Prompt caching is emulated: prefixes ending at a cache_control breakpoint
+are remembered for five minutes and reported as cache reads and writes in
+usage, and with --prefill-rate only uncached input adds to latency.
+Packed snippet requests (see snippet_packing.py) get a JSON answer per item.
+
+Message Batches are emulated too: a batch stays in_progress for
+--batch-delay seconds, then its results (errored at --error-rate, expired
+at --batch-expire-rate) can be downloaded as JSONL.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from prompt_cache import min_cacheable_tokens
+from token_counting import estimate_tokens
+
+WORDS = ("the quick brown fox jumps over a lazy dog while streaming tokens "
+         "arrive at a steady pace through the local mock server").split()
+
+# Output tokens sent per content_block_delta event
+TOKENS_PER_DELTA = 3
+
+# Lifetime of an emulated prompt cache entry, refreshed on every hit
+PROMPT_CACHE_TTL = 300
+
+# A snippet_packing item's opening tag, on a line of its own (unlike the
+# example in its ANSWER_FORMAT)
+ITEM_PATTERN = re.compile(r'^<item id="([^"]+)">$', re.MULTILINE)
+
+BATCH_PATH = "/v1/messages/batches"
+
+
+class MockState:
+    """Settings and counters shared by all request handlers"""
+
+    def __init__(self, latency=0.2, token_rate=100.0, output_tokens=120, replay=None,
+                 rate_limit=None, error_rate=0.0, seed=None, prefill_rate=None, batch_delay=1.0,
+                 batch_expire_rate=0.0):
+        self.latency = latency
+        self.batch_delay = batch_delay
+        self.batch_expire_rate = batch_expire_rate
+        self.prefill_rate = prefill_rate
+        self.token_rate = token_rate
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.replies = itertools.cycle(load_replay(replay)) if replay else None
+        self.requests = 0
+        self.streams = 0
+        self.rate_limited = 0
+        self.overloaded = 0
+        self.active = 0
+        self.peak_active = 0
+        self.connections = 0
+        self.prompt_cache = {}  # prefix digest -> expiry (time.monotonic())
+        self.batches = {}  # batch id -> MockBatch
+        self.lock = threading.Lock()
+        # Token bucket of `rate_limit` requests per second
+        self.rate_limit = rate_limit
+        self.bucket = float(rate_limit or 0)
+        self.bucket_time = time.monotonic()
+
+    def admit(self):
+        """None if the request may run, else seconds until it could"""
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        self.bucket = min(self.rate_limit, self.bucket + (now - self.bucket_time) * self.rate_limit)
+        self.bucket_time = now
+        if self.bucket >= 1:
+            self.bucket -= 1
+            return None
+        return (1 - self.bucket) / self.rate_limit
+
+    def prompt_usage(self, body):
+        """(input_tokens, cache_read, cache_creation) as the API would report them"""
+        pieces = [(json.dumps(tool, sort_keys=True), False) for tool in body.get("tools") or ()]
+        for part in (body.get("system"), *(m["content"] for m in body.get("messages", []))):
+            if isinstance(part, str):
+                pieces.append((part, False))
+            elif part:
+                pieces.extend((block.get("text") or json.dumps(block, sort_keys=True),
+                               "cache_control" in block) for block in part)
+
+        digest = hashlib.sha256(body.get("model", "").encode())
+        total, breakpoints = 0, []
+        for text, breakpoint in pieces:
+            digest.update(text.encode("utf-8"))
+            total += estimate_tokens(text)
+            if breakpoint:
+                breakpoints.append((digest.hexdigest(), total))
+
+        now = time.monotonic()
+        minimum = min_cacheable_tokens(body.get("model"))
+        read = written = 0
+        with self.lock:
+            for key, tokens in breakpoints:
+                if self.prompt_cache.get(key, 0) > now:
+                    read = max(read, tokens)
+            for key, tokens in breakpoints:
+                if tokens >= minimum:
+                    self.prompt_cache[key] = now + PROMPT_CACHE_TTL
+                    written = max(written, tokens - read)
+            if len(self.prompt_cache) > 10000:
+                self.prompt_cache = {k: t for k, t in self.prompt_cache.items() if t > now}
+        return total - read - written, read, written
+
+    def first_token_delay(self, usage):
+        """Base latency plus prefill of the input that wasn't read from the cache"""
+        if not self.prefill_rate:
+            return self.latency
+        uncached = usage["input_tokens"] + usage["cache_creation_input_tokens"]
+        return self.latency + uncached / self.prefill_rate
+
+    def reply_text(self, body):
+        """(text, output_tokens, stop_reason) for the next response"""
+        max_tokens = body.get("max_tokens", 1024)
+        item_ids = packed_item_ids(body)
+        if self.replies is not None:
+            with self.lock:
+                text = next(self.replies)
+            tokens = estimate_tokens(text)
+        elif item_ids:
+            # A packed request: one short synthetic answer per item, as JSON
+            words = max(3, self.output_tokens // len(item_ids))
+            text = json.dumps({
+                item_id: " ".join(itertools.islice(itertools.cycle(WORDS), words))
+                for item_id in item_ids
+            })
+            tokens = estimate_tokens(text)
+        else:
+            tokens = self.output_tokens
+            text = " ".join(itertools.islice(itertools.cycle(WORDS), tokens))
+        if tokens > max_tokens:
+            words = text.split(" ")
+            return " ".join(words[:max_tokens]), max_tokens, "max_tokens"
+        return text, tokens, "end_turn"
+
+
+class MockBatch:
+    """A submitted Message Batch; it ends batch_delay seconds after creation"""
+
+    def __init__(self, requests, delay):
+        self.id = f"msgbatch_mock_{uuid.uuid4().hex[:24]}"
+        self.requests = requests
+        self.created_at = datetime.now(timezone.utc)
+        self.ends = time.monotonic() + delay
+        self.canceled_at = None
+        self.results = None  # JSONL lines, made once the batch ends
+
+    def ended(self):
+        return self.canceled_at is not None or time.monotonic() >= self.ends
+
+    def describe(self, base_url):
+        ended = self.results is not None
+        counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        if not ended:
+            counts["processing"] = len(self.requests)
+        else:
+            for line in self.results:
+                counts[json.loads(line)["result"]["type"]] += 1
+        return {
+            "id": self.id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": _timestamp(self.created_at),
+            "expires_at": _timestamp(self.created_at + timedelta(hours=24)),
+            "ended_at": _timestamp(datetime.now(timezone.utc)) if ended else None,
+            "cancel_initiated_at": self.canceled_at and _timestamp(self.canceled_at),
+            "archived_at": None,
+            "results_url": f"{base_url}{BATCH_PATH}/{self.id}/results" if ended else None,
+        }
+
+
+def packed_item_ids(body):
+    """Item ids of a snippet_packing request, or [] for any other request"""
+    content = body.get("messages", [{}])[-1].get("content") or ""
+    if not isinstance(content, str):
+        content = "".join(block.get("text", "") for block in content)
+    return ITEM_PATTERN.findall(content)
+
+
+def _timestamp(moment):
+    return moment.isoformat().replace("+00:00", "Z")
+
+
+def load_replay(path):
+    texts = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "text" in record:
+                texts.append(record["text"])
+            else:
+                texts.append("".join(block.get("text", "") for block in record.get("content", [])))
+    if not texts:
+        raise ValueError(f"No responses in replay file {path}")
+    return texts
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    state = None
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.startswith(BATCH_PATH + "/"):
+            return self.batch_request(path)
+        if path == "/v1/models":
+            return self.send_json(200, {
+                "data": [{"type": "model", "id": "claude-mock", "display_name": "Mock",
+                          "created_at": "2025-01-01T00:00:00Z"}],
+                "has_more": False, "first_id": "claude-mock", "last_id": "claude-mock",
+            })
+        self.send_error_json(404, "not_found_error", "Not found")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0]
+        if path == BATCH_PATH:
+            return self.create_batch(body)
+        if path.startswith(BATCH_PATH + "/"):
+            return self.batch_request(path)
+        if path != "/v1/messages":
+            return self.send_error_json(404, "not_found_error", "Not found")
+
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            wait = state.admit()
+            if wait is not None:
+                state.rate_limited += 1
+            overloaded = wait is None and state.random.random() < state.error_rate
+            if overloaded:
+                state.overloaded += 1
+        if wait is not None:
+            return self.send_error_json(429, "rate_limit_error", "Mock rate limit exceeded", {
+                "retry-after": str(math.ceil(wait)),
+                "retry-after-ms": str(int(wait * 1000)),
+                "anthropic-ratelimit-requests-limit": str(state.rate_limit),
+                "anthropic-ratelimit-requests-remaining": "0",
+            })
+        if overloaded:
+            return self.send_error_json(529, "overloaded_error", "Mock overload")
+
+        with state.lock:
+            state.active += 1
+            state.peak_active = max(state.peak_active, state.active)
+        try:
+            if body.get("stream"):
+                self.stream_message(body)
+            else:
+                self.send_message(body)
+        finally:
+            with state.lock:
+                state.active -= 1
+
+    def create_batch(self, body):
+        state = self.state
+        batch = MockBatch(body.get("requests", []), state.batch_delay)
+        with state.lock:
+            state.batches[batch.id] = batch
+        self.batch_results(batch)  # a zero delay ends it at once
+        self.send_json(200, batch.describe(self.base_url()))
+
+    def batch_request(self, path):
+        """GET a batch or its results, or POST .../cancel"""
+        batch_id, _, action = path[len(BATCH_PATH) + 1:].partition("/")
+        batch = self.state.batches.get(batch_id)
+        if batch is None:
+            return self.send_error_json(404, "not_found_error", f"No batch {batch_id}")
+        if action == "cancel" and self.command == "POST":
+            if not batch.ended():
+                batch.canceled_at = datetime.now(timezone.utc)
+        elif action == "results" and self.command == "GET":
+            if not batch.ended():
+                return self.send_error_json(400, "invalid_request_error", "Batch still in progress")
+            return self.send_body(200, "".join(self.batch_results(batch)).encode("utf-8"),
+                                  "application/x-jsonl")
+        elif action:
+            return self.send_error_json(404, "not_found_error", "Not found")
+        self.batch_results(batch)
+        self.send_json(200, batch.describe(self.base_url()))
+
+    def batch_results(self, batch):
+        """The batch's JSONL result lines, generated once when it ends"""
+        state = self.state
+        if batch.results is not None or not batch.ended():
+            return batch.results
+        lines = []
+        for request in batch.requests:
+            params = request.get("params", {})
+            with state.lock:
+                state.requests += 1
+                errored = state.random.random() < state.error_rate
+                expired = state.random.random() < state.batch_expire_rate
+            if batch.canceled_at is not None:
+                result = {"type": "canceled"}
+            elif expired:
+                result = {"type": "expired"}
+            elif errored:
+                result = {"type": "errored", "error": {"type": "error", "error": {
+                    "type": "overloaded_error", "message": "Mock overload"}}}
+            else:
+                text, tokens, stop_reason = state.reply_text(params)
+                result = {"type": "succeeded",
+                          "message": self.message(params, text, tokens, stop_reason)}
+            lines.append(json.dumps({"custom_id": request.get("custom_id"), "result": result}) + "\n")
+        with state.lock:
+            if batch.results is None:
+                batch.results = lines
+        return batch.results
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+
+    def message(self, body, text, output_tokens, stop_reason):
+        input_tokens, cache_read, cache_creation = self.state.prompt_usage(body)
+        return {
+            "id": f"msg_mock_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "claude-mock"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cache_creation_input_tokens": cache_creation,
+                "cache_read_input_tokens": cache_read,
+            },
+        }
+
+    def send_message(self, body):
+        state = self.state
+        text, tokens, stop_reason = state.reply_text(body)
+        message = self.message(body, text, tokens, stop_reason)
+        time.sleep(state.first_token_delay(message["usage"]) + tokens / state.token_rate)
+        self.send_json(200, message)
+
+    def stream_message(self, body):
+        state = self.state
+        with state.lock:
+            state.streams += 1
+        text, tokens, stop_reason = state.reply_text(body)
+        message = self.message(body, "", tokens, stop_reason)
+        usage = message.pop("usage")
+        message["usage"] = dict(usage, output_tokens=1)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        started = time.monotonic()
+        latency = state.first_token_delay(usage)
+        time.sleep(latency)
+        self.send_event("message_start", {"type": "message_start", "message": message})
+        self.send_event("content_block_start", {
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""},
+        })
+        words = text.split(" ")
+        for index in range(0, len(words), TOKENS_PER_DELTA):
+            # Pace against the start time so per-event overhead doesn't add up
+            due = started + latency + index / state.token_rate
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            piece = " ".join(words[index:index + TOKENS_PER_DELTA])
+            self.send_event("content_block_delta", {
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": piece if index == 0 else " " + piece},
+            })
+        self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self.send_event("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": {"output_tokens": tokens},
+        })
+        self.send_event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_event(self, name, data):
+        payload = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+        self.wfile.flush()
+
+    def send_error_json(self, status, error_type, message, headers=None):
+        self.send_json(status, {"type": "error", "error": {"type": error_type, "message": message}},
+                       headers)
+
+    def send_json(self, status, payload, headers=None):
+        self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("request-id", f"req_mock_{uuid.uuid4().hex[:24]}")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_mock_server(port=0, latency=0.2, token_rate=100.0, output_tokens=120, replay=None,
+                      rate_limit=None, error_rate=0.0, seed=None, prefill_rate=None, batch_delay=1.0,
+                      batch_expire_rate=0.0):
+    """Start the mock in a background thread; returns (server, base_url)"""
+    state = MockState(latency, token_rate, output_tokens, replay, rate_limit, error_rate, seed,
+                      prefill_rate, batch_delay, batch_expire_rate)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds to the first token")
+    parser.add_argument("--token-rate", type=float, default=100.0, help="output tokens per second")
+    parser.add_argument("--output-tokens", type=int, default=120, help="length of synthetic replies")
+    parser.add_argument("--replay", help="JSONL file of recorded responses to serve")
+    parser.add_argument("--rate-limit", type=float, help="requests per second before 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered 529 overloaded")
+    parser.add_argument("--prefill-rate", type=float, help="uncached input tokens per second added to latency")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="seconds before a message batch ends")
+    parser.add_argument("--batch-expire-rate", type=float, default=0.0,
+                        help="fraction of batch requests that expire unprocessed")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(args.port, args.latency, args.token_rate, args.output_tokens,
+                                         args.replay, args.rate_limit, args.error_rate,
+                                         prefill_rate=args.prefill_rate, batch_delay=args.batch_delay,
+                                         batch_expire_rate=args.batch_expire_rate)
+    print(f"Mock Anthropic API listening on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        state = server.state
+        print(f"\nServed {state.requests} requests ({state.streams} streamed, "
+              f"{state.rate_limited} rate limited, {state.overloaded} overloaded) "
+              f"on {state.connections} connections, peak concurrency {state.peak_active}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Prompt Cache Breakpoints
+Places cache_control breakpoints at the end of stable request prefixes
+(system prompt, conversation history) where the API can actually cache them
+
+Only prefixes that repeat across requests and reach the model's minimum
+cacheable length are worth marking. Review, summary and repository
+requests share one such prefix, the guidelines in review_guidelines;
+conversations mark their growing history.
+"""
+import json
+from token_counting import estimate_tokens
+
+CACHE_CONTROL = {"type": "ephemeral"}
+# The API rejects requests with more breakpoints than this
+MAX_BREAKPOINTS = 4
+
+# Shortest prefix the API will cache, by model family; a breakpoint on a
+# shorter prefix is silently ignored, so it would only waste a slot
+MIN_CACHEABLE_TOKENS = {
+    "haiku": 2048,
+    "sonnet": 1024,
+    "opus": 1024,
+}
+DEFAULT_MIN_CACHEABLE_TOKENS = 1024
+
+
+def cached_text(text):
+    """A text content block that ends a stable prefix worth caching
+
+    Put stable content (instructions, shared context) in blocks made with
+    this, ahead of whatever changes from request to request, and pass the
+    request through place_cache_breakpoints().
+    """
+    return {"type": "text", "text": text, "cache_control": dict(CACHE_CONTROL)}
+
+
+def min_cacheable_tokens(model):
+    for family, tokens in MIN_CACHEABLE_TOKENS.items():
+        if family in (model or ""):
+            return tokens
+    return DEFAULT_MIN_CACHEABLE_TOKENS
+
+
+def place_cache_breakpoints(request):
+    """messages.create() arguments with cache_control only where it pays off
+
+    Candidates are the end of the system prompt (stable by definition) and
+    every block already marked with cache_control, e.g. by cached_text().
+    Candidates whose prefix (tools, system, messages up to and including
+    the block) is under the model's minimum are unmarked. If more than
+    MAX_BREAKPOINTS remain, the first is kept for sharing across requests
+    with different tails, plus the last ones, which cover the most. The
+    request passed in is not modified.
+    """
+    request = dict(request)
+    blocks = []  # (block, estimated prefix tokens through it)
+    tokens = 0
+
+    for tool in request.get("tools") or ():
+        tokens += estimate_tokens(json.dumps(tool, sort_keys=True))
+
+    system = request.get("system")
+    if system:
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        system = [dict(block) for block in system]
+        system[-1].setdefault("cache_control", dict(CACHE_CONTROL))
+        request["system"] = system
+        for block in system:
+            tokens += _block_tokens(block)
+            blocks.append((block, tokens))
+
+    messages = []
+    for message in request.get("messages", []):
+        content = message["content"]
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+        else:
+            content = [dict(block) for block in content]
+            for block in content:
+                tokens += _block_tokens(block)
+                blocks.append((block, tokens))
+        messages.append(dict(message, content=content))
+    request["messages"] = messages
+
+    minimum = min_cacheable_tokens(request.get("model"))
+    candidates = []
+    for block, prefix_tokens in blocks:
+        if "cache_control" not in block:
+            continue
+        if prefix_tokens < minimum:
+            del block["cache_control"]
+        else:
+            candidates.append(block)
+    if len(candidates) > MAX_BREAKPOINTS:
+        for block in candidates[1:len(candidates) - MAX_BREAKPOINTS + 1]:
+            del block["cache_control"]
+
+    if system and all("cache_control" not in block for block in system) and len(system) == 1:
+        request["system"] = system[0]["text"]
+    return request
+
+
+def _block_tokens(block):
+    if block.get("type") == "text":
+        return estimate_tokens(block["text"])
+    return estimate_tokens(json.dumps({k: v for k, v in block.items() if k != "cache_control"},
+                                      sort_keys=True))
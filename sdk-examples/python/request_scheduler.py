@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Adaptive Request Scheduler
+Shares one concurrency limit across every Messages API caller in the
+process, adjusted additive-increase/multiplicative-decrease on rate limits,
+with retry-after aware, jittered exponential backoff
+
+Usage:
+    from client_factory import get_client
+    client = get_client()               # already scheduled
+    print(get_scheduler().stats())
+
+    python request_scheduler.py --base-url http://127.0.0.1:8766 -n 200 -c 32
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import anthropic
+from token_counting import TokenUsage
+
+# Concurrency window: starts here and moves between the bounds
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+DECREASE_FACTOR = 0.5
+
+MAX_RETRIES = 6
+BASE_BACKOFF = 0.5  # seconds; doubles per attempt, full jitter
+MAX_BACKOFF = 30.0
+RETRY_AFTER_JITTER = 0.1  # fraction added on top of a server retry-after
+
+# Statuses that mean "too much load": shrink the window
+THROTTLE_STATUS = {429, 529}
+# Statuses worth retrying at all (the SDK's own retry set)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Anthropic quotas, as (remaining header, reset header)
+RATE_LIMIT_HEADERS = [
+    ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset"),
+    ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset"),
+    ("anthropic-ratelimit-input-tokens-remaining", "anthropic-ratelimit-input-tokens-reset"),
+    ("anthropic-ratelimit-output-tokens-remaining", "anthropic-ratelimit-output-tokens-reset"),
+]
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class RequestScheduler:
+    """AIMD concurrency window shared by sync threads and async tasks.
+
+    Each request holds a slot while it runs. A success widens the window
+    by 1/limit (about one slot per window of completions); a 429 or 529
+    halves it, once per window, so a burst of rejections from requests
+    already in flight counts as a single congestion signal. A retry-after
+    or an exhausted quota pauses every caller until it passes.
+    """
+
+    def __init__(self, initial_limit=INITIAL_CONCURRENCY, min_limit=MIN_CONCURRENCY,
+                 max_limit=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.blocked_until = 0.0  # time.monotonic()
+        self.last_decrease = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.usage = TokenUsage()  # every response, including prompt cache hits
+        self._cond = threading.Condition()
+        self._async_waiters = deque()  # (loop, future) of coroutines waiting for a slot
+
+    # -- slots -------------------------------------------------------------
+
+    def _admit(self):
+        """Take a slot and return (True, start time), else (False, seconds to wait or None)"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return False, self.blocked_until - now
+        if self.in_flight >= max(self.min_limit, int(self.limit)):
+            return False, None
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.requests += 1
+        return True, now
+
+    def acquire(self):
+        """Block until a slot is free; returns the start time to pass to release()"""
+        with self._cond:
+            while True:
+                admitted, value = self._admit()
+                if admitted:
+                    return value
+                self._cond.wait(value)
+
+    async def acquire_async(self):
+        """acquire() for coroutines; waits on a future that release() resolves"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                admitted, value = self._admit()
+                if admitted:
+                    return value
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, value)
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                with self._cond:
+                    if not self._forget_waiter(loop, waiter):
+                        # release() picked this task: pass its wakeup on
+                        self._wake_async(1)
+                raise
+            with self._cond:
+                self._forget_waiter(loop, waiter)
+
+    def seed(self, limit):
+        """Start the window at limit (within the bounds) if nothing has run yet
+
+        For callers that know how much concurrency they want from the
+        outset; once requests have been made the window is AIMD's alone.
+        """
+        with self._cond:
+            if self.requests == 0:
+                self.limit = float(min(self.max_limit, max(self.min_limit, limit, self.limit)))
+                self._cond.notify_all()
+                self._wake_async(self._free_slots())
+
+    def release(self, started, error=None, headers=None):
+        """Return a slot and adjust the window from the outcome
+
+        Only a success widens the window; errors other than 429/529
+        (including a cancelled caller) leave it as it is.
+        """
+        if headers is None and error is not None:
+            headers = getattr(getattr(error, "response", None), "headers", None)
+        with self._cond:
+            self.in_flight -= 1
+            if getattr(error, "status_code", None) in THROTTLE_STATUS:
+                self.throttled += 1
+                if started >= self.last_decrease:
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                    self.last_decrease = time.monotonic()
+                hint = server_retry_after(headers)
+                if hint is not None:
+                    self._pause(hint)
+            elif error is None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if headers is not None:
+                self._pause(quota_reset_after(headers))
+            self._cond.notify_all()
+            self._wake_async(self._free_slots())
+
+    def _free_slots(self):
+        """Async waiters worth waking: one per free slot, or all of them
+        during a pause so each re-waits with the pause as its timeout"""
+        if time.monotonic() < self.blocked_until:
+            return len(self._async_waiters)
+        return max(self.min_limit, int(self.limit)) - self.in_flight
+
+    def _wake_async(self, count):
+        """Resolve the oldest count async waiters' futures, from any thread"""
+        while count > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:  # the waiter's loop is closed
+                continue
+            count -= 1
+
+    def _forget_waiter(self, loop, waiter):
+        """Drop a waiter still queued; False if release() already picked it"""
+        try:
+            self._async_waiters.remove((loop, waiter))
+        except ValueError:
+            return False
+        return True
+
+    def _pause(self, seconds):
+        if seconds and seconds > 0:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "cache_hits": self.usage.cache_hits,
+                "cache_hit_rate": _round(self.usage.cache_hit_rate),
+            }
+
+    def record(self, message):
+        """Add a response's token usage to the process-wide totals"""
+        self.usage.add(message)
+        return message
+
+    # -- calls -------------------------------------------------------------
+
+    def call(self, func, /, *args, **kwargs):
+        """func(*args, **kwargs) in a slot, retried on throttling and transient errors
+
+        A result with .headers (a raw response) feeds the quota headers
+        back into the scheduler.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                self.release(started, error=e)
+                self._sleep_before_retry(e, attempt, time.sleep)
+                continue
+            self.release(started, headers=getattr(result, "headers", None))
+            return result
+
+    async def call_async(self, func, /, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            started = await self.acquire_async()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException as e:
+                self.release(started, error=e)
+                await self._sleep_before_retry(e, attempt, asyncio.sleep)
+                continue
+            self.release(started, headers=getattr(result, "headers", None))
+            return result
+
+    def _sleep_before_retry(self, error, attempt, sleep):
+        delay = retry_delay(error, attempt) if isinstance(error, anthropic.APIError) else None
+        if delay is None or attempt == self.max_retries:
+            raise error
+        with self._cond:
+            self.retries += 1
+        return sleep(delay)
+
+    def create(self, resource, /, **request):
+        """resource.create() (e.g. client.messages) through the scheduler"""
+        return self.record(self.call(resource.with_raw_response.create, **request).parse())
+
+    async def create_async(self, resource, /, **request):
+        raw = await self.call_async(resource.with_raw_response.create, **request)
+        return self.record(await raw.parse())
+
+    @contextmanager
+    def stream(self, resource, /, **request):
+        """resource.stream() holding a slot until the stream is closed
+
+        Rejections arrive before the first event, so they are retried like
+        create(); an error part-way through a stream is raised as is.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = self.acquire()
+            manager = resource.stream(**request)
+            try:
+                stream = manager.__enter__()
+            except BaseException as e:
+                self.release(started, error=e)
+                self._sleep_before_retry(e, attempt, time.sleep)
+                continue
+            break
+        error = None
+        try:
+            yield stream
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            manager.__exit__(None, None, None)
+            self.release(started, error=error, headers=stream.response.headers)
+            self._record_stream(stream)
+
+    @asynccontextmanager
+    async def stream_async(self, resource, /, **request):
+        for attempt in range(self.max_retries + 1):
+            started = await self.acquire_async()
+            manager = resource.stream(**request)
+            try:
+                stream = await manager.__aenter__()
+            except BaseException as e:
+                self.release(started, error=e)
+                await self._sleep_before_retry(e, attempt, asyncio.sleep)
+                continue
+            break
+        error = None
+        try:
+            yield stream
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            await manager.__aexit__(None, None, None)
+            self.release(started, error=error, headers=stream.response.headers)
+            self._record_stream(stream)
+
+    def _record_stream(self, stream):
+        try:
+            message = stream.current_message_snapshot
+        except (AssertionError, AttributeError):  # closed before message_start
+            return
+        if message is not None:
+            self.record(message)
+
+
+class ScheduledMessages:
+    """client.messages whose create() and stream() go through a scheduler"""
+
+    def __init__(self, messages, scheduler):
+        self._messages = messages
+        self._scheduler = scheduler
+
+    def create(self, **request):
+        return self._scheduler.create(self._messages, **request)
+
+    def stream(self, **request):
+        return self._scheduler.stream(self._messages, **request)
+
+    def __getattr__(self, name):
+        return getattr(self._messages, name)
+
+
+class AsyncScheduledMessages(ScheduledMessages):
+
+    async def create(self, **request):
+        return await self._scheduler.create_async(self._messages, **request)
+
+    def stream(self, **request):
+        return self._scheduler.stream_async(self._messages, **request)
+
+
+class ScheduledClient:
+    """An Anthropic client with scheduled messages; everything else passes through"""
+
+    messages_class = ScheduledMessages
+
+    def __init__(self, client, scheduler):
+        self._client = client
+        self.scheduler = scheduler
+        self.messages = self.messages_class(client.messages, scheduler)
+
+    def with_options(self, **options):
+        return type(self)(self._client.with_options(**options), self.scheduler)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class AsyncScheduledClient(ScheduledClient):
+    messages_class = AsyncScheduledMessages
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def get_scheduler():
+    """The process-wide scheduler every shared client uses"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
+
+
+def server_retry_after(headers):
+    """Seconds the server asked us to wait (retry-after-ms or retry-after), or None"""
+    if not headers:
+        return None
+    try:
+        return float(headers["retry-after-ms"]) / 1000
+    except (KeyError, TypeError, ValueError):
+        pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def quota_reset_after(headers):
+    """Seconds until the latest reset among quotas the response says are used up"""
+    wait = 0.0
+    for remaining, reset in RATE_LIMIT_HEADERS:
+        if headers.get(remaining) == "0" and headers.get(reset):
+            try:
+                reset_at = datetime.fromisoformat(headers[reset].replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            wait = max(wait, reset_at.timestamp() - time.time())
+    return wait
+
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retrying a failed call, or None if it shouldn't be
+
+    Uses the server's retry-after when given (plus a little jitter so
+    callers don't return in lockstep), else full-jitter exponential backoff.
+    """
+    if isinstance(error, anthropic.APIStatusError):
+        if error.status_code not in RETRYABLE_STATUS:
+            return None
+        hint = server_retry_after(error.response.headers)
+        if hint is not None and 0 <= hint <= MAX_BACKOFF * 2:
+            return hint * (1 + random.uniform(0, RETRY_AFTER_JITTER))
+    elif not isinstance(error, anthropic.APIConnectionError):
+        return None
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def main():
+    from concurrent.futures import ThreadPoolExecutor
+    from client_factory import get_client
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--base-url", required=True, help="API to load, e.g. the local mock server")
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--callers", type=int, default=32, help="threads issuing requests")
+    args = parser.parse_args()
+
+    client = get_client(base_url=args.base_url)
+    scheduler = client.scheduler  # this file runs as __main__, so not our get_scheduler()
+    errors = []
+
+    def one(index):
+        try:
+            client.messages.create(model="claude-3-5-haiku-20241022", max_tokens=64,
+                                   messages=[{"role": "user", "content": f"Request {index}"}])
+        except anthropic.APIError as e:
+            errors.append(e)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.callers) as executor:
+        list(executor.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    print(f"{args.requests - len(errors)} ok, {len(errors)} failed in {elapsed:.2f}s "
+          f"({(args.requests - len(errors)) / elapsed:.1f} req/s)")
+    print(f"Scheduler: {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Response Cache for the Assistant
+Content-addressed cache of Claude responses: hot in-memory LRU over SQLite
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 24 * 60 * 60  # seconds
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 512
+
+# Run the size-based eviction once every this many inserts
+EVICT_EVERY = 100
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return " ".join(prompt.split()).casefold()
+
+
+def make_cache_key(prompt, model, **params):
+    """Hash of the normalized prompt, model and request parameters"""
+    payload = json.dumps(
+        {"prompt": normalize_prompt(prompt), "model": model, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-level response cache with TTL and size-based eviction.
+
+    Lookups hit an in-process LRU first and fall back to the response_cache
+    table, so other processes sharing assistant.db benefit too. Inserts and
+    access-time updates go through the database's write-behind queue and
+    never block the caller on disk.
+    """
+
+    def __init__(self, database, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.database = database
+        self.writer = database.writer()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (response, expires_at)
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self.init_table()
+
+    def init_table(self):
+        with self.database.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT,
+                    size INTEGER,
+                    created_at REAL,
+                    expires_at REAL,
+                    last_accessed REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_response_cache_last_accessed
+                ON response_cache (last_accessed)
+            ''')
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+        row = self.database.fetch_one(
+            "SELECT response, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+            (key, now),
+        )
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        response, expires_at = row
+        self.writer.submit(
+            "UPDATE response_cache SET last_accessed = ? WHERE key = ?", (now, key)
+        )
+        with self._lock:
+            self.hits += 1
+            self._remember(key, response, expires_at)
+        return response
+
+    def put(self, key, response, model=None, ttl=None):
+        """Store a response under key"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self.writer.submit('''
+            INSERT OR REPLACE INTO response_cache
+                (key, model, response, size, created_at, expires_at, last_accessed)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (key, model, response, len(response.encode("utf-8")), now, expires_at, now))
+
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self._puts_since_evict += 1
+            evict = self._puts_since_evict >= EVICT_EVERY
+            if evict:
+                self._puts_since_evict = 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over the caps"""
+        self.writer.submit(
+            "DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),)
+        )
+        self.writer.submit('''
+            DELETE FROM response_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT
+                        key,
+                        ROW_NUMBER() OVER recent AS position,
+                        SUM(size) OVER recent AS running_bytes
+                    FROM response_cache
+                    WINDOW recent AS (ORDER BY last_accessed DESC)
+                )
+                WHERE position > ? OR running_bytes > ?
+            )
+        ''', (self.max_entries, self.max_bytes))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self.writer.submit("DELETE FROM response_cache", ())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def _remember(self, key, response, expires_at):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
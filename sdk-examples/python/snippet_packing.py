@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Snippet Packing
+Bin-packs many small inputs into one request up to a token budget, asks for
+a JSON answer per item and hands each answer back to its caller
+
+The system prompt, instructions and per-request framing are paid once per
+packed request instead of once per input, so small-input workloads send
+roughly one request per MAX_PACKED_ITEMS inputs. Items the answer doesn't
+cover, or all of them if it can't be parsed, are retried one by one.
+"""
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from prompt_cache import place_cache_breakpoints
+from token_counting import estimate_tokens
+
+# Input budget for the packed items of one request
+PACKED_INPUT_TOKENS = 8000
+# Output budget per item, and the most one request may ask for in total
+ITEM_OUTPUT_TOKENS = 400
+PACKED_OUTPUT_TOKENS = 8192
+MAX_PACKED_ITEMS = 20
+# Inputs larger than this are sent on their own
+MAX_PACKABLE_TOKENS = 2000
+# How long the packer waits for more callers before sending a partial pack
+PACK_DELAY = 0.05
+PACK_WORKERS = 8
+
+ANSWER_FORMAT = """
+Each item is wrapped in <item id="..."></item> tags. Answer every item
+separately and reply with only a JSON object that maps each item id to your
+answer for that item as a string, e.g. {"1": "...", "2": "..."}.
+Keep each answer under %d words."""
+
+
+def pack_items(sizes, budget=PACKED_INPUT_TOKENS, max_items=MAX_PACKED_ITEMS):
+    """Group item indices into packs of at most budget tokens and max_items
+
+    First-fit decreasing: the largest items are placed first, each into the
+    first pack with room. Order within a pack follows the input order.
+    """
+    packs = []  # [tokens, [indices]]
+    for index in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        for pack in packs:
+            if pack[0] + sizes[index] <= budget and len(pack[1]) < max_items:
+                pack[0] += sizes[index]
+                pack[1].append(index)
+                break
+        else:
+            packs.append([sizes[index], [index]])
+    return [sorted(indices) for _, indices in packs]
+
+
+def packed_request(items, instructions, model, system=None, item_output_tokens=ITEM_OUTPUT_TOKENS):
+    """messages.create() arguments answering several (id, text) items at once"""
+    body = "\n\n".join(f'<item id="{item_id}">\n{text}\n</item>' for item_id, text in items)
+    instructions = instructions + "\n" + ANSWER_FORMAT % (item_output_tokens * 3 // 4)
+    request = {
+        "model": model,
+        "max_tokens": min(PACKED_OUTPUT_TOKENS, item_output_tokens * len(items) + 100),
+        "messages": [{"role": "user", "content": f"{instructions}\n\n{body}"}],
+    }
+    if system:
+        request["system"] = system
+    return place_cache_breakpoints(request)
+
+
+def parse_packed_answers(text, item_ids):
+    """{id: answer} for the items answered in a packed response
+
+    Tolerates a code fence or prose around the JSON object; ids that are
+    missing, empty or not strings are left out, so the caller can retry
+    just those.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        answers = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(answers, dict):
+        return {}
+    return {
+        item_id: answers[item_id] for item_id in item_ids
+        if isinstance(answers.get(item_id), str) and answers[item_id].strip()
+    }
+
+
+class SnippetPacker:
+    """Collects inputs from any number of callers and answers them in packs
+
+    submit(text) returns a Future for that text's answer. A background
+    thread waits up to `delay` for more inputs, bin-packs what has arrived
+    and sends each pack from a worker pool. fallback(text) answers a single
+    input the ordinary way; it is used for oversized inputs, packs of one
+    and anything the packed answer didn't cover.
+    """
+
+    def __init__(self, client, instructions, model, fallback, system=None, usage=None,
+                 budget=PACKED_INPUT_TOKENS, max_items=MAX_PACKED_ITEMS,
+                 item_output_tokens=ITEM_OUTPUT_TOKENS, delay=PACK_DELAY, max_workers=PACK_WORKERS):
+        self.client = client
+        self.instructions = instructions
+        self.model = model
+        self.system = system
+        self.fallback = fallback
+        self.usage = usage
+        self.budget = budget
+        self.max_items = max_items
+        self.item_output_tokens = item_output_tokens
+        self.delay = delay
+        self.items = 0
+        self.packed_requests = 0
+        self.single_requests = 0
+        self.fallbacks = 0  # items a packed answer failed to cover
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="packer")
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="snippet-packer", daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        """Queue one input; returns a Future resolving to its answer"""
+        if self._closed:
+            raise RuntimeError("SnippetPacker is closed")
+        future = Future()
+        with self._lock:
+            self.items += 1
+        if estimate_tokens(text) > MAX_PACKABLE_TOKENS:
+            self._executor.submit(self._answer_single, text, future)
+        else:
+            self._queue.put((text, future))
+        return future
+
+    def map(self, texts):
+        """Answers for texts, in order"""
+        return [future.result() for future in [self.submit(text) for text in texts]]
+
+    def stats(self):
+        with self._lock:
+            requests = self.packed_requests + self.single_requests
+            return {
+                "items": self.items,
+                "requests": requests,
+                "packed_requests": self.packed_requests,
+                "fallbacks": self.fallbacks,
+                "items_per_request": round(self.items / requests, 1) if requests else None,
+            }
+
+    def close(self):
+        """Send whatever is queued, wait for every answer and stop the threads"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending, tokens, stop = [first], estimate_tokens(first[0]), False
+            deadline = time.monotonic() + self.delay
+            # Linger for more callers until a full pack's worth has arrived
+            while tokens < self.budget and len(pending) < self.max_items:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                pending.append(item)
+                tokens += estimate_tokens(item[0])
+            self._dispatch(pending)
+            if stop:
+                return
+
+    def _dispatch(self, pending):
+        sizes = [estimate_tokens(text) for text, _ in pending]
+        for indices in pack_items(sizes, self.budget, self.max_items):
+            pack = [pending[i] for i in indices]
+            if len(pack) == 1:
+                self._executor.submit(self._answer_single, *pack[0])
+            else:
+                self._executor.submit(self._answer_pack, pack)
+
+    def _answer_pack(self, pack):
+        ids = [str(number) for number in range(1, len(pack) + 1)]
+        try:
+            message = self.client.messages.create(**packed_request(
+                [(item_id, text) for item_id, (text, _) in zip(ids, pack)],
+                self.instructions, self.model, self.system, self.item_output_tokens
+            ))
+        except Exception as e:
+            for _, future in pack:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.packed_requests += 1
+        if self.usage is not None:
+            self.usage.add(message)
+
+        answers = parse_packed_answers(message.content[0].text, ids)
+        for item_id, (text, future) in zip(ids, pack):
+            if item_id in answers:
+                future.set_result(answers[item_id])
+            else:
+                with self._lock:
+                    self.fallbacks += 1
+                self._answer_single(text, future)
+
+    def _answer_single(self, text, future):
+        try:
+            answer = self.fallback(text)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        with self._lock:
+            self.single_requests += 1
+        future.set_result(answer)
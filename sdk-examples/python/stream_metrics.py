@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Streaming Latency Metrics
+Wraps client.messages.stream to record time-to-first-token, inter-token gaps,
+duration and output tokens/sec, with a JSONL sink and percentile summaries
+
+Usage:
+    python stream_metrics.py stream_metrics.jsonl   # summarize a metrics file
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Inter-token gap histogram: log-spaced bucket upper bounds from 0.1 ms to
+# about 2 minutes, 25% apart, so percentiles are accurate to within a bucket
+GAP_BUCKETS = [0.0001 * 1.25 ** i for i in range(64)]
+
+# Environment variable naming a default JSONL file for metered_stream()
+METRICS_PATH_ENV = "CLAUDE_STREAM_METRICS"
+
+PERCENTILES = (50, 90, 99)
+
+
+class StreamMetrics:
+    """Timings for one streamed response.
+
+    Per token the hot path is one clock read, one bisect and one counter
+    increment in a preallocated histogram; nothing grows with the length of
+    the response.
+    """
+
+    __slots__ = ("model", "tag", "started", "first_token", "last_token", "finished",
+                 "deltas", "gap_counts", "max_gap", "input_tokens", "output_tokens",
+                 "stop_reason", "error")
+
+    def __init__(self, model=None, tag=None):
+        self.model = model
+        self.tag = tag
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.last_token = None
+        self.finished = None
+        self.deltas = 0
+        self.gap_counts = [0] * (len(GAP_BUCKETS) + 1)
+        self.max_gap = 0.0
+        self.input_tokens = None
+        self.output_tokens = None
+        self.stop_reason = None
+        self.error = None
+
+    def on_delta(self):
+        now = time.perf_counter()
+        if self.last_token is None:
+            self.first_token = now
+        else:
+            gap = now - self.last_token
+            self.gap_counts[bisect_left(GAP_BUCKETS, gap)] += 1
+            if gap > self.max_gap:
+                self.max_gap = gap
+        self.last_token = now
+        self.deltas += 1
+
+    def finish(self, message=None, error=None):
+        self.finished = time.perf_counter()
+        if message is not None:
+            usage = getattr(message, "usage", None)
+            self.input_tokens = getattr(usage, "input_tokens", None)
+            self.output_tokens = getattr(usage, "output_tokens", None)
+            self.stop_reason = getattr(message, "stop_reason", None)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def ttft(self):
+        return None if self.first_token is None else self.first_token - self.started
+
+    @property
+    def duration(self):
+        return None if self.finished is None else self.finished - self.started
+
+    @property
+    def tokens_per_second(self):
+        """Output tokens per second after the first token (decode speed)"""
+        if not self.output_tokens or self.first_token is None:
+            return None
+        generating = (self.last_token or self.finished) - self.first_token
+        return self.output_tokens / generating if generating > 0 else None
+
+    def gap_percentile(self, percentile):
+        return histogram_percentile(self.gap_counts, percentile)
+
+    def as_record(self):
+        """JSON-ready summary; times in milliseconds"""
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "model": self.model,
+            "ttft_ms": _ms(self.ttft),
+            "duration_ms": _ms(self.duration),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "tokens_per_sec": _round(self.tokens_per_second),
+            "deltas": self.deltas,
+            "gap_max_ms": _ms(self.max_gap),
+            "stop_reason": self.stop_reason,
+            # Sparse histogram so gap percentiles can be merged across requests
+            "gap_histogram": {str(i): n for i, n in enumerate(self.gap_counts) if n},
+        }
+        for p in PERCENTILES:
+            record[f"gap_p{p}_ms"] = _ms(self.gap_percentile(p))
+        if self.tag is not None:
+            record["tag"] = self.tag
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+    def __str__(self):
+        text = f"TTFT {_ms(self.ttft)} ms, {_ms(self.duration)} ms total"
+        if self.tokens_per_second:
+            text += f", {self.tokens_per_second:.1f} tokens/s"
+        p50, p99 = self.gap_percentile(50), self.gap_percentile(99)
+        if p50 is not None:
+            text += f", gap p50 {_ms(p50)} ms / p99 {_ms(p99)} ms"
+        return text
+
+
+class MetricsSink:
+    """Thread-safe JSONL file of StreamMetrics records"""
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+
+    def write(self, metrics):
+        line = json.dumps(metrics.as_record()) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+class MeteredStream:
+    """A MessageStream whose content deltas are timed as they are consumed"""
+
+    def __init__(self, stream, metrics):
+        self._stream = stream
+        self.metrics = metrics
+
+    def __iter__(self):
+        for event in self._stream:
+            if event.type == "content_block_delta":
+                self.metrics.on_delta()
+            yield event
+
+    @property
+    def text_stream(self):
+        for event in self:
+            if event.type == "text":
+                yield event.text
+
+    def get_final_message(self):
+        return self._stream.get_final_message()
+
+    def get_final_text(self):
+        return self._stream.get_final_text()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+@contextmanager
+def metered_stream(client, sink=None, tag=None, **request):
+    """client.messages.stream(**request) that records StreamMetrics
+
+    Use it exactly like messages.stream; the metrics are on `.metrics` and,
+    when the block exits, are written to `sink` (a MetricsSink or a path),
+    or to the file named by CLAUDE_STREAM_METRICS if that is set.
+    """
+    if sink is None and os.environ.get(METRICS_PATH_ENV):
+        sink = os.environ[METRICS_PATH_ENV]
+    if isinstance(sink, str):
+        sink = MetricsSink(sink)
+
+    metrics = StreamMetrics(request.get("model"), tag)
+    error = None
+    try:
+        with client.messages.stream(**request) as stream:
+            metered = MeteredStream(stream, metrics)
+            yield metered
+            for _ in metered:
+                pass  # time whatever the caller left unread
+            message = stream.get_final_message()
+    except BaseException as e:
+        error, message = e, None
+        raise
+    finally:
+        metrics.finish(message, error)
+        if sink is not None:
+            sink.write(metrics)
+
+
+def histogram_percentile(counts, percentile):
+    """Upper bound (seconds) of the bucket holding the given percentile"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = total * percentile / 100
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return GAP_BUCKETS[min(index, len(GAP_BUCKETS) - 1)]
+    return GAP_BUCKETS[-1]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers"""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def load_records(path):
+    with open(os.path.expanduser(path)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records, group_by=("model", "tag")):
+    """Percentile summary per model/tag group of metrics records"""
+    groups = defaultdict(list)
+    for record in records:
+        groups[tuple(record.get(field) for field in group_by)].append(record)
+
+    summary = []
+    for key, group in sorted(groups.items(), key=lambda item: str(item[0])):
+        gaps = [0] * (len(GAP_BUCKETS) + 1)
+        for record in group:
+            for index, count in record.get("gap_histogram", {}).items():
+                gaps[int(index)] += count
+        row = dict(zip(group_by, key), requests=len(group),
+                   errors=sum(1 for r in group if r.get("error")))
+        for p in PERCENTILES:
+            row[f"ttft_p{p}_ms"] = percentile([r["ttft_ms"] for r in group], p)
+            row[f"duration_p{p}_ms"] = percentile([r["duration_ms"] for r in group], p)
+            row[f"gap_p{p}_ms"] = _ms(histogram_percentile(gaps, p))
+        # Slowest decoders are the interesting tail, so report the low end
+        row["tokens_per_sec_p50"] = percentile([r["tokens_per_sec"] for r in group], 50)
+        row["tokens_per_sec_p10"] = percentile([r["tokens_per_sec"] for r in group], 10)
+        summary.append(row)
+    return summary
+
+
+def print_summary(summary):
+    for row in summary:
+        label = " / ".join(str(row[k]) for k in ("model", "tag") if row.get(k) is not None)
+        print(f"{label or 'all'}: {row['requests']} requests, {row['errors']} errors")
+        for metric in ("ttft", "duration", "gap"):
+            values = ", ".join(f"p{p} {row[f'{metric}_p{p}_ms']}" for p in PERCENTILES)
+            print(f"  {metric + ' ms':<12} {values}")
+        print(f"  {'tokens/s':<12} p50 {row['tokens_per_sec_p50']}, p10 {row['tokens_per_sec_p10']}")
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("path", nargs="?", default=os.environ.get(METRICS_PATH_ENV),
+                        help=f"metrics JSONL file (default: ${METRICS_PATH_ENV})")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("no metrics file given")
+    print_summary(summarize(load_records(args.path)))
+
+
+if __name__ == "__main__":
+    main()
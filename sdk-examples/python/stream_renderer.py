@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Frame-rate-limited Stream Rendering
+Coalesces streamed text deltas into frames drawn at a capped refresh rate,
+with incremental Markdown styling, labeled panes for concurrent streams
+and a JSONL sink
+
+Usage:
+    with TerminalRenderer() as renderer:
+        for text in stream.text_stream:
+            renderer.write(text)
+
+    with PaneRenderer() as panes:          # or JSONLRenderer(open("out.jsonl", "w"))
+        a, b = panes.stream("review"), panes.stream("summary")
+        ...                                # a.write(text) from any thread; a.close()
+
+    python stream_renderer.py --streams 4 --rate 2000   # synthetic load test
+"""
+import argparse
+import json
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+
+DEFAULT_FPS = 30
+
+# Lines shown per pane
+PANE_HEIGHT = 6
+
+RESET = "\x1b[0m"
+BOLD = "\x1b[1m"
+DIM = "\x1b[2m"
+ITALIC = "\x1b[3m"
+CODE = "\x1b[36m"
+
+# Characters at the start of a line needed to recognize a block marker
+# ("###### ", "```", "- ", "> ")
+LINE_PREFIX_CHARS = 8
+
+
+class MarkdownStyler:
+    """Incremental Markdown to ANSI: feed() text as it arrives, get styled text back
+
+    Handles headings, bullets, quotes, code fences, **bold**, *italic*
+    and `code`. Each character is looked at once; only a few characters
+    that could still become a marker (a lone "*", the start of a line)
+    are held back until the next feed().
+    """
+
+    def __init__(self):
+        self.held = ""
+        self.line_start = True
+        self.in_fence = False
+        self.raw_line = False  # rest of the line is copied as is (fence lines)
+        self.heading = False
+        self.bold = False
+        self.italic = False
+        self.code = False
+
+    def feed(self, text, final=False):
+        s = self.held + text
+        n = len(s)
+        out = []
+        i = 0
+        while i < n:
+            if self.line_start:
+                start = self._line_prefix(s, i, out, final)
+                if start is None:  # can't tell yet
+                    break
+                i = start
+                self.line_start = False
+                continue
+            c = s[i]
+            if c == "\n":
+                if self._styled():
+                    out.append(RESET)
+                self.raw_line = self.heading = self.bold = self.italic = self.code = False
+                self.line_start = True
+                out.append("\n")
+                i += 1
+            elif self.raw_line or self.in_fence:
+                end = s.find("\n", i)
+                end = n if end < 0 else end
+                out.append(s[i:end])
+                i = end
+            elif c == "`":
+                self.code = not self.code
+                out.append(self._style())
+                i += 1
+            elif c == "*" and not self.code:
+                if i + 1 >= n and not final:
+                    break  # could be the first half of **
+                if i + 1 < n and s[i + 1] == "*":
+                    self.bold = not self.bold
+                    out.append(self._style())
+                    i += 2
+                elif self.italic or (i + 1 < n and not s[i + 1].isspace()):
+                    self.italic = not self.italic
+                    out.append(self._style())
+                    i += 1
+                else:
+                    out.append("*")
+                    i += 1
+            else:
+                end = i
+                while end < n and s[end] not in "\n`*":
+                    end += 1
+                out.append(s[i:end])
+                i = end
+        self.held = s[i:]
+        if final:
+            self.held = ""
+            if self._styled():
+                out.append(RESET)
+        return "".join(out)
+
+    def _line_prefix(self, s, i, out, final):
+        """Style a block marker at s[i]; returns the index after it, or None to wait"""
+        end = s.find("\n", i)
+        if end < 0 and len(s) - i < LINE_PREFIX_CHARS and not final:
+            return None
+        line = s[i:end if end >= 0 else len(s)]
+        stripped = line.lstrip(" ")
+        indent = line[:len(line) - len(stripped)]
+
+        if stripped.startswith("```"):
+            self.in_fence = not self.in_fence
+            self.raw_line = True
+            out.append(DIM)
+            return i
+        if self.in_fence:
+            out.append(CODE)
+            return i
+        hashes = len(stripped) - len(stripped.lstrip("#"))
+        if 1 <= hashes <= 6 and stripped[hashes:hashes + 1] == " ":
+            self.heading = True
+            out.append(indent + BOLD)
+            return i + len(indent) + hashes + 1
+        if stripped[:2] in ("- ", "* ", "+ "):
+            out.append(indent + "• ")
+            return i + len(indent) + 2
+        if stripped[:2] == "> ":
+            out.append(indent + DIM + "│" + RESET + " ")
+            return i + len(indent) + 2
+        return i
+
+    def _styled(self):
+        return self.heading or self.bold or self.italic or self.code or self.in_fence or self.raw_line
+
+    def _style(self):
+        return (RESET + (BOLD if self.bold or self.heading else "")
+                + (ITALIC if self.italic else "") + (CODE if self.code else ""))
+
+
+class FrameRenderer:
+    """Base for renderers that draw at most fps frames per second
+
+    Writers only append to a buffer under a lock; a background thread
+    wakes when there is something new, waits one frame interval so that
+    deltas pile up, and draws them with a single write. However fast
+    deltas arrive, there are at most fps writes per second.
+    """
+
+    def __init__(self, out=None, fps=DEFAULT_FPS):
+        self.out = out or sys.stdout
+        self.interval = 1 / fps
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._draw_lock = threading.Lock()
+        self._dirty = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="frame-renderer", daemon=True)
+        self._thread.start()
+
+    def _mark_dirty(self):
+        # Called with the lock held
+        if not self._dirty:
+            self._dirty = True
+            self._wake.notify()
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._dirty and not self._closed:
+                    self._wake.wait()
+                if not self._dirty:
+                    return
+            time.sleep(self.interval)
+            self._draw()
+
+    def _draw(self, final=False):
+        with self._draw_lock:
+            with self._lock:
+                self._dirty = False
+                state = self._take()
+            frame = self._render(state, final)
+            if frame:
+                self.out.write(frame)
+                self.out.flush()
+                self.frames += 1
+
+    def _take(self):
+        """Grab what writers have buffered (called with the lock held)"""
+        raise NotImplementedError
+
+    def _render(self, state, final):
+        """Text for one frame from what _take() returned"""
+        raise NotImplementedError
+
+    def close(self):
+        """Draw whatever is left and stop the frame thread"""
+        with self._wake:
+            if self._closed:
+                return
+            self._closed = True
+            self._wake.notify()
+        self._thread.join()
+        self._draw(final=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TerminalRenderer(FrameRenderer):
+    """One stream to the terminal, Markdown-styled when writing to a tty"""
+
+    def __init__(self, out=None, fps=DEFAULT_FPS, markdown=None):
+        super().__init__(out, fps)
+        if markdown is None:
+            markdown = _isatty(self.out)
+        self.styler = MarkdownStyler() if markdown else None
+        self._pending = []
+
+    def write(self, text):
+        with self._lock:
+            self._pending.append(text)
+            self._mark_dirty()
+
+    def _take(self):
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _render(self, pending, final):
+        text = "".join(pending)
+        return self.styler.feed(text, final) if self.styler else text
+
+
+class StreamHandle:
+    """One labeled stream of a multi-stream renderer"""
+
+    def __init__(self, renderer, label):
+        self.renderer = renderer
+        self.label = label
+        self.pending = []
+        self.chars = 0
+        self.done = False
+        self.started = time.monotonic()
+
+    def write(self, text):
+        renderer = self.renderer
+        with renderer._lock:
+            self.pending.append(text)
+            renderer._mark_dirty()
+
+    def close(self):
+        with self.renderer._lock:
+            self.done = True
+            self.renderer._mark_dirty()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MultiStreamRenderer(FrameRenderer):
+    """Base for renderers fed by several concurrent streams"""
+
+    def __init__(self, out=None, fps=DEFAULT_FPS):
+        super().__init__(out, fps)
+        self.streams = []
+
+    def stream(self, label):
+        """A StreamHandle to write one stream's text to; close it when the stream ends"""
+        handle = StreamHandle(self, label)
+        with self._lock:
+            self.streams.append(handle)
+            self._mark_dirty()
+        return handle
+
+    def _take(self):
+        """Each stream's new text; a closed stream is handed over once, then dropped"""
+        updates = []
+        for handle in self.streams:
+            if handle.pending or handle.done:
+                text = "".join(handle.pending)
+                handle.pending = []
+                handle.chars += len(text)
+                updates.append((handle, text, handle.done))
+        if any(done for _, _, done in updates):
+            self.streams = [handle for handle in self.streams if not handle.done]
+        return updates
+
+
+class PaneRenderer(MultiStreamRenderer):
+    """Concurrent streams as labeled panes showing each stream's latest lines
+
+    Each frame redraws every pane in place, so its cost depends on the
+    number of panes, not on how much text arrived. A finished pane is
+    drawn one last time above the live ones and left in the scrollback.
+    When not writing to a tty, complete lines are printed with a [label]
+    prefix instead.
+    """
+
+    def __init__(self, out=None, fps=DEFAULT_FPS, height=PANE_HEIGHT, width=None):
+        super().__init__(out, fps)
+        self.height = height
+        self.width = width or shutil.get_terminal_size().columns
+        self.interactive = _isatty(self.out)
+        self._panes = {}  # live handle -> [deque of complete lines, partial line, finished]
+        self._rows_drawn = 0  # rows of live panes, redrawn in place
+
+    def _render(self, updates, final):
+        if not self.interactive:
+            return self._render_lines(updates, final)
+        for handle, text, done in updates:
+            pane = self._panes.setdefault(handle, [deque(maxlen=self.height), "", False])
+            lines = (pane[1] + text).split("\n")
+            pane[0].extend(lines[:-1])
+            # A line with no newline in sight only needs its visible tail
+            pane[1] = lines[-1][-self.width * self.height:]
+            pane[2] = done
+        if not updates and not final:
+            return ""
+
+        finished, rows = [], []
+        for handle, pane in list(self._panes.items()):
+            if pane[2] or final:
+                finished.extend(self._pane_rows(handle, *pane))
+                del self._panes[handle]
+            else:
+                rows.extend(self._pane_rows(handle, *pane))
+
+        frame = f"\x1b[{self._rows_drawn}F" if self._rows_drawn else ""
+        frame += "".join(f"\x1b[2K{row}\n" for row in finished + rows)
+        self._rows_drawn = len(rows)
+        return frame
+
+    def _pane_rows(self, handle, lines, partial, done):
+        status = "done" if done else "streaming"
+        title = f"── {handle.label} ({status}, {handle.chars} chars) "
+        rows = [DIM + title[:self.width].ljust(self.width, "─") + RESET]
+        body = []
+        for line in list(lines) + [partial]:
+            body.extend([line[k:k + self.width] for k in range(0, len(line), self.width)] or [""])
+        body = body[-self.height:]
+        return rows + body + [""] * (self.height - len(body))
+
+    def _render_lines(self, updates, final):
+        out = []
+        for handle, text, done in updates:
+            partial = self._panes.get(handle, "") + text
+            lines = partial.split("\n")
+            out.extend(f"[{handle.label}] {line}\n" for line in lines[:-1])
+            if done or final:
+                if lines[-1]:
+                    out.append(f"[{handle.label}] {lines[-1]}\n")
+                self._panes.pop(handle, None)
+            else:
+                self._panes[handle] = lines[-1]
+        return "".join(out)
+
+
+class JSONLRenderer(MultiStreamRenderer):
+    """One JSON record per stream per frame: {"stream", "t", "text"}, then {"done": true}"""
+
+    def _render(self, updates, final):
+        out = []
+        for handle, text, done in updates:
+            t = round(time.monotonic() - handle.started, 3)
+            if text:
+                out.append(json.dumps({"stream": handle.label, "t": t, "text": text}) + "\n")
+            if done:
+                out.append(json.dumps({"stream": handle.label, "t": t, "done": True,
+                                       "chars": handle.chars}) + "\n")
+        return "".join(out)
+
+
+def _isatty(out):
+    try:
+        return out.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--streams", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=500, help="deltas per second per stream")
+    parser.add_argument("--deltas", type=int, default=2000, help="deltas per stream")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    parser.add_argument("--jsonl", action="store_true", help="JSONL records instead of panes")
+    args = parser.parse_args()
+
+    text = ("## Review\n\nThe **loop** in `main()` re-reads the *config* on every pass.\n"
+            "- cache it once\n- pass it in\n\n```python\nconfig = load()\n```\n").split(" ")
+
+    renderer = (JSONLRenderer if args.jsonl else PaneRenderer)(fps=args.fps)
+
+    def produce(handle):
+        started = time.monotonic()
+        for index in range(args.deltas):
+            delay = started + index / args.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            handle.write(text[index % len(text)] + " ")
+        handle.close()
+
+    started = time.perf_counter()
+    cpu = time.process_time()
+    with renderer:
+        threads = [threading.Thread(target=produce, args=(renderer.stream(f"stream {i + 1}"),))
+                   for i in range(args.streams)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    print(f"{args.streams * args.deltas} deltas in {elapsed:.2f}s drawn as {renderer.frames} frames, "
+          f"{time.process_time() - cpu:.2f}s CPU", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,23 @@
-#\!/usr/bin/env python3
+#!/usr/bin/env python3
 """
 Streaming Response Example
 Shows how to use Claude's streaming API for real-time responses
 """
-import os
-from anthropic import Anthropic
+from client_factory import get_client
+from stream_metrics import metered_stream
+from stream_renderer import TerminalRenderer
+from token_counting import usage_of
 
-def main():
-    client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+def stream_story(client, on_text=None, sink=None):
+    """Stream the story, passing each text delta to on_text
     
-    print("Asking Claude to write a story (streaming)...")
-    print("-" * 50)
-    
-    with client.messages.stream(
+    Returns (final_message, metrics).
+    """
+    # Like client.messages.stream, plus latency metrics; set
+    # CLAUDE_STREAM_METRICS=metrics.jsonl to keep a record of every run
+    with metered_stream(
+        client,
+        sink=sink,
         model="claude-3-5-sonnet-20241022",
         max_tokens=500,
         messages=[
@@ -20,11 +25,25 @@ def main():
         ]
     ) as stream:
         for text in stream.text_stream:
-            print(text, end='', flush=True)
+            if on_text is not None:
+                on_text(text)
+        final_message = stream.get_final_message()
+    return final_message, stream.metrics
+
+def main():
+    client = get_client()
+    
+    print("Asking Claude to write a story (streaming)...")
+    print("-" * 50)
+    
+    # Deltas are coalesced into at most 30 terminal writes per second
+    with TerminalRenderer() as renderer:
+        final_message, metrics = stream_story(client, renderer.write)
     
     print("\n" + "-" * 50)
-    print("Stream complete\!")
+    print("Stream complete!")
+    print(f"Tokens: {usage_of(final_message)}")
+    print(f"Latency: {metrics}")
 
 if __name__ == "__main__":
     main()
-EOF < /dev/null
\ No newline at end of file
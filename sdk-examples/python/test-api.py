@@ -4,7 +4,8 @@ Quick test to verify Anthropic API key is working
 """
 import os
 import sys
-from anthropic import Anthropic
+from client_factory import get_client
+from token_counting import usage_of
 
 def test_api_key():
     api_key = os.environ.get("ANTHROPIC_API_KEY")
@@ -18,7 +19,7 @@ def test_api_key():
     print(f"✓ API key found: {api_key[:10]}...{api_key[-4:]}")
     
     try:
-        client = Anthropic(api_key=api_key)
+        client = get_client(api_key=api_key)
         
         print("\nTesting API connection...")
         message = client.messages.create(
@@ -31,6 +32,7 @@ def test_api_key():
         
         response = message.content[0].text
         print(f"\n✅ API Response: {response}")
+        print(f"   Tokens: {usage_of(message)}")
         print("\n🎉 Everything is working! Your Claude SDK is ready to use.")
         return True
         
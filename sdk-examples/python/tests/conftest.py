@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# The examples import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Nothing under test may reach the real API: unless a test points the
+# client at a local mock, requests go to a closed port
+os.environ["ANTHROPIC_API_KEY"] = "test"
+os.environ["ANTHROPIC_BASE_URL"] = "http://127.0.0.1:9"
+os.environ.pop("CLAUDE_STREAM_METRICS", None)
+os.environ.pop("GITHUB_TOKEN", None)
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """A local mock Messages API the shared clients are pointed at"""
+    from mock_anthropic_server import start_mock_server
+
+    servers = []
+
+    def start(**options):
+        options.setdefault("latency", 0)
+        options.setdefault("token_rate", 1e6)
+        options.setdefault("output_tokens", 20)
+        server, base_url = start_mock_server(**options)
+        servers.append(server)
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", base_url)
+        # Shared clients are keyed by API key, so each mock gets its own
+        monkeypatch.setenv("ANTHROPIC_API_KEY", f"test-{server.server_address[1]}")
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+
+import pytest
+
+from assistant_db import BatchWriter, get_database
+from mcp_claude_integration import IntelligentMCPAssistant
+from token_counting import TokenUsage
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "assistant.db"
+    yield str(path)
+    get_database(str(path)).close_all()
+
+
+def columns(database, table):
+    return {row[1] for row in database.fetch_all(f"PRAGMA table_info({table})")}
+
+
+def make_legacy_database(path):
+    """The original schema, before usage columns, FTS and rollups"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            query TEXT, response TEXT, context TEXT, tokens_used INTEGER
+        );
+        CREATE TABLE code_reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            file_path TEXT, issues TEXT, suggestions TEXT, score INTEGER
+        );
+        INSERT INTO interactions (timestamp, query, response, tokens_used) VALUES
+            ('2025-07-01 09:15:00', 'How do I profile python code?', 'Use cProfile.', 100),
+            ('2025-07-01 09:45:00', 'How do I profile python code?', 'Try py-spy.', 50),
+            ('2025-07-02 14:00:00', 'Explain sqlite WAL mode', 'Readers do not block writers.', 30);
+        INSERT INTO code_reviews (timestamp, file_path, issues, score) VALUES
+            ('2025-07-01 10:00:00', 'a.py', 'fine', 8),
+            ('2025-07-01 11:00:00', 'b.py', 'hmm', NULL);
+    ''')
+    conn.close()
+
+
+def test_legacy_database_is_migrated_and_backfilled(db_path):
+    make_legacy_database(db_path)
+    assistant = IntelligentMCPAssistant(db_path)
+    database = assistant.db
+
+    assert {"input_tokens", "cache_read_tokens"} <= columns(database, "interactions")
+    assert {"content_hash", "model", "prompt_version"} <= columns(database, "code_reviews")
+
+    if assistant.fts_enabled:
+        rows = database.fetch_all(
+            "SELECT rowid FROM interactions_fts WHERE interactions_fts MATCH 'profile' ORDER BY rowid"
+        )
+        assert rows == [(1,), (2,)]
+
+    summary = assistant.get_activity_summary("2025-07-01")
+    assert summary["interactions"] == 2 and summary["tokens_used"] == 150
+    assert summary["code_reviews"] == 2 and summary["average_score"] == 8
+    assert summary["top_queries"] == [("How do I profile python code?", 2)]
+    assert assistant.get_hourly_activity("2025-07-01") == [
+        ("2025-07-01 09:00:00", 2, 150, 0),
+        ("2025-07-01 10:00:00", 0, 0, 1),
+        ("2025-07-01 11:00:00", 0, 0, 1),
+    ]
+
+
+def test_reopening_does_not_backfill_twice(db_path):
+    make_legacy_database(db_path)
+    IntelligentMCPAssistant(db_path)
+    assistant = IntelligentMCPAssistant(db_path)
+    assert assistant.get_activity_summary("2025-07-01", "2025-07-02")["interactions"] == 3
+    if assistant.fts_enabled:
+        count = assistant.db.fetch_one(
+            "SELECT COUNT(*) FROM interactions_fts WHERE interactions_fts MATCH 'sqlite'"
+        )[0]
+        assert count == 1
+
+
+def test_triggers_keep_search_index_and_rollups_in_sync(db_path):
+    assistant = IntelligentMCPAssistant(db_path)
+    usage = TokenUsage().add(type("Usage", (), {"input_tokens": 40, "output_tokens": 2})())
+    assistant.record_interaction("key", "vectorize numpy loops", "", "Use broadcasting.", usage)
+    assistant.writer.flush()
+    database = assistant.db
+    today = database.fetch_one("SELECT date('now')")[0]
+    assert assistant.get_activity_summary()["tokens_used"] == 42
+
+    def matches(term):
+        return database.fetch_all("SELECT rowid FROM interactions_fts WHERE interactions_fts MATCH ?",
+                                  (term,))
+
+    with database.transaction() as conn:
+        conn.execute("UPDATE interactions SET query = 'speed up pandas', tokens_used = 10")
+    summary = assistant.get_activity_summary(today)
+    assert summary["tokens_used"] == 10
+    assert summary["top_queries"] == [("speed up pandas", 1)]
+    if assistant.fts_enabled:
+        assert matches("numpy") == [] and len(matches("pandas")) == 1
+
+    with database.transaction() as conn:
+        conn.execute("DELETE FROM interactions")
+    summary = assistant.get_activity_summary(today)
+    assert summary["interactions"] == 0 and summary["top_queries"] == []
+    if assistant.fts_enabled:
+        assert matches("pandas") == []
+
+
+def test_review_rollups_track_scores(db_path):
+    assistant = IntelligentMCPAssistant(db_path)
+    with assistant.db.transaction() as conn:
+        conn.executemany("INSERT INTO code_reviews (file_path, score) VALUES (?, ?)",
+                         [("a.py", 6), ("b.py", 9), ("c.py", None)])
+        conn.execute("UPDATE code_reviews SET score = 3 WHERE file_path = 'b.py'")
+    summary = assistant.get_activity_summary()
+    assert summary["code_reviews"] == 3 and summary["average_score"] == 4.5
+
+
+def test_history_context_uses_the_index(db_path):
+    make_legacy_database(db_path)
+    assistant = IntelligentMCPAssistant(db_path)
+    context = assistant.get_historical_insights("profile my python code")
+    assert "cProfile" in context and "WAL" not in context
+
+
+def test_batch_writer_groups_writes_and_drops_only_bad_rows(db_path, capsys):
+    database = get_database(db_path)
+    database.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    writer = BatchWriter(database, batch_size=1000, flush_interval=60)
+    try:
+        for n in range(100):
+            writer.submit("INSERT INTO items (id, name) VALUES (?, ?)", (n, f"item {n}"))
+        writer.submit("INSERT INTO items (id, name) VALUES (?, ?)", (5, "duplicate"))
+        writer.submit("INSERT INTO items (id, name) VALUES (?, ?)", (200, None))
+        assert writer.flush(timeout=5)
+    finally:
+        writer.close()
+    assert database.fetch_one("SELECT COUNT(*) FROM items")[0] == 100
+    assert writer.rows_written == 100 and writer.rows_failed == 2
+    assert "dropped INSERT INTO items" in capsys.readouterr().err
+
+
+def test_connections_are_per_thread(db_path):
+    database = get_database(db_path)
+    assert get_database(db_path) is database
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(database.connection()))
+    thread.start()
+    thread.join()
+    assert seen[0] is not database.connection()
+    assert database.fetch_one("PRAGMA journal_mode")[0] == "wal"
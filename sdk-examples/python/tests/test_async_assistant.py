@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from assistant_db import get_database
+from async_assistant import AsyncIntelligentMCPAssistant
+from client_factory import aclose_async_clients
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "assistant.db")
+    yield path
+    get_database(path).close_all()
+
+
+def gather(db_path, queries, max_concurrency, **options):
+    async def main():
+        try:
+            async with AsyncIntelligentMCPAssistant(db_path, max_concurrency=max_concurrency) as assistant:
+                return await assistant.gather_queries(queries, **options)
+        finally:
+            await aclose_async_clients()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("max_concurrency", [3, 8])
+def test_gather_queries_is_bounded_by_max_concurrency(mock_api, db_path, max_concurrency):
+    server = mock_api(latency=0.2)
+    queries = [f"question {n}" for n in range(16)]
+    answers = gather(db_path, queries, max_concurrency, use_history=False, use_cache=False)
+
+    assert len(answers) == 16 and all(isinstance(answer, str) and answer for answer in answers)
+    assert server.state.requests == 16
+    # Never over the bound, and well past one at a time
+    assert max_concurrency // 2 < server.state.peak_active <= max_concurrency
+
+
+def test_gather_queries_answers_repeats_from_the_cache(mock_api, db_path):
+    server = mock_api(latency=0.05)
+    first = gather(db_path, ["Explain WAL", "What is a B-tree?"], 4, use_history=False)
+    again = gather(db_path, ["explain  wal", "What is a B-tree?", "New question"], 4,
+                   use_history=False)
+    assert again[:2] == first
+    assert server.state.requests == 3
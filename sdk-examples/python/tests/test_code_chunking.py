@@ -0,0 +1,140 @@
+import threading
+
+from code_chunking import _brace_boundaries, _scan_braces, chunk_source
+
+
+def lines_of(source):
+    return source.splitlines(keepends=True)
+
+
+def test_python_chunks_follow_declarations():
+    functions = "".join(
+        f"def function_{n}(x):\n" + "".join(f"    x = x + {i}\n" for i in range(40)) + "    return x\n\n"
+        for n in range(6)
+    )
+    source = "import os\n\n" + functions
+    chunks = chunk_source(source, "python", max_tokens=400)
+
+    assert len(chunks) > 1
+    assert "".join(chunk.text for chunk in chunks) == source
+    for chunk in chunks[1:]:
+        assert chunk.text.startswith("def function_")
+    for before, after in zip(chunks, chunks[1:]):
+        assert after.start_line == before.end_line + 1
+
+
+def test_python_class_over_budget_splits_on_methods():
+    methods = "".join(
+        f"    def method_{n}(self):\n" + "".join(f"        self.v += {i}\n" for i in range(30)) + "\n"
+        for n in range(5)
+    )
+    source = "class Big:\n" + methods
+    chunks = chunk_source(source, "python", max_tokens=300)
+
+    assert len(chunks) > 1
+    for chunk in chunks[1:]:
+        assert chunk.text.lstrip().startswith("def method_")
+
+
+def test_python_syntax_error_falls_back_to_lines():
+    source = "def broken(:\n" + "x = 1\n" * 500
+    chunks = chunk_source(source, "python", max_tokens=200)
+
+    assert len(chunks) > 1
+    assert "".join(chunk.text for chunk in chunks) == source
+
+
+def test_concurrent_python_chunking():
+    source = "".join(f"def f{n}():\n    return {n}\n\n" for n in range(300))
+    expected = chunk_source(source, "python", max_tokens=200)
+    results, errors = [], []
+
+    def chunk():
+        try:
+            results.append(chunk_source(source, "python", max_tokens=200))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=chunk) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert all(result == expected for result in results)
+
+
+def test_brace_boundaries_top_level_declarations():
+    source = """import x from "y";
+function a() {
+  if (x) { return "}"; }
+}
+// function commented() {
+/* class Hidden {
+} */
+export class B {
+  m() {}
+}
+const c = '{';
+"""
+    assert _brace_boundaries(lines_of(source), 0) == [2, 8, 11]
+
+
+def test_multiline_template_literal_keeps_brace_state():
+    source = """const t = `
+  header ${ {a: 1}.a } then a stray brace {
+  ${ {
+    b: 2
+  }.b }
+`;
+function a() {
+  return t;
+}
+class B {
+}
+"""
+    assert _brace_boundaries(lines_of(source), 0) == [1, 7, 10]
+
+
+def test_regex_literals_are_skipped():
+    source = """const re = /[{]+\\/}/g;
+function a(s) {
+  return s.split(/[{]+/).length / 2 / 1;
+}
+class B {
+}
+"""
+    assert _brace_boundaries(lines_of(source), 0) == [1, 2, 5]
+
+
+def test_scan_braces_carries_open_state():
+    depth, state = _scan_braces("const s = `open {\n", 0)
+    assert (depth, state) == (0, ("`",))
+    depth, state = _scan_braces("} still text ${ x + {\n", depth, state)
+    assert (depth, state) == (0, ("`", 1))
+    depth, state = _scan_braces("} } done`; {\n", depth, state)
+    assert (depth, state) == (1, ())
+
+    depth, state = _scan_braces("/* {\n", 0)
+    assert state == ("*",)
+    assert _scan_braces("} */ {\n", depth, state) == (1, ())
+
+    # An unterminated plain string ends with its line...
+    assert _scan_braces("x = 'oops {\n", 0) == (0, ())
+    # ...unless continued with a backslash
+    assert _scan_braces("x = 'long \\\n", 0) == (0, ("'",))
+
+
+def test_javascript_chunks_respect_template_literals():
+    template = "const page = `\n" + "".join(f"  <div>{{{n}</div>\n" for n in range(80)) + "`;\n"
+    functions = "".join(
+        f"function f{n}() {{\n" + "".join(f"  call({i});\n" for i in range(30)) + "}\n" for n in range(4)
+    )
+    source = template + functions
+    chunks = chunk_source(source, "javascript", max_tokens=300)
+
+    starts = {chunk.start_line for chunk in chunks}
+    function_lines = [n + 1 for n, line in enumerate(lines_of(source)) if line.startswith("function")]
+    # Each chunk after the template starts on a function boundary
+    assert all(start == 1 or start in function_lines or start < function_lines[0] for start in starts)
+    assert "".join(chunk.text for chunk in chunks) == source
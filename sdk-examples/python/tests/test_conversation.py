@@ -0,0 +1,65 @@
+import pytest
+
+from conversation import Conversation
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+def system_texts(request):
+    system = request.get("system") or ()
+    # A short, unmarked system prompt is sent as a plain string
+    return [system] if isinstance(system, str) else [block["text"] for block in system]
+
+
+def user_texts(request):
+    return [message["content"][0]["text"] for message in request["messages"]
+            if message["role"] == "user"]
+
+
+def test_rolling_window_summarizes_older_turns_and_keeps_the_tail(mock_api):
+    server = mock_api()
+    questions = [f"question {n}" for n in range(8)]
+    with Conversation(system="Be brief.", keep_turns=2, summarize_every=2) as conversation:
+        for question in questions:
+            assert conversation.send(question)
+    folded = conversation.summarized_turns
+
+    assert folded >= 2 and folded + len(conversation.turns) == len(questions)
+    assert [user for user, _ in conversation.turns] == questions[folded:]
+    assert conversation.summary
+    assert conversation.usage.requests == len(questions)
+    assert server.state.requests == len(questions) + conversation.summary_usage.requests
+
+    request = conversation.request("next")
+    assert system_texts(request) == [
+        "Be brief.", f"Summary of the conversation so far:\n{conversation.summary}"
+    ]
+    assert user_texts(request) == questions[folded:] + ["next"]
+
+
+def test_window_over_budget_is_folded_before_the_next_turn(mock_api):
+    mock_api()
+    long_question = "explain this in detail " * 40
+    with Conversation(keep_turns=6, max_window_tokens=100) as conversation:
+        conversation.send(long_question)
+        conversation.send(long_question + "again")
+        # Past twice the budget, the next request waits for the fold
+        request = conversation.request("short")
+    assert conversation.summarized_turns == 1
+    assert user_texts(request) == [long_question + "again", "short"]
+    assert system_texts(request)[0].startswith("Summary of the conversation so far:")
+
+
+def test_failed_summary_keeps_turns_verbatim():
+    class Client:
+        class messages:
+            @staticmethod
+            def create(**request):
+                raise ConnectionError("down")
+
+    conversation = Conversation(client=Client, keep_turns=1, summarize_every=1)
+    for number in range(3):
+        conversation.record(f"q{number}", f"a{number}")
+    conversation.close()
+    assert conversation.summary == "" and conversation.summarized_turns == 0
+    assert [user for user, _ in conversation.turns] == ["q0", "q1", "q2"]
@@ -0,0 +1,116 @@
+import subprocess
+
+import pytest
+
+from diff_chunking import chunk_diff, diffstat, git_diff_lines, parse_diff
+from token_counting import estimate_tokens
+
+DIFF = """commit message mentioning --- dashes
+diff --git a/app.py b/app.py
+index 1111111..2222222 100644
+--- a/app.py
++++ b/app.py
+@@ -1,3 +1,4 @@
+ import os
+--- removed line that looks like a header
++added = 1
++another = 2
+ print(os)
+diff --git a/logo.png b/logo.png
+new file mode 100644
+Binary files /dev/null and b/logo.png differ
+diff --git a/old.txt b/old.txt
+deleted file mode 100644
+--- a/old.txt
++++ /dev/null
+@@ -1,2 +0,0 @@
+-one
+-two
+\\ No newline at end of file
+"""
+
+
+def test_parse_diff_uses_hunk_lengths_and_keeps_headerless_files():
+    files = list(parse_diff(DIFF.splitlines(keepends=True)))
+    assert [(f.path, f.added, f.removed) for f in files] == [
+        ("app.py", 2, 1), ("logo.png", 0, 0), ("old.txt", 0, 2),
+    ]
+    app = files[0]
+    assert app.header[0].startswith("diff --git") and len(app.hunks) == 1
+    assert "--- removed line that looks like a header\n" in app.hunks[0]
+    assert files[2].hunks[0][-1] == "\\ No newline at end of file\n"
+
+
+def test_parse_diff_is_lazy():
+    def lines():
+        yield from DIFF.splitlines(keepends=True)[:12]
+        raise AssertionError("read past the first file")
+
+    first = next(parse_diff(lines()))
+    assert first.path == "app.py"
+
+
+def test_plain_unified_diff_without_git_headers():
+    diff = "--- a/x.txt\n+++ b/x.txt\n@@ -1 +1 @@\n-a\n+b\n--- a/y.txt\n+++ b/y.txt\n@@ -0,0 +1 @@\n+c\n"
+    assert [(f.path, f.added, f.removed) for f in parse_diff(diff.splitlines())] == [
+        ("x.txt", 1, 1), ("y.txt", 1, 0),
+    ]
+
+
+def file_diff(path, hunks, lines_per_hunk):
+    text = f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n"
+    for number in range(hunks):
+        start = number * 100 + 1
+        text += f"@@ -{start},{lines_per_hunk} +{start},{lines_per_hunk} @@\n"
+        text += "".join(f" context line {n} in {path}\n" for n in range(lines_per_hunk))
+    return text
+
+
+def test_chunks_hold_whole_hunks_within_budget_and_repeat_headers():
+    diff = file_diff("a.py", 6, 20) + file_diff("b.py", 2, 20)
+    chunks = list(chunk_diff(parse_diff(diff.splitlines(keepends=True)), max_tokens=600))
+    assert len(chunks) > 2
+    for chunk in chunks:
+        assert estimate_tokens(chunk.text) <= 600
+        for path in chunk.paths:
+            assert f"+++ b/{path}\n" in chunk.text
+        # Every chunk starts with a file header and holds only whole hunks
+        assert chunk.text.startswith("diff --git")
+        assert chunk.text.count("@@ -") == chunk.text.count(" context line 0 ")
+    assert chunks[-1].paths[-1] == "b.py"
+    combined = "".join(chunk.text for chunk in chunks)
+    assert combined.count("context line 19 in a.py") == 6
+
+
+def test_oversized_hunk_is_split_on_lines_keeping_its_header():
+    diff = file_diff("big.py", 1, 400)
+    chunks = list(chunk_diff(parse_diff(diff.splitlines(keepends=True)), max_tokens=500))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.paths == ("big.py",)
+        assert "@@ -1,400 +1,400 @@\n" in chunk.text
+    body = "".join(line for chunk in chunks for line in chunk.text.splitlines(keepends=True)
+                   if "context line" in line)
+    assert body == "".join(f" context line {n} in big.py\n" for n in range(400))
+
+
+def test_diffstat_totals():
+    files = list(parse_diff(DIFF.splitlines(keepends=True)))
+    assert diffstat(files).splitlines()[-1] == "3 files changed, 2 insertions(+), 3 deletions(-)"
+
+
+def test_git_diff_lines_streams_and_reports_failures(tmp_path):
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    (tmp_path / "f.txt").write_text("one\n")
+    git("add", "f.txt")
+    (tmp_path / "f.txt").write_text("two\n")
+    files = list(parse_diff(git_diff_lines("--cached", cwd=tmp_path)))
+    assert [(f.path, f.added, f.removed) for f in files] == [("f.txt", 1, 0)]
+    files = list(parse_diff(git_diff_lines(cwd=tmp_path)))
+    assert [(f.path, f.added, f.removed) for f in files] == [("f.txt", 1, 1)]
+
+    with pytest.raises(subprocess.CalledProcessError):
+        list(git_diff_lines("no-such-revision", cwd=tmp_path))
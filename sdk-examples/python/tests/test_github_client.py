@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+from github_cache import HTTPCache
+from github_client import GitHubClient, GitHubError, RateLimiter, parse_link_header
+from github_stub_server import start_stub_server
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**options):
+        server, base_url = start_stub_server(**options)
+        servers.append(server)
+        return server.state, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pagination_fetches_only_the_pages_needed(stub):
+    state, base_url = stub(commit_count=250)
+    with GitHubClient(token="stub", base_url=base_url) as github:
+        commits = list(github.iter_commits("o", "r", limit=5))
+        assert len(commits) == 5 and state.requests == 1
+
+        commits = list(github.iter_commits("o", "r", limit=150))
+        assert len(commits) == 150 and state.requests == 3
+        assert commits[0]["sha"] == f"{250:040x}" and commits[-1]["sha"] == f"{101:040x}"
+
+        everything = list(github.paginate("repos/o/r/commits"))
+        assert len(everything) == 250 and state.requests == 6
+        # Stopping early never requests the next page
+        iterator = github.paginate("repos/o/r/commits")
+        next(iterator)
+        iterator.close()
+        assert state.requests == 7
+
+
+def test_since_filter_is_sent_and_applied(stub):
+    state, base_url = stub(commit_count=100)
+    with GitHubClient(token="stub", base_url=base_url) as github:
+        commits = list(github.iter_commits("o", "r", since="2025-07-08T00:00:00Z"))
+    assert len(commits) == 13
+    assert state.requests == 1
+
+
+def test_org_repos_limit_counts_only_yielded_repos(stub):
+    state, base_url = stub(repo_count=30)
+    with GitHubClient(token="stub", base_url=base_url) as github:
+        repos = list(github.iter_org_repos("acme", limit=12))
+    assert [repo["name"] for repo in repos] == [f"project-{i:03d}" for i in range(12)]
+    assert state.requests == 1
+
+
+def test_etag_revalidation_serves_304_from_cache(stub, tmp_path):
+    state, base_url = stub(max_age=0)
+    cache = HTTPCache(str(tmp_path / "cache.db"))
+    with GitHubClient(token="stub", base_url=base_url, cache=cache) as github:
+        first = github.request("GET", "repos/o/r")
+        assert not first.from_cache
+        cache.writer.flush()
+
+        second = github.request("GET", "repos/o/r")
+        assert second.from_cache and second.json() == first.json()
+        assert state.not_modified == 1 and state.requests == 2
+        # A 304 costs no quota
+        assert state.rate_remaining == state.rate_limit - 1
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_fresh_entries_skip_the_network(stub, tmp_path):
+    state, base_url = stub(max_age=60)
+    cache = HTTPCache(str(tmp_path / "cache.db"))
+    with GitHubClient(token="stub", base_url=base_url, cache=cache) as github:
+        github.get("repos/o/r/languages")
+        cache.writer.flush()
+        assert github.request("GET", "repos/o/r/languages").from_cache
+    assert state.requests == 1
+    assert cache.stats()["fresh_hits"] == 1
+
+
+def test_cache_is_keyed_by_token(stub, tmp_path):
+    state, base_url = stub(max_age=60)
+    cache = HTTPCache(str(tmp_path / "cache.db"))
+    with GitHubClient(token="one", base_url=base_url, cache=cache) as github:
+        github.get("repos/o/r")
+    cache.writer.flush()
+    with GitHubClient(token="two", base_url=base_url, cache=cache) as github:
+        assert not github.request("GET", "repos/o/r").from_cache
+    assert state.requests == 2
+
+
+def test_errors_raise_github_error(stub):
+    state, base_url = stub(rate_limit=1)
+    with GitHubClient(token="stub", base_url=base_url) as github:
+        with pytest.raises(GitHubError) as error:
+            github.get("nowhere")
+        assert error.value.status == 404
+        # The 404 used the only request in the window
+        with pytest.raises(GitHubError) as error:
+            github.get("repos/o/r")
+        assert error.value.status == 403 and error.value.headers["x-ratelimit-remaining"] == "0"
+
+
+def test_rate_limiter_keeps_a_reserve():
+    limiter = RateLimiter(reserve=2)
+    limiter.acquire()
+    limiter.release({"x-ratelimit-remaining": "3", "x-ratelimit-reset": str(time.time() + 3600)})
+    limiter.acquire()
+    assert limiter.in_flight == 1
+    # Out-of-order replies in one window keep the lowest count
+    reset = str(limiter.reset_at)
+    limiter.release({"x-ratelimit-remaining": "5", "x-ratelimit-reset": reset})
+    assert limiter.remaining == 3
+    assert limiter.backoff(403, {"retry-after": "0"}, 0)
+    assert not limiter.backoff(403, {}, 0)
+
+
+def test_parse_link_header():
+    links = parse_link_header('<https://x/?page=2>; rel="next", <https://x/?page=9>; rel="last"')
+    assert links == {"next": "https://x/?page=2", "last": "https://x/?page=9"}
+    assert parse_link_header(None) == {}
@@ -0,0 +1,34 @@
+import http.client
+import json
+
+import pytest
+
+import github_integration
+
+
+class FailingGitHub:
+    def __init__(self, error):
+        self.error = error
+
+    def fetch_repository(self, owner, repo, commits):
+        raise self.error
+
+
+@pytest.mark.parametrize("error", [
+    ConnectionResetError("reset"),
+    http.client.IncompleteRead(b"{"),
+    json.JSONDecodeError("Expecting value", "", 0),
+])
+def test_fetch_falls_back_to_gh_when_the_api_response_fails(monkeypatch, error):
+    monkeypatch.setattr(github_integration, "fetch_repository_data_gh",
+                        lambda owner, repo: ("repo", owner, repo))
+    assert github_integration.fetch_repository_data("o", "r", FailingGitHub(error)) == ("repo", "o", "r")
+
+
+def test_analyze_reports_unreadable_repository_data(monkeypatch, capsys):
+    def fetch(owner, repo):
+        raise http.client.BadStatusLine("garbage")
+
+    monkeypatch.setattr(github_integration, "fetch_repository_data", fetch)
+    assert github_integration.analyze_repository(None, "https://github.com/o/r") is None
+    assert "Error fetching repository data" in capsys.readouterr().out
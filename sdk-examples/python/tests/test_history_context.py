@@ -0,0 +1,85 @@
+import pytest
+
+from assistant_db import get_database
+from history_context import (
+    HEADER, HistoryContextAssembler, match_expression, significant_terms, truncate_to_tokens
+)
+from mcp_claude_integration import IntelligentMCPAssistant
+from token_counting import estimate_tokens
+
+
+@pytest.fixture
+def assistant(tmp_path):
+    path = str(tmp_path / "assistant.db")
+    yield IntelligentMCPAssistant(path)
+    get_database(path).close_all()
+
+
+def add_interactions(assistant, rows):
+    """rows of (age in days, query, response)"""
+    with assistant.db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO interactions (timestamp, query, response) "
+            "VALUES (datetime('now', ?), ?, ?)",
+            [(f"-{age} days", query, response) for age, query, response in rows],
+        )
+
+
+def assemblers(assistant, budget):
+    yield HistoryContextAssembler(assistant.db, False, budget=budget)
+    if assistant.fts_enabled:
+        yield HistoryContextAssembler(assistant.db, True, budget=budget)
+
+
+def entries(context):
+    return [line[3:] for line in context.splitlines() if line.startswith("Q: ")]
+
+
+def test_significant_terms_are_distinct_and_in_order():
+    assert significant_terms("How do I cache the cache of a Cache in Python, python?") == [
+        "cache", "python"
+    ]
+    assert significant_terms("alpha beta alpha gamma delta", limit=3) == ["alpha", "beta", "gamma"]
+    assert match_expression('sqlite NEAR(wal)') == '"sqlite" OR "near" OR "wal"'
+
+
+def test_truncation_ends_on_a_boundary():
+    text = "First sentence is here. " + "word " * 200
+    cut = truncate_to_tokens(text, 30)
+    assert cut.endswith(" word...") and text.startswith(cut[:-3])
+    assert estimate_tokens(cut) <= 32
+    assert truncate_to_tokens("Short answer.", 30) == "Short answer."
+
+
+def test_context_fits_the_budget(assistant):
+    add_interactions(assistant, [
+        (n, f"How do I tune sqlite index number {n}?", f"Index tuning note {n}: " + "detail " * 300)
+        for n in range(20)
+    ])
+    for assembler in assemblers(assistant, budget=300):
+        context = assembler.build("tune sqlite index")
+        assert context.startswith(HEADER)
+        assert estimate_tokens(context) <= 300
+        assert 1 <= len(entries(context)) < 20
+
+
+def test_recent_interactions_rank_first_and_near_duplicates_are_dropped(assistant):
+    add_interactions(assistant, [
+        (200, "How do I profile a python service?", "Use cProfile and read the flame graph."),
+        (1, "How do I profile a python worker?", "Attach py-spy to the running worker process."),
+        (2, "How do I profile a python worker?", "Attach py-spy to the running worker process now."),
+        (0, "Which sqlite journal mode?", "WAL lets readers run alongside one writer."),
+    ])
+    for assembler in assemblers(assistant, budget=600):
+        questions = entries(assembler.build("profile python code"))
+        assert questions == ["How do I profile a python worker?", "How do I profile a python service?"]
+
+
+def test_assemble_reuses_contexts_for_the_same_terms(assistant):
+    add_interactions(assistant, [(0, "Explain sqlite WAL", "Readers do not block writers.")])
+    assembler = HistoryContextAssembler(assistant.db, assistant.fts_enabled)
+    first = assembler.assemble("explain WAL in sqlite")
+    assert "Readers do not block writers." in first
+    assert assembler.assemble("sqlite wal explain") == first
+    assert assembler.stats()["hits"] == 1 and assembler.stats()["misses"] == 1
+    assert assembler.assemble("what is the weather") == ""
@@ -0,0 +1,154 @@
+import pytest
+
+from assistant_db import get_database
+from client_factory import get_client
+from code_analysis import analyze_code_batch
+from code_chunking import LARGE_SOURCE_TOKENS
+from mcp_claude_integration import IntelligentMCPAssistant
+from message_batches import (
+    batch_request, describe, iter_results, pack_batches, result_error, wait_for_batches
+)
+from token_counting import TokenUsage, estimate_tokens
+
+POLL = 0.02
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "assistant.db")
+    yield path
+    get_database(path).close_all()
+
+
+def write_sources(root, count, prefix="module"):
+    root.mkdir(exist_ok=True)
+    for number in range(count):
+        (root / f"{prefix}_{number}.py").write_text(f"def {prefix}_{number}():\n    return {number}\n")
+
+
+def large_source():
+    functions = [f"def function_{n}(value):\n" + "".join(
+        f"    value = value * {k} + {n}  # step {k}\n" for k in range(12)
+    ) + "    return value\n\n" for n in range(120)]
+    source = "".join(functions)
+    assert estimate_tokens(source) > LARGE_SOURCE_TOKENS
+    return source
+
+
+def statuses(assistant, column="status"):
+    assistant.writer.flush()
+    return dict(assistant.db.fetch_all(
+        f"SELECT {column}, COUNT(*) FROM review_batch_items GROUP BY {column}"
+    ))
+
+
+def test_pack_batches_splits_by_count_and_bytes():
+    requests = [batch_request(f"r{n}", {"text": "x" * 100}) for n in range(10)]
+    assert [len(b) for b in pack_batches(requests, max_requests=4)] == [4, 4, 2]
+    assert [len(b) for b in pack_batches(iter(requests), max_bytes=300)] == [2] * 5
+
+
+def test_analyze_code_batch_returns_results_in_order(mock_api):
+    server = mock_api(batch_delay=0.1, error_rate=0.3, seed=7)
+    usage = TokenUsage()
+    snippets = [f"print({n})" for n in range(12)]
+    analyses = analyze_code_batch(get_client(), snippets, usage=usage, poll_interval=POLL)
+
+    errors = [a for a in analyses if a.startswith("Error: ")]
+    assert len(analyses) == 12 and all(analyses)
+    assert 0 < len(errors) < 12
+    assert set(errors) == {"Error: errored: Mock overload"}
+    assert usage.requests == 12 - len(errors)
+    assert len(server.state.batches) == 1
+
+
+def test_submit_then_collect_stores_reviews_and_merges_chunks(mock_api, tmp_path, db_path):
+    mock_api(batch_delay=0.05)
+    write_sources(tmp_path / "src", 4)
+    (tmp_path / "src" / "large.py").write_text(large_source())
+    assistant = IntelligentMCPAssistant(db_path)
+
+    submitted = assistant.submit_review_batches(str(tmp_path / "src"))
+    assert submitted["unchanged"] == 0 and len(submitted["batches"]) == 1
+    chunks = submitted["requests"] - 4
+    assert chunks > 1
+
+    polled = []
+    results = assistant.collect_review_batches(poll_interval=POLL, on_poll=polled.append)
+    assert results["stored"] == 5 and results["failed"] == 0
+    # The chunk reviews, then one merge batch
+    assert results["usage"].requests == 4 + chunks + 1
+    assert any(describe(batch).endswith("0 expired") for batch in polled)
+    assert statuses(assistant, "kind") == {"file": 4, "chunk": chunks, "merge": 1}
+    assert statuses(assistant) == {"succeeded": 4 + chunks + 1}
+
+    reviewed = dict(assistant.db.fetch_all(
+        "SELECT file_path, input_tokens FROM code_reviews WHERE content_hash IS NOT NULL"
+    ))
+    large = str(tmp_path / "src" / "large.py")
+    assert len(reviewed) == 5
+    # The merged review is charged for its parts as well as the merge
+    assert reviewed[large] > max(tokens for path, tokens in reviewed.items() if path != large)
+
+    again = assistant.submit_review_batches(str(tmp_path / "src"))
+    assert again == {"requests": 0, "unchanged": 5, "batches": []}
+
+
+def test_collect_resumes_in_a_new_process_after_a_partial_collect(mock_api, tmp_path, db_path):
+    server = mock_api(batch_delay=0.05)
+    write_sources(tmp_path / "a", 3, "a")
+    write_sources(tmp_path / "b", 2, "b")
+    first = IntelligentMCPAssistant(db_path)
+    batch_a = first.submit_review_batches(str(tmp_path / "a"))["batches"][0]
+    batch_b = first.submit_review_batches(str(tmp_path / "b"))["batches"][0]
+
+    # The first process stores one batch, then stops
+    partial = {"stored": 0, "failed": 0, "usage": TokenUsage()}
+    for batch in wait_for_batches(first.client, [batch_a], POLL):
+        first.store_batch_results(batch.id, partial)
+    assert partial["stored"] == 3
+
+    second = IntelligentMCPAssistant(db_path)
+    results = second.collect_review_batches(poll_interval=POLL)
+    assert results["stored"] == 2 and results["failed"] == 0
+    assert second.db.fetch_all("SELECT batch_id, status FROM review_batches ORDER BY batch_id") == \
+        sorted([(batch_a, "collected"), (batch_b, "collected")])
+    assert second.db.fetch_one("SELECT COUNT(*) FROM code_reviews")[0] == 5
+    # Nothing is left to wait for
+    assert second.collect_review_batches(poll_interval=POLL)["stored"] == 0
+    assert len(server.state.batches) == 2
+
+
+def test_errored_and_expired_rows_are_recorded_and_resubmitted(mock_api, tmp_path, db_path):
+    mock_api(batch_delay=0.05, error_rate=0.3, batch_expire_rate=0.3, seed=3)
+    write_sources(tmp_path / "src", 20)
+    assistant = IntelligentMCPAssistant(db_path)
+    assistant.submit_review_batches(str(tmp_path / "src"))
+    results = assistant.collect_review_batches(poll_interval=POLL)
+
+    failures = dict(assistant.db.fetch_all(
+        "SELECT result, COUNT(*) FROM review_batch_items WHERE status = 'failed' GROUP BY result"
+    ))
+    assert set(failures) == {"errored: Mock overload", "expired"}
+    failed = sum(failures.values())
+    assert results["failed"] == failed and results["stored"] == 20 - failed
+
+    # Only the failed files go out again
+    retry = assistant.submit_review_batches(str(tmp_path / "src"))
+    assert retry["requests"] == failed and retry["unchanged"] == 20 - failed
+
+
+def test_canceled_batch_results_are_failures(mock_api, tmp_path, db_path):
+    mock_api(batch_delay=60)
+    write_sources(tmp_path / "src", 3)
+    assistant = IntelligentMCPAssistant(db_path)
+    (batch_id,) = assistant.submit_review_batches(str(tmp_path / "src"))["batches"]
+    assistant.client.messages.batches.cancel(batch_id)
+
+    results = assistant.collect_review_batches(poll_interval=POLL)
+    assert results["stored"] == 0 and results["failed"] == 3
+    assert statuses(assistant) == {"failed": 3}
+    assert {result_error(result) for _, result in iter_results(assistant.client, batch_id)} == \
+        {"canceled"}
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+from assistant_db import get_database
+from client_factory import get_client
+from code_analysis import analysis_request
+from code_chunking import Chunk, chunk_requests, merge_request
+from conversation import Conversation
+from github_integration import _chunk_summary_request, repository_analysis_request
+from mcp_claude_integration import IntelligentMCPAssistant
+from prompt_cache import MAX_BREAKPOINTS, cached_text, place_cache_breakpoints
+from review_guidelines import REVIEW_GUIDELINES, review_system
+from snippet_packing import packed_request
+
+MODEL = "claude-sonnet-4-20250514"
+
+
+def breakpoints(request):
+    blocks = [] if isinstance(request.get("system"), str) else list(request.get("system") or ())
+    for message in request["messages"]:
+        if not isinstance(message["content"], str):
+            blocks.extend(message["content"])
+    return [block["text"][:10] for block in blocks if "cache_control" in block]
+
+
+def test_short_prefixes_are_unmarked():
+    request = place_cache_breakpoints({
+        "model": MODEL,
+        "system": "Be brief.",
+        "messages": [{"role": "user", "content": [cached_text("rubric"), {"type": "text", "text": "x"}]}],
+    })
+    assert breakpoints(request) == []
+    # A lone unmarked system prompt goes back to a plain string
+    assert request["system"] == "Be brief."
+
+
+def test_long_prefixes_keep_their_breakpoints_and_input_is_not_modified():
+    block = cached_text("word " * 1500)
+    original = {"model": MODEL, "system": "Be brief.", "messages": [{"role": "user", "content": [block]}]}
+    request = place_cache_breakpoints(original)
+    assert breakpoints(request) == ["word word "]
+    assert original["system"] == "Be brief." and "cache_control" in block
+
+
+def test_at_most_max_breakpoints_keeping_first_and_last():
+    content = [cached_text(f"{n:<10}" + "word " * 1100) for n in range(6)]
+    request = place_cache_breakpoints({"model": MODEL, "messages": [{"role": "user", "content": content}]})
+    assert [text.strip() for text in breakpoints(request)] == ["0", "3", "4", "5"]
+    assert len(breakpoints(request)) == MAX_BREAKPOINTS
+
+
+def test_conversation_marks_a_prefix_long_enough_to_cache():
+    conversation = Conversation(client=object(), system="You are helpful.")
+    conversation.turns = [("question " * 400, "answer " * 400)] * 2
+    request = conversation.request("next")
+    conversation.close()
+    # The previous user message (read back) and the new one (written)
+    assert breakpoints(request) == ["question q", "next"]
+
+
+def review_requests(tmp_path):
+    chunks = [Chunk(1, 2, "a = 1\n"), Chunk(3, 4, "b = 2\n")]
+    system = review_system("You review code.")
+    repo = {"full_name": "o/r", "description": None, "stargazers_count": 1, "forks_count": 0,
+            "language": "Python", "created_at": "2025", "updated_at": "2025"}
+    commit = {"commit": {"message": "Fix it", "author": {"name": "A"}}}
+    db_path = str(tmp_path / "assistant.db")
+    assistant = IntelligentMCPAssistant(db_path)
+    requests = [
+        analysis_request("print(1)"),
+        assistant.review_request("a.py", "print(1)"),
+        *chunk_requests(chunks, "python", "1. Issues", MODEL, system, "a.py", 1024),
+        merge_request(chunks, ["ok", "ok"], "1. Issues", MODEL, system, "a.py", 1024),
+        packed_request([("1", "a = 1")], "Review each.", MODEL, system),
+        repository_analysis_request(repo, [commit], {"Python": 1}),
+        _chunk_summary_request("main", 1, SimpleNamespace(paths=("a.py",), text="+a\n")),
+    ]
+    get_database(db_path).close_all()
+    return requests
+
+
+def test_review_requests_mark_the_shared_guidelines(tmp_path):
+    for request in review_requests(tmp_path):
+        guidelines, role = request["system"]
+        assert guidelines["text"] == REVIEW_GUIDELINES and "cache_control" in guidelines
+        # The caller's role ends the system prompt with its own breakpoint
+        assert "cache_control" in role
+        assert isinstance(request["messages"][-1]["content"], str)
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_later_reviews_read_the_guidelines_from_the_cache(mock_api):
+    mock_api()
+    client = get_client()
+    first = client.messages.create(**analysis_request("print(1)"))
+    second = client.messages.create(**analysis_request("print(2)", "javascript"))
+    assert first.usage.cache_read_input_tokens == 0
+    assert first.usage.cache_creation_input_tokens > 1000
+    assert second.usage.cache_read_input_tokens == first.usage.cache_creation_input_tokens
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from request_scheduler import RequestScheduler
+
+
+def throttled(status=429, headers=None):
+    return SimpleNamespace(status_code=status, response=SimpleNamespace(headers=headers or {}))
+
+
+def test_success_widens_window_by_one_over_limit():
+    scheduler = RequestScheduler(initial_limit=4)
+    scheduler.release(scheduler.acquire())
+    assert scheduler.limit == pytest.approx(4.25)
+
+
+def test_throttle_halves_window_once_per_window():
+    scheduler = RequestScheduler(initial_limit=8)
+    started = [scheduler.acquire() for _ in range(4)]
+    # Rejections of requests already in flight are one congestion signal
+    for start in started:
+        scheduler.release(start, error=throttled())
+    assert scheduler.limit == 4
+    assert scheduler.throttled == 4
+
+    scheduler.release(scheduler.acquire(), error=throttled(529))
+    assert scheduler.limit == 2
+
+
+def test_window_stays_within_bounds():
+    scheduler = RequestScheduler(initial_limit=2, min_limit=1, max_limit=3)
+    for _ in range(5):
+        scheduler.release(scheduler.acquire(), error=throttled())
+    assert scheduler.limit == 1
+    for _ in range(50):
+        scheduler.release(scheduler.acquire())
+    assert scheduler.limit == 3
+
+
+def test_other_errors_leave_window_alone():
+    scheduler = RequestScheduler(initial_limit=4)
+    scheduler.release(scheduler.acquire(), error=throttled(500))
+    scheduler.release(scheduler.acquire(), error=KeyboardInterrupt())
+    assert scheduler.limit == 4
+    assert scheduler.in_flight == 0
+
+
+def test_retry_after_pauses_every_caller():
+    scheduler = RequestScheduler(initial_limit=4)
+    scheduler.release(scheduler.acquire(), error=throttled(headers={"retry-after": "0.2"}))
+    begin = time.monotonic()
+    scheduler.release(scheduler.acquire())
+    assert time.monotonic() - begin >= 0.15
+
+
+def test_seed_only_before_first_request():
+    scheduler = RequestScheduler(initial_limit=8, max_limit=64)
+    scheduler.seed(100)
+    assert scheduler.limit == 64
+    scheduler.release(scheduler.acquire())
+    scheduler.seed(1)
+    assert scheduler.limit == 64
+
+
+def test_async_waiters_are_woken_by_release_from_another_thread():
+    scheduler = RequestScheduler(initial_limit=1)
+    held = scheduler.acquire()
+
+    async def main():
+        waiter = asyncio.ensure_future(scheduler.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        assert len(scheduler._async_waiters) == 1
+        threading.Timer(0.05, scheduler.release, (held,)).start()
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(main()) > held
+    assert scheduler.in_flight == 1
+    assert not scheduler._async_waiters
+
+
+def test_async_tasks_share_a_window_without_polling(monkeypatch):
+    scheduler = RequestScheduler(initial_limit=2, max_limit=2)
+    running, peak = 0, 0
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def counting_sleep(delay, *args):
+        sleeps.append(delay)
+        return await real_sleep(delay, *args)
+
+    async def task():
+        nonlocal running, peak
+        started = await scheduler.acquire_async()
+        running += 1
+        peak = max(peak, running)
+        await counting_sleep(0.001)
+        running -= 1
+        scheduler.release(started)
+
+    async def main():
+        monkeypatch.setattr(asyncio, "sleep", counting_sleep)
+        await asyncio.gather(*[task() for _ in range(40)])
+
+    asyncio.run(main())
+    assert peak == 2
+    # Only the tasks' own sleeps: waiting for a slot never polls
+    assert sleeps == [0.001] * 40
+    assert scheduler.in_flight == 0 and not scheduler._async_waiters
+
+
+def test_cancelled_waiter_passes_its_wakeup_on():
+    scheduler = RequestScheduler(initial_limit=1)
+
+    async def main():
+        held = await scheduler.acquire_async()
+        first = asyncio.ensure_future(scheduler.acquire_async())
+        second = asyncio.ensure_future(scheduler.acquire_async())
+        await asyncio.sleep(0)
+        # release() picks the first waiter, which is cancelled before it runs
+        scheduler.release(held)
+        first.cancel()
+        started = await asyncio.wait_for(second, 1)
+        scheduler.release(started)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())
+    assert scheduler.in_flight == 0 and not scheduler._async_waiters
+
+
+def test_paused_async_waiters_resume_after_pause():
+    scheduler = RequestScheduler(initial_limit=1)
+
+    async def main():
+        held = await scheduler.acquire_async()
+        waiter = asyncio.ensure_future(scheduler.acquire_async())
+        await asyncio.sleep(0)
+        scheduler.release(held, error=throttled(headers={"retry-after": "0.1"}))
+        return await asyncio.wait_for(waiter, 1)
+
+    begin = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - begin >= 0.08
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_rate_limited_requests_shrink_the_window_and_all_succeed(mock_api):
+    import anthropic
+    from concurrent.futures import ThreadPoolExecutor
+    from request_scheduler import ScheduledClient
+
+    server = mock_api(rate_limit=40)
+    scheduler = RequestScheduler(initial_limit=16, max_retries=30)
+    client = ScheduledClient(anthropic.Anthropic(max_retries=0), scheduler)
+
+    def ask(number):
+        return client.messages.create(model="claude-sonnet-4-20250514", max_tokens=16,
+                                      messages=[{"role": "user", "content": f"q{number}"}])
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        replies = list(executor.map(ask, range(60)))
+    assert len(replies) == 60
+    assert server.state.rate_limited > 0
+    assert scheduler.throttled == server.state.rate_limited
+    assert scheduler.retries == scheduler.throttled
+    assert scheduler.limit < 16
+    assert scheduler.usage.requests == 60 and scheduler.in_flight == 0
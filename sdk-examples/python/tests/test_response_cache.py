@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+import response_cache
+from assistant_db import get_database
+from mcp_claude_integration import IntelligentMCPAssistant
+from response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "assistant.db")
+    yield path
+    get_database(path).close_all()
+
+
+def rows(cache):
+    cache.writer.flush()
+    return [key for key, in cache.database.fetch_all("SELECT key FROM response_cache ORDER BY key")]
+
+
+def test_hit_after_miss_from_memory_then_from_disk(db_path):
+    cache = ResponseCache(get_database(db_path))
+    assert cache.get("k") is None
+    cache.put("k", "answer", model="m")
+    assert cache.get("k") == "answer"
+    assert cache.stats()["misses"] == 1 and cache.stats()["memory_hits"] == 1
+    assert rows(cache) == ["k"]
+
+    # Another process sharing the database starts with an empty memory level
+    other = ResponseCache(get_database(db_path))
+    assert other.get("k") == "answer" and other.get("k") == "answer"
+    assert other.stats() == {"hits": 2, "memory_hits": 1, "misses": 0, "hit_rate": 1.0,
+                             "memory_entries": 1}
+
+
+def test_entries_expire_at_both_levels(db_path):
+    cache = ResponseCache(get_database(db_path), ttl=0.2)
+    cache.put("short", "soon gone")
+    cache.put("long", "still here", ttl=60)
+    rows(cache)
+    time.sleep(0.3)
+    assert cache.get("short") is None and cache.get("long") == "still here"
+    assert cache.stats()["memory_entries"] == 1
+
+    other = ResponseCache(get_database(db_path))
+    assert other.get("short") is None and other.get("long") == "still here"
+    cache.evict()
+    assert rows(cache) == ["long"]
+
+
+def test_memory_level_keeps_only_recent_entries(db_path):
+    cache = ResponseCache(get_database(db_path), memory_entries=2)
+    for key in "abc":
+        cache.put(key, key.upper())
+    rows(cache)
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.get("a") == "A"
+    assert cache.stats()["memory_hits"] == 0
+
+
+def test_eviction_drops_least_recently_used_over_the_caps(db_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "EVICT_EVERY", 5)
+    cache = ResponseCache(get_database(db_path), max_entries=100, max_bytes=350)
+    for number in range(4):
+        cache.put(f"k{number}", "x" * 100)
+        time.sleep(0.01)
+    rows(cache)
+    # Reading k0 makes it the most recently used
+    ResponseCache(get_database(db_path)).get("k0")
+    assert rows(cache) == ["k0", "k1", "k2", "k3"]
+
+    # The fifth insert runs the eviction: 350 bytes keep the newest three
+    cache.put("k4", "x" * 100)
+    assert rows(cache) == ["k0", "k3", "k4"]
+
+    cache.max_bytes, cache.max_entries = 10 ** 6, 2
+    cache.evict()
+    assert rows(cache) == ["k0", "k4"]
+
+
+def test_normalized_prompts_share_a_key():
+    key = make_cache_key("How do I  profile\nPython code?", "m", max_tokens=10)
+    assert make_cache_key("  how do i profile python CODE? ", "m", max_tokens=10) == key
+    assert make_cache_key("How do I profile Python code", "m", max_tokens=10) != key
+    assert make_cache_key("How do I profile Python code?", "other", max_tokens=10) != key
+    assert make_cache_key("How do I profile Python code?", "m", max_tokens=20) != key
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_intelligent_query_uses_the_cache_unless_told_not_to(mock_api, db_path):
+    server = mock_api()
+    assistant = IntelligentMCPAssistant(db_path)
+    first = assistant.intelligent_query("Explain  WAL mode", use_history=False)
+    assert assistant.intelligent_query("explain wal MODE ", use_history=False) == first
+    assert server.state.requests == 1
+
+    # use_cache=False neither reads nor writes the cache
+    assistant.intelligent_query("Explain WAL mode", use_history=False, use_cache=False)
+    assistant.intelligent_query("What is a B-tree?", use_history=False, use_cache=False)
+    assert server.state.requests == 3
+    assert len(rows(assistant.cache)) == 1
+    assert assistant.cache.stats()["hits"] == 1 and assistant.cache.stats()["misses"] == 1
+    assistant.intelligent_query("What is a B-tree?", use_history=False)
+    assert server.state.requests == 4
@@ -0,0 +1,96 @@
+import subprocess
+
+import pytest
+
+import mcp_claude_integration
+from assistant_db import get_database
+from mcp_claude_integration import IntelligentMCPAssistant, list_repository_files
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "assistant.db")
+    yield path
+    get_database(path).close_all()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    (root / "build").mkdir(parents=True)
+    for number in range(5):
+        (root / f"module_{number}.py").write_text(f"def f{number}():\n    return {number}\n")
+    (root / "build" / "generated.py").write_text("x = 1\n")
+    (root / "notes.txt").write_text("not source\n")
+    (root / "huge.py").write_text("# padding\n" * 5000)
+    (root / ".gitignore").write_text("build/\n")
+    subprocess.run(["git", "init", "-q", str(root)], check=True)
+    return root
+
+
+def test_listing_honors_gitignore_extensions_and_size(repo):
+    assert list(list_repository_files(str(repo), max_file_bytes=1000)) == [
+        f"module_{number}.py" for number in range(5)
+    ]
+
+
+def test_interrupted_run_resumes_and_reruns_skip_reviewed_files(mock_api, db_path, repo,
+                                                                monkeypatch):
+    server = mock_api()
+    listing = list_repository_files
+
+    def interrupted(*args):
+        files = listing(*args)
+        yield next(files)
+        yield next(files)
+        raise KeyboardInterrupt
+
+    assistant = IntelligentMCPAssistant(db_path)
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(mcp_claude_integration, "list_repository_files", interrupted)
+        assistant.review_repository(str(repo), workers=1, max_in_flight=1, max_file_bytes=1000)
+    # The second file is dropped if it was still queued, or finished if it had started
+    (checkpointed,) = assistant.db.fetch_one("SELECT COUNT(*) FROM review_run_files")
+    assert checkpointed in (1, 2) and server.state.requests == checkpointed
+
+    # A new process picks up the unfinished run and skips checkpointed files
+    resumed = IntelligentMCPAssistant(db_path).review_repository(str(repo), max_file_bytes=1000)
+    assert resumed["resumed"] == checkpointed and len(resumed["reviewed"]) == 5 - checkpointed
+    assert resumed["unchanged"] == [] and resumed["failed"] == []
+    assert server.state.requests == 5
+
+    # The next run is a new one; unchanged content costs no API call
+    (repo / "module_3.py").write_text("def f3():\n    return 'changed'\n")
+    rerun = assistant.review_repository(str(repo), max_file_bytes=1000)
+    assert rerun["run_id"] != resumed["run_id"] and rerun["resumed"] == 0
+    assert rerun["reviewed"] == ["module_3.py"] and len(rerun["unchanged"]) == 4
+    assert server.state.requests == 6
+    statuses = assistant.db.fetch_all(
+        "SELECT status, COUNT(*) FROM review_runs GROUP BY status"
+    )
+    assert statuses == [("finished", 2)]
+
+
+def test_failed_files_are_retried_on_resume(mock_api, db_path, repo, monkeypatch):
+    server = mock_api()
+    assistant = IntelligentMCPAssistant(db_path)
+    review_file = assistant.review_file
+
+    def flaky(path, force=False):
+        if path.endswith("module_0.py"):
+            raise OSError("disk hiccup")
+        return review_file(path, force)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(assistant, "review_file", flaky)
+        first = assistant.review_repository(str(repo), max_file_bytes=1000)
+    assert first["failed"] == ["module_0.py"] and len(first["reviewed"]) == 4
+
+    # Mark the run unfinished, as if it had been interrupted
+    assistant.db.execute("UPDATE review_runs SET status = 'running'")
+    resumed = assistant.review_repository(str(repo), max_file_bytes=1000)
+    assert resumed["run_id"] == first["run_id"] and resumed["resumed"] == 4
+    assert resumed["reviewed"] == ["module_0.py"]
+    assert server.state.requests == 5
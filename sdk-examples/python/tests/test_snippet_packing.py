@@ -0,0 +1,116 @@
+import json
+import threading
+
+import pytest
+
+from client_factory import get_client
+from mock_anthropic_server import ITEM_PATTERN
+from snippet_packing import SnippetPacker, pack_items, packed_request, parse_packed_answers
+from token_counting import TokenUsage
+
+MODEL = "claude-3-5-sonnet-20241022"
+
+
+def test_pack_items_first_fit_decreasing():
+    sizes = [50, 700, 300, 600, 100, 400]
+    packs = pack_items(sizes, budget=1000, max_items=3)
+    assert sorted(index for pack in packs for index in pack) == list(range(len(sizes)))
+    for pack in packs:
+        assert sum(sizes[i] for i in pack) <= 1000 and len(pack) <= 3
+        assert pack == sorted(pack)
+    assert len(packs) == 3
+
+
+def test_pack_items_respects_max_items_and_oversized_items():
+    assert pack_items([1] * 7, budget=100, max_items=3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert pack_items([5000, 10], budget=1000) == [[0], [1]]
+    assert pack_items([]) == []
+
+
+def test_packed_request_lists_every_item():
+    request = packed_request([("1", "a = 1"), ("2", "b = 2")], "Review these.", MODEL, system="S")
+    prompt = request["messages"][0]["content"]
+    assert ITEM_PATTERN.findall(prompt) == ["1", "2"]
+    assert prompt.startswith("Review these.")
+    assert request["system"] == "S"
+    assert request["max_tokens"] > 800
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"1": "ok", "2": "fine"}', {"1": "ok", "2": "fine"}),
+    ('Sure:\n```json\n{"1": "ok", "2": ""}\n```', {"1": "ok"}),
+    ('{"1": ["not", "a", "string"], "3": "extra"}', {}),
+    ("no json here", {}),
+    ('{"1": "unterminated', {}),
+    ('["1", "2"]', {}),
+])
+def test_parse_packed_answers(text, expected):
+    assert parse_packed_answers(text, ["1", "2"]) == expected
+
+
+def test_packer_answers_many_callers_in_few_requests(mock_api):
+    server = mock_api()
+    client = get_client()
+    usage = TokenUsage()
+    fallback_calls = []
+
+    def fallback(text):
+        fallback_calls.append(text)
+        return f"single: {text}"
+
+    with SnippetPacker(client, "Review each snippet.", MODEL, fallback, usage=usage,
+                       max_items=10, delay=0.2) as packer:
+        results = {}
+
+        def caller(number):
+            results[number] = packer.submit(f"x_{number} = {number}").result(timeout=10)
+
+        threads = [threading.Thread(target=caller, args=(n,)) for n in range(25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = packer.stats()
+
+    assert len(results) == 25 and all(results.values())
+    assert fallback_calls == []
+    assert stats["items"] == 25 and stats["packed_requests"] == 3
+    assert server.state.requests == 3
+    assert usage.requests == 3
+
+
+def test_packer_falls_back_per_item_when_the_answer_is_unusable(mock_api, tmp_path):
+    replay = tmp_path / "replay.jsonl"
+    replay.write_text(json.dumps({"text": '{"1": "first only"}'}) + "\n")
+    mock_api(replay=str(replay))
+    client = get_client()
+
+    with SnippetPacker(client, "Review.", MODEL, lambda text: f"single: {text}",
+                       delay=0.1) as packer:
+        answers = packer.map(["a = 1", "b = 2", "c = 3"])
+        stats = packer.stats()
+    assert answers == ["first only", "single: b = 2", "single: c = 3"]
+    assert stats["fallbacks"] == 2 and stats["packed_requests"] == 1
+
+
+def test_packer_sends_oversized_inputs_alone():
+    calls = []
+    with SnippetPacker(None, "Review.", MODEL, lambda text: calls.append(len(text)) or "big") as packer:
+        assert packer.submit("word " * 5000).result(timeout=5) == "big"
+    assert calls == [25000]
+    with pytest.raises(RuntimeError):
+        packer.submit("late")
+
+
+def test_packer_propagates_request_errors():
+    class Failing:
+        class messages:
+            @staticmethod
+            def create(**request):
+                raise ConnectionError("down")
+
+    with SnippetPacker(Failing, "Review.", MODEL, lambda text: text, delay=0.05) as packer:
+        futures = [packer.submit(f"v{n} = {n}") for n in range(3)]
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result(timeout=5)
@@ -0,0 +1,72 @@
+import json
+
+import anthropic
+import pytest
+
+from client_factory import get_client
+from mock_anthropic_server import TOKENS_PER_DELTA
+from stream_metrics import (
+    GAP_BUCKETS, MetricsSink, StreamMetrics, histogram_percentile, load_records, metered_stream,
+    summarize
+)
+
+MODEL = "claude-sonnet-4-20250514"
+
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+
+def stream(sink=None, tag=None, client=None):
+    with metered_stream(client or get_client(), sink=sink, tag=tag, model=MODEL, max_tokens=256,
+                        messages=[{"role": "user", "content": "Hi"}]) as metered:
+        text = "".join(metered.text_stream)
+    return metered.metrics, text
+
+
+def test_ttft_and_gaps_follow_the_mock_pacing(mock_api):
+    mock_api(latency=0.15, token_rate=100, output_tokens=60)
+    metrics, text = stream()
+    gap = TOKENS_PER_DELTA / 100
+
+    assert text and metrics.deltas == 60 // TOKENS_PER_DELTA
+    assert 0.15 <= metrics.ttft < 0.4
+    assert metrics.output_tokens == 60 and metrics.stop_reason == "end_turn"
+    assert sum(metrics.gap_counts) == metrics.deltas - 1
+    # Percentiles are bucket upper bounds, 25% apart
+    assert gap <= metrics.gap_percentile(50) <= gap * 1.25 ** 2
+    assert metrics.max_gap < gap * 3
+    assert 70 < metrics.tokens_per_second < 160
+    assert metrics.duration - metrics.ttft > 0.4
+
+
+def test_sink_records_merge_into_percentile_summaries(mock_api, tmp_path):
+    mock_api(token_rate=2000, output_tokens=30)
+    path = str(tmp_path / "metrics.jsonl")
+    sink = MetricsSink(path)
+    for tag in ("a", "a", "b"):
+        stream(sink, tag)
+
+    records = load_records(path)
+    assert [record["tag"] for record in records] == ["a", "a", "b"]
+    assert all(record["ttft_ms"] is not None and record["gap_histogram"] for record in records)
+    summary = {row["tag"]: row for row in summarize(records)}
+    assert summary["a"]["requests"] == 2 and summary["b"]["requests"] == 1
+    assert summary["a"]["errors"] == 0
+    assert summary["a"]["gap_p50_ms"] is not None
+    json.dumps(summary)
+
+
+def test_failed_streams_are_recorded(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    with pytest.raises(anthropic.APIConnectionError):
+        stream(path, "down", anthropic.Anthropic(max_retries=0))
+    (record,) = load_records(path)
+    assert record["tag"] == "down" and record["error"] and record["ttft_ms"] is None
+
+
+def test_histogram_percentile_is_a_bucket_upper_bound():
+    metrics = StreamMetrics()
+    counts = [0] * len(metrics.gap_counts)
+    counts[10], counts[20] = 9, 1
+    assert histogram_percentile(counts, 50) == GAP_BUCKETS[10]
+    assert histogram_percentile(counts, 99) == GAP_BUCKETS[20]
+    assert histogram_percentile([0] * 3, 50) is None
@@ -0,0 +1,56 @@
+import io
+import json
+
+from stream_renderer import JSONLRenderer, PaneRenderer
+
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_finished_streams_are_dropped_after_their_last_frame():
+    out = io.StringIO()
+    with PaneRenderer(out, fps=1000) as renderer:
+        for n in range(50):
+            with renderer.stream(f"s{n}") as handle:
+                handle.write(f"line {n}\npartial {n}")
+            renderer._draw()
+        assert renderer.streams == [] and renderer._panes == {}
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 100
+    assert lines[-2:] == ["[s49] line 49", "[s49] partial 49"]
+
+
+def test_finished_panes_are_drawn_once_then_left_in_scrollback():
+    out = Terminal()
+    renderer = PaneRenderer(out, fps=1000, height=2, width=40)
+    done, live = renderer.stream("done"), renderer.stream("live")
+    done.write("a\nb")
+    live.write("x")
+    renderer._draw()
+    assert renderer._rows_drawn == 6
+
+    done.close()
+    renderer._draw()
+    assert list(renderer._panes) == [live] and renderer.streams == [live]
+    frame = out.getvalue().split("\x1b[6F")[-1]
+    assert frame.index("done (done") < frame.index("live (streaming")
+    # Only the live pane is redrawn in place from now on
+    assert renderer._rows_drawn == 3
+    live.close()
+    renderer.close()
+    assert renderer._panes == {} and renderer._rows_drawn == 0
+
+
+def test_jsonl_reports_each_stream_once():
+    out = io.StringIO()
+    with JSONLRenderer(out, fps=1000) as renderer:
+        handle = renderer.stream("review")
+        handle.write("hello")
+        handle.close()
+        renderer._draw()
+        renderer._draw()
+        assert renderer.streams == []
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [record.get("text", record.get("done")) for record in records] == ["hello", True]
@@ -0,0 +1,84 @@
+import sys
+import threading
+from types import SimpleNamespace
+
+import token_counting
+from token_counting import TokenUsage, estimate_tokens, usage_of
+
+
+def test_estimate_counts_words_numbers_and_symbols():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hello world") == 2
+    assert estimate_tokens("x = 42;") == 4
+    # Long words are charged extra pieces
+    assert estimate_tokens("internationalization") == 4
+
+
+def test_long_texts_are_cached_by_digest_not_by_value():
+    text = "def f(x):\n    return x * 2\n" * 5000
+    before = estimate_tokens(text)
+    assert estimate_tokens(text) == before
+    assert estimate_tokens(text + " extra") > before
+
+    for length, digest in token_counting._long_estimates:
+        assert isinstance(length, int) and isinstance(digest, bytes) and len(digest) == 16
+
+
+def test_short_cache_never_holds_long_texts():
+    cached = token_counting._estimate_short.cache_info().currsize
+    estimate_tokens("y " * token_counting.MAX_CACHED_TEXT)
+    assert token_counting._estimate_short.cache_info().currsize == cached
+
+
+def test_long_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(token_counting, "ESTIMATE_CACHE_ENTRIES", 3)
+    for n in range(10):
+        estimate_tokens(f"{n} " + "word " * 400)
+    assert len(token_counting._long_estimates) <= 3
+
+
+def test_usage_totals_and_cache_hit_rate():
+    class Usage:
+        input_tokens = 100
+        output_tokens = 20
+        cache_read_input_tokens = 300
+        cache_creation_input_tokens = None
+
+    usage = TokenUsage().add(Usage()).add(Usage())
+    assert usage.requests == 2
+    assert usage.prompt_tokens == 800
+    assert usage.total_tokens == 840
+    assert usage.cache_hits == 2
+    assert usage.cache_hit_rate == 0.75
+    assert usage_of(None).requests == 0
+
+
+
+def test_usage_add_is_thread_safe():
+    # Switch threads often so unlocked read-modify-writes would lose updates
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        usage = TokenUsage()
+        message = SimpleNamespace(usage=SimpleNamespace(input_tokens=3, output_tokens=1,
+                                                        cache_read_input_tokens=2))
+
+        def add_many():
+            for _ in range(5000):
+                usage.add(message)
+
+        threads = [threading.Thread(target=add_many) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert usage.as_dict() == {
+        "requests": 40000,
+        "input_tokens": 120000,
+        "output_tokens": 40000,
+        "cache_read_input_tokens": 80000,
+        "cache_creation_input_tokens": 0,
+        "cache_hits": 40000,
+    }
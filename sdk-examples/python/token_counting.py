@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Token Accounting Helpers
+Reads real token usage from API responses and estimates tokens locally for
+pre-flight budgeting and cost planning
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# USD per million tokens: (input, output). Cache writes bill at 1.25x the
+# input rate and cache reads at 0.1x.
+PRICING = {
+    "haiku": (0.80, 4.00),
+    "sonnet": (3.00, 15.00),
+    "opus": (15.00, 75.00),
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.10
+
+# Word-ish runs and individual symbols, roughly how BPE splits text and code
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]|\n")
+
+# Estimates remembered per cache; texts up to MAX_CACHED_TEXT characters are
+# keyed by value, longer ones by length and digest
+ESTIMATE_CACHE_ENTRIES = 4096
+MAX_CACHED_TEXT = 1024
+_long_estimates = OrderedDict()  # (length, digest) -> tokens
+_estimates_lock = threading.Lock()
+
+
+class TokenUsage:
+    """Running total of the usage fields reported by the Messages API
+
+    add() may be called from several threads sharing one total.
+    """
+
+    FIELDS = (
+        "requests",
+        "input_tokens",
+        "output_tokens",
+        "cache_read_input_tokens",
+        "cache_creation_input_tokens",
+        "cache_hits",
+    )
+    __slots__ = FIELDS + ("_lock",)
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_hits = 0  # responses that read part of their prompt from the cache
+        self._lock = threading.Lock()
+
+    def add(self, message_or_usage):
+        """Add the usage of a Message (or its .usage) to the totals"""
+        usage = getattr(message_or_usage, "usage", message_or_usage)
+        if usage is None:
+            return self
+        # Cache fields are None on responses that didn't touch the cache
+        input_tokens = getattr(usage, "input_tokens", None) or 0
+        output_tokens = getattr(usage, "output_tokens", None) or 0
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cache_read_input_tokens += cache_read
+            self.cache_creation_input_tokens += cache_creation
+            if cache_read:
+                self.cache_hits += 1
+        return self
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.output_tokens
+
+    @property
+    def prompt_tokens(self):
+        """All input tokens, whether cached, written to the cache or neither"""
+        return self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+
+    @property
+    def cache_hit_rate(self):
+        """Fraction of prompt tokens served from the cache, or None before any request"""
+        prompt_tokens = self.prompt_tokens
+        return self.cache_read_input_tokens / prompt_tokens if prompt_tokens else None
+
+    def cost(self, model):
+        return estimate_cost(
+            model,
+            self.input_tokens,
+            self.output_tokens,
+            self.cache_read_input_tokens,
+            self.cache_creation_input_tokens,
+        )
+
+    def as_dict(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __str__(self):
+        text = f"{self.input_tokens} input + {self.output_tokens} output tokens"
+        if self.cache_read_input_tokens or self.cache_creation_input_tokens:
+            text += (f" ({self.cache_read_input_tokens} cache read,"
+                     f" {self.cache_creation_input_tokens} cache write,"
+                     f" {self.cache_hit_rate:.0%} of prompt tokens cached,"
+                     f" {self.cache_hits}/{self.requests} requests hit)")
+        return text
+
+
+def usage_of(message):
+    """TokenUsage for a single response"""
+    return TokenUsage().add(message)
+
+
+def estimate_tokens(text):
+    """Fast local token estimate for budgeting before a request is sent
+
+    Counts letter runs, digit runs and symbols, charging long words extra
+    pieces the way subword tokenizers split them. It is an approximation,
+    not the API's tokenizer; use response usage for accounting. Results are
+    cached, so repeated system prompts and file contents are free: short
+    texts by value, long ones by length and digest, so the cache never
+    keeps whole files alive.
+    """
+    if len(text) <= MAX_CACHED_TEXT:
+        return _estimate_short(text)
+    key = (len(text), hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+    with _estimates_lock:
+        tokens = _long_estimates.get(key)
+        if tokens is not None:
+            _long_estimates.move_to_end(key)
+            return tokens
+    tokens = _count_tokens(text)
+    with _estimates_lock:
+        _long_estimates[key] = tokens
+        while len(_long_estimates) > ESTIMATE_CACHE_ENTRIES:
+            _long_estimates.popitem(last=False)
+    return tokens
+
+
+@lru_cache(maxsize=ESTIMATE_CACHE_ENTRIES)
+def _estimate_short(text):
+    return _count_tokens(text)
+
+
+def _count_tokens(text):
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        tokens += 1 + (len(piece) - 1) // 6
+    return tokens
+
+
+def price_for(model):
+    """(input, output) USD per million tokens for a model name"""
+    for family, prices in PRICING.items():
+        if family in model:
+            return prices
+    raise ValueError(f"No pricing known for model {model!r}")
+
+
+def estimate_cost(model, input_tokens, output_tokens=0,
+                  cache_read_tokens=0, cache_creation_tokens=0):
+    """Cost in USD of a request with the given token counts"""
+    input_price, output_price = price_for(model)
+    return (
+        input_tokens * input_price
+        + output_tokens * output_price
+        + cache_read_tokens * input_price * CACHE_READ_MULTIPLIER
+        + cache_creation_tokens * input_price * CACHE_WRITE_MULTIPLIER
+    ) / 1_000_000